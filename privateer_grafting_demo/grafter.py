@@ -1,12 +1,63 @@
+import io
 import os
 import re
 import sys
+import shutil
 import argparse
-import requests
 import warnings
+import tempfile
+import contextlib
 import json
-from privateer import privateer_core as pvtcore
-from privateer import privateer_modelling as pvtmodelling
+
+# requests and Privateer are imported inside the functions that use them, so importing this module stays cheap.
+
+# Stage profiling(-profile) is shared with the scripts in utility_scripts.
+try:
+    from utility_scripts.profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+    from utility_scripts.conformer_library import ConformerLibrary
+    from utility_scripts.batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
+except ImportError:
+    sys.path.append(
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "utility_scripts",
+        )
+    )
+    from profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+    from conformer_library import ConformerLibrary
+    from batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
 
 
 defaultDonorLocation = "input/glycanblocks/man5/cluster1.pdb"
@@ -46,10 +97,13 @@ def parse_json_for_grafting_instructions(uniprotIDListPath):
 
 
 def download_and_prepare_alphafoldDB_model(uniprotID, downloadLocation):
+    import requests
+
     outputFileName = uniprotID + ".pdb"
     outputFilePath = os.path.join(downloadLocation, outputFileName)
     requestURL = f"https://alphafold.ebi.ac.uk/files/AF-{uniprotID}-F1-model_v1.pdb"
-    query = requests.get(requestURL, allow_redirects=True)
+    with profile_stage("AlphaFold download"):
+        query = requests.get(requestURL, allow_redirects=True)
 
     outputLines = []
     downloadedLines = query.iter_lines()
@@ -68,10 +122,13 @@ def download_and_prepare_alphafoldDB_model(uniprotID, downloadLocation):
 
 
 def query_uniprot_for_glycosylation_locations(uniprotID):
+    import requests
+
     uniprotRequestURL = f"https://www.ebi.ac.uk/proteins/api/proteins/{uniprotID}"
-    uniprotResponse = requests.get(
-        uniprotRequestURL, headers={"Accept": "application/json"}
-    )
+    with profile_stage("UniProt request"):
+        uniprotResponse = requests.get(
+            uniprotRequestURL, headers={"Accept": "application/json"}
+        )
     if not uniprotResponse.ok:
         uniprotResponse.raise_for_status()
         sys.exit()
@@ -95,14 +152,19 @@ def query_uniprot_for_glycosylation_locations(uniprotID):
 
 
 def get_sequences_in_receiving_model(receiverpath):
-    builder_sequence_only = pvtmodelling.Builder(receiverpath, True)
-    receiver_sequence = builder_sequence_only.get_receiving_model_sequence_info()
+    from privateer import privateer_modelling as pvtmodelling
+
+    with profile_stage("Privateer model parsing"):
+        builder_sequence_only = pvtmodelling.Builder(receiverpath, True)
+        receiver_sequence = builder_sequence_only.get_receiving_model_sequence_info()
 
     return receiver_sequence
 
 
 # privateer::pymodelling::Builder::graft_glycan_to_receiver(int mglycanindex, int receiver_chain_index, int received_residue_index)
 def get_information_about_input_files(receiverpath, donorpath, uniprotID):
+    from privateer import privateer_core as pvtcore
+
     if receiverpath is None and donorpath is None and uniprotID is None:
         raise ValueError(
             "'-info' flag needs to be used in conjuction with '-uniprotID' and/or '-donor_path' and/or '-local_receiver_path'. At least one of those flags need to be provided."
@@ -242,22 +304,27 @@ def glycosylate_receiving_model_using_manual_instructions(
     enableUserMessages,
     trimGlycanIfClashesDetected,
 ):
-    builder = pvtmodelling.Builder(
-        receiverpath,
-        donorpath,
-        -1,
-        trimGlycanIfClashesDetected,
-        True,
-        enableUserMessages,
-        False,
-    )
+    from privateer import privateer_modelling as pvtmodelling
+
+    with profile_stage("Privateer model parsing"):
+        builder = pvtmodelling.Builder(
+            receiverpath,
+            donorpath,
+            -1,
+            trimGlycanIfClashesDetected,
+            True,
+            enableUserMessages,
+            False,
+        )
 
-    builder.graft_glycan_to_receiver(
-        glycanIndex, receiverChainIndex, receiverResidueIndex
-    )
+    with profile_stage("graft_glycan_to_receiver"):
+        builder.graft_glycan_to_receiver(
+            glycanIndex, receiverChainIndex, receiverResidueIndex
+        )
 
     graftedGlycanSummary = builder.get_summary_of_grafted_glycans()
-    builder.export_grafted_model(outputpath)
+    with profile_stage("export_grafted_model"):
+        builder.export_grafted_model(outputpath)
 
     return graftedGlycanSummary
 
@@ -270,24 +337,29 @@ def glycosylate_receiving_model_using_consensus_seq(
     enableUserMessages,
     trimGlycanIfClashesDetected,
 ):
-    builder = pvtmodelling.Builder(
-        receiverpath,
-        donorpath,
-        -1,
-        trimGlycanIfClashesDetected,
-        True,
-        enableUserMessages,
-        False,
-    )
+    from privateer import privateer_modelling as pvtmodelling
+
+    with profile_stage("Privateer model parsing"):
+        builder = pvtmodelling.Builder(
+            receiverpath,
+            donorpath,
+            -1,
+            trimGlycanIfClashesDetected,
+            True,
+            enableUserMessages,
+            False,
+        )
     for item in glycosylationTargets:
         chainIndex = item["chainIndex"]
         targets = item["glycosylationTargets"]
         for target in targets:
             currentTargetIndex = target["start"]
-            builder.graft_glycan_to_receiver(0, chainIndex, currentTargetIndex)
+            with profile_stage("graft_glycan_to_receiver"):
+                builder.graft_glycan_to_receiver(0, chainIndex, currentTargetIndex)
 
     graftedGlycanSummary = builder.get_summary_of_grafted_glycans()
-    builder.export_grafted_model(outputpath)
+    with profile_stage("export_grafted_model"):
+        builder.export_grafted_model(outputpath)
 
     return graftedGlycanSummary
 
@@ -300,25 +372,45 @@ def glycosylate_receiving_model_using_uniprot_info(
     enableUserMessages,
     trimGlycanIfClashesDetected,
 ):
-    builder = pvtmodelling.Builder(
-        receiverpath,
-        donorpath,
-        -1,
-        trimGlycanIfClashesDetected,
-        True,
-        enableUserMessages,
-        False,
-    )
+    from privateer import privateer_modelling as pvtmodelling
+
+    with profile_stage("Privateer model parsing"):
+        builder = pvtmodelling.Builder(
+            receiverpath,
+            donorpath,
+            -1,
+            trimGlycanIfClashesDetected,
+            True,
+            enableUserMessages,
+            False,
+        )
     for currentTarget in targets:
         chainIndex = 0
-        builder.graft_glycan_to_receiver(0, chainIndex, currentTarget)
+        with profile_stage("graft_glycan_to_receiver"):
+            builder.graft_glycan_to_receiver(0, chainIndex, currentTarget)
 
     graftedGlycanSummary = builder.get_summary_of_grafted_glycans()
-    builder.export_grafted_model(outputpath)
+    with profile_stage("export_grafted_model"):
+        builder.export_grafted_model(outputpath)
 
     return graftedGlycanSummary
 
 
+def resolve_donor_path(donorPath, donorLibrary, donorDirectory):
+    # With -donor_library, donor paths name conformers(e.g. man9/Cluster1) in the library. Privateer reads donors from disk,
+    # so each conformer is written out once and the same file is reused for every graft. Conformers of a deduplicated
+    # library are replaced by the representative of their group, near-identical donors then share a single file.
+    if donorLibrary is None:
+        return donorPath
+    donorPath = donorLibrary.get_representative(donorPath)
+    donorFilePath = os.path.join(donorDirectory, donorPath + ".pdb")
+    if not os.path.exists(donorFilePath):
+        os.makedirs(os.path.dirname(donorFilePath), exist_ok=True)
+        with profile_stage("donor conformer load"):
+            donorLibrary.write_pdb(donorPath, donorFilePath)
+    return donorFilePath
+
+
 def print_grafted_glycans_summary(graftedGlycans):
     for idx, graft in enumerate(graftedGlycans):
         proteinChainID = graft["receiving_protein_residue_chain_PDBID"]
@@ -419,6 +511,69 @@ def online_input_model_pipeline(
     print_grafted_glycans_summary(graftedGlycans)
 
 
+def graft_uniprot_model(graftingTask):
+    # Runs in a supervised worker process, so a model that makes the Builder abort only fails its own UniProt ID.
+    # Output is captured and printed once the model is done, so that models grafted in parallel are reported one by one.
+    uniprotID, donorpath, inputModelPath, outputLocation = graftingTask
+    graftingLog = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(graftingLog):
+            online_input_model_pipeline(
+                uniprotID, donorpath, inputModelPath, outputLocation
+            )
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    return {
+        "uniprotID": uniprotID,
+        "log": graftingLog.getvalue(),
+        "error": error,
+        "profile": drain_stage_events(),
+    }
+
+
+def graft_uniprot_models_in_parallel(
+    uniprotIDList, donorpath, inputModelPath, outputLocation, jobs, supervisionSettings
+):
+    graftingTasks = [
+        (uniprotID, donorpath, inputModelPath, outputLocation)
+        for uniprotID in uniprotIDList
+    ]
+    failedModels = []
+    for idx, (graftingTask, graftingResult, failure) in enumerate(
+        run_supervised_batch(
+            graft_uniprot_model,
+            graftingTasks,
+            jobs,
+            supervisionSettings,
+            lambda graftingTask: graftingTask[0],
+            initialize_worker_profiling,
+            get_worker_profiling_settings(),
+        )
+    ):
+        uniprotID = graftingTask[0]
+        if failure is None:
+            add_stage_events(graftingResult["profile"])
+            print(graftingResult["log"], end="")
+            error = graftingResult["error"]
+        else:
+            error = describe_failure(failure)
+        if error is not None:
+            print(
+                f"\n{idx+1}/{len(uniprotIDList)}: Failed to process AlphaFoldDB model with UniProt ID of {uniprotID}: {error}\n"
+            )
+            failedModels.append((uniprotID, error))
+        else:
+            print(
+                f"\n{idx+1}/{len(uniprotIDList)}: Successfully finished processing AlphaFoldDB model with UniProt ID of {uniprotID}.\n"
+            )
+    if len(failedModels):
+        print(f"{len(failedModels)}/{len(uniprotIDList)} models could not be grafted:")
+        for uniprotID, error in failedModels:
+            print(f"\t{uniprotID}: {error}")
+    return failedModels
+
+
 scriptFilePath = os.path.abspath(__file__)
 workingDirectoryPath = get_working_directory_path(scriptFilePath)
 defaultDonorPath = os.path.join(workingDirectoryPath, defaultDonorLocation)
@@ -431,199 +586,265 @@ defaultJSONgrafting = os.path.join(workingDirectoryPath, "manual_grafting.json")
 
 defaultUniprotID = "P29016"
 
-printInfo = False
-
-
-parser = argparse.ArgumentParser(
-    prog="grafter.py",
-    usage="%(prog)s [options]. Most convenient usage: python grafter.py -import_uniprotIDs_from_file uniprotIDinputs.txt",
-    description=f"Graft Glycans to AlphaFoldDB models using Privateer Modelling module.",
-    epilog=f"If -local_receiver_path or -uniprotID are not provided, the script will default to using UniProtID: {defaultUniprotID} as default input. Will download the PDB from AlphaFoldDB and N-glycosylate according to UniProt data.",
-)
-parser.add_argument(
-    "-uniprotID",
-    action="store",
-    default=None,
-    dest="user_uniprotID",
-    help="If used with -local_receiver_path, N-glycosylate according to UniProt targets. If used without -local_receiver_path, this variable is used in the download of AlphaFoldDB .pdb file and N-Glycosylation according to UniProt targets.",
-)
-parser.add_argument(
-    "-local_receiver_path",
-    action="store",
-    default=None,
-    dest="user_localReceiverPath",
-    help=f"Path to locally saved AlpfaFoldDB model on the computer. If -uniprotID is not provided, will carry out N-glycosylation according to regex consensus sequence of '[N][^P][ST]|[N][A-Z][C]'. The argument overrides default behaviour of downloading AlpfaFoldDB model from the server. WARNING: Ensure that \"MODEL 0\" line is deleted in the local file, as otherwise Privateer's MMBD dependency will not be able to import the model!",
-)
-parser.add_argument(
-    "-donor_path",
-    action="store",
-    default=None,
-    dest="user_donorPath",
-    help=f"Path to the glycan that is to be grafted throughout AlphaFoldDB model. If not specified, the script will default to using glycan located in '{defaultDonorPath}'",
-)
-parser.add_argument(
-    "-download_path",
-    action="store",
-    default=None,
-    dest="user_inputModelDirectory",
-    help=f"Specify download directory where original AlpfaFoldDB models downloaded from the server should be saved. If unspecified, the script will default to '{defaultInputModelDirectory}'",
-)
-parser.add_argument(
-    "-output_path",
-    action="store",
-    default=None,
-    dest="user_outputPath",
-    help=f"Specify output directory where AlpfaFoldDB models with grafted glycans should be saved. If unspecified, the script will default to '{defaultOutputModelPath}'. If the argument is used alongside -local_receiver_path, then the name of PDB output file should be provided, for example 'P29016_output.pdb'",
-)
-parser.add_argument(
-    "-import_uniprotIDs_from_file",
-    action="store",
-    default=None,
-    dest="user_uniprotIDsList",
-    help=f"Glycosylate multiple AlphaFoldDB models from a list of UniProtIDs. Example file is located in '{defaultuniprotIDsListPath}' By default will download files from the server and save them localy in specified or default directory locations.",
-)
-
-parser.add_argument(
-    "-info",
-    action="store_true",
-    default=False,
-    dest="user_infoFlag",
-    help=f"Print out relevant information about donor PDB(where glycans are taken from) and receiver PDB(where glycans are grafted to). To be used in conjuction with '-local_receiver_path' and/or '-donor_path' and/or '-uniprotID' flags. Usage of this flag overrides grafting functionality, i.e. no grafting will be carried out.",
-)
-parser.add_argument(
-    "-manual_grafting",
-    action="store",
-    default=None,
-    dest="user_JSONgrafting",
-    help=f"Import a JSON file to manually graft glycans with total control over glycosylation sites. Example file is located at '{defaultJSONgrafting}'",
-)
-
-
-args = parser.parse_args()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="grafter.py",
+        usage="%(prog)s [options]. Most convenient usage: python grafter.py -import_uniprotIDs_from_file uniprotIDinputs.txt",
+        description=f"Graft Glycans to AlphaFoldDB models using Privateer Modelling module.",
+        epilog=f"If -local_receiver_path or -uniprotID are not provided, the script will default to using UniProtID: {defaultUniprotID} as default input. Will download the PDB from AlphaFoldDB and N-glycosylate according to UniProt data.",
+    )
+    parser.add_argument(
+        "-uniprotID",
+        action="store",
+        default=None,
+        dest="user_uniprotID",
+        help="If used with -local_receiver_path, N-glycosylate according to UniProt targets. If used without -local_receiver_path, this variable is used in the download of AlphaFoldDB .pdb file and N-Glycosylation according to UniProt targets.",
+    )
+    parser.add_argument(
+        "-local_receiver_path",
+        action="store",
+        default=None,
+        dest="user_localReceiverPath",
+        help=f"Path to locally saved AlpfaFoldDB model on the computer. If -uniprotID is not provided, will carry out N-glycosylation according to regex consensus sequence of '[N][^P][ST]|[N][A-Z][C]'. The argument overrides default behaviour of downloading AlpfaFoldDB model from the server. WARNING: Ensure that \"MODEL 0\" line is deleted in the local file, as otherwise Privateer's MMBD dependency will not be able to import the model!",
+    )
+    parser.add_argument(
+        "-donor_path",
+        action="store",
+        default=None,
+        dest="user_donorPath",
+        help=f"Path to the glycan that is to be grafted throughout AlphaFoldDB model. If not specified, the script will default to using glycan located in '{defaultDonorPath}'",
+    )
+    parser.add_argument(
+        "-donor_library",
+        action="store",
+        default=None,
+        dest="user_donorLibraryPath",
+        help="Conformer library built by conformer_library.py or glycam2pdb.py -library. -donor_path and the donor_path entries of -manual_grafting then name conformers in the library(e.g. man9/Cluster1) instead of PDB files.",
+    )
+    parser.add_argument(
+        "-download_path",
+        action="store",
+        default=None,
+        dest="user_inputModelDirectory",
+        help=f"Specify download directory where original AlpfaFoldDB models downloaded from the server should be saved. If unspecified, the script will default to '{defaultInputModelDirectory}'",
+    )
+    parser.add_argument(
+        "-output_path",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help=f"Specify output directory where AlpfaFoldDB models with grafted glycans should be saved. If unspecified, the script will default to '{defaultOutputModelPath}'. If the argument is used alongside -local_receiver_path, then the name of PDB output file should be provided, for example 'P29016_output.pdb'",
+    )
+    parser.add_argument(
+        "-import_uniprotIDs_from_file",
+        action="store",
+        default=None,
+        dest="user_uniprotIDsList",
+        help=f"Glycosylate multiple AlphaFoldDB models from a list of UniProtIDs. Example file is located in '{defaultuniprotIDsListPath}' By default will download files from the server and save them localy in specified or default directory locations.",
+    )
 
-if args.user_uniprotID is not None:
-    uniprotID = args.user_uniprotID
-else:
-    uniprotID = defaultUniprotID
-if args.user_donorPath is not None:
-    donorPath = args.user_donorPath
-else:
-    donorPath = defaultDonorPath
-if args.user_outputPath is not None:
-    outputPath = args.user_outputPath
-    if (
-        os.path.isdir(args.user_localReceiverPath)
-        and args.user_localReceiverPath is not None
-    ):
-        raise ValueError(
-            "ERROR: The combination of provided arguments requires -output_path argument to be a file name, rather than directory!"
-        )
-else:
-    outputPath = defaultOutputModelPath
-if args.user_inputModelDirectory is not None:
-    inputModelDirectory = args.user_inputModelDirectory
-else:
-    inputModelDirectory = defaultInputModelDirectory
+    parser.add_argument(
+        "-info",
+        action="store_true",
+        default=False,
+        dest="user_infoFlag",
+        help=f"Print out relevant information about donor PDB(where glycans are taken from) and receiver PDB(where glycans are grafted to). To be used in conjuction with '-local_receiver_path' and/or '-donor_path' and/or '-uniprotID' flags. Usage of this flag overrides grafting functionality, i.e. no grafting will be carried out.",
+    )
+    parser.add_argument(
+        "-manual_grafting",
+        action="store",
+        default=None,
+        dest="user_JSONgrafting",
+        help=f"Import a JSON file to manually graft glycans with total control over glycosylation sites. Example file is located at '{defaultJSONgrafting}'",
+    )
 
-if args.user_uniprotIDsList is not None:
-    uniprotIDListPath = args.user_uniprotIDsList
+    parser.add_argument(
+        "-jobs",
+        action="store",
+        type=positive_int,
+        default=1,
+        dest="user_jobs",
+        help="Number of worker processes grafting models in parallel when used with -import_uniprotIDs_from_file. Models are still reported in list order.",
+    )
+    add_supervision_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+    printInfo = False
+
+    if args.user_uniprotID is not None:
+        uniprotID = args.user_uniprotID
+    else:
+        uniprotID = defaultUniprotID
+    donorLibrary = None
+    donorDirectory = None
+    if args.user_donorLibraryPath is not None:
+        if args.user_donorPath is None and args.user_JSONgrafting is None:
+            raise ValueError(
+                "-donor_library requires -donor_path to name the conformer to graft."
+            )
+        donorLibrary = ConformerLibrary(args.user_donorLibraryPath)
+        donorDirectory = tempfile.mkdtemp(prefix="grafter_donors_")
+    # A failed model is reported with exit status 1, but only after the donor library and profiling session are closed.
+    graftingFailed = False
+    try:
+        if args.user_donorPath is not None:
+            donorPath = resolve_donor_path(
+                args.user_donorPath, donorLibrary, donorDirectory
+            )
+        else:
+            donorPath = defaultDonorPath
+        if args.user_outputPath is not None:
+            outputPath = args.user_outputPath
+            if (
+                os.path.isdir(args.user_localReceiverPath)
+                and args.user_localReceiverPath is not None
+            ):
+                raise ValueError(
+                    "ERROR: The combination of provided arguments requires -output_path argument to be a file name, rather than directory!"
+                )
+        else:
+            outputPath = defaultOutputModelPath
+        if args.user_inputModelDirectory is not None:
+            inputModelDirectory = args.user_inputModelDirectory
+        else:
+            inputModelDirectory = defaultInputModelDirectory
 
-if args.user_JSONgrafting is not None:
-    JSONgraftingPath = args.user_JSONgrafting
+        if args.user_uniprotIDsList is not None:
+            uniprotIDListPath = args.user_uniprotIDsList
 
-if args.user_infoFlag == True and not None:
-    printInfo = True
+        if args.user_JSONgrafting is not None:
+            JSONgraftingPath = args.user_JSONgrafting
 
+        if args.user_infoFlag == True and not None:
+            printInfo = True
 
-if (
-    args.user_localReceiverPath is not None
-    and args.user_uniprotID is None
-    and printInfo == False
-):
-    uniprotID = None
-    local_input_model_pipeline(
-        args.user_localReceiverPath, donorPath, outputPath, uniprotID
-    )
-elif (
-    args.user_localReceiverPath is not None
-    and args.user_uniprotID is not None
-    and printInfo == False
-):
-    local_input_model_pipeline(
-        args.user_localReceiverPath, donorPath, outputPath, uniprotID
-    )
-elif args.user_uniprotIDsList is not None and printInfo == False:
-    uniprotIDList = import_list_of_uniprotIDs_to_glycosylate(uniprotIDListPath)
-    for idx, uniprotID in enumerate(uniprotIDList):
-        online_input_model_pipeline(
-            uniprotID, donorPath, inputModelDirectory, outputPath
-        )
-        print(
-            f"\n{idx+1}/{len(uniprotIDList)}: Successfully finished processing AlphaFoldDB model with UniProt ID of {uniprotID}.\n"
-        )
-elif args.user_JSONgrafting is not None and printInfo == False:
-    JSONGraftInstructions = parse_json_for_grafting_instructions(JSONgraftingPath)
-    initialInputPath = JSONGraftInstructions["receiver_path"]
-    initialOutputSubsequentInputOutputPath = JSONGraftInstructions["output_path"]
-    glycosylations = JSONGraftInstructions["glycosylations"]
-    graftedGlycansSummary = []
-    for count, item in enumerate(glycosylations):
-        donorPath = item["donor_path"]
-        glycanIndex = item["glycan_index"]
-        receivingChainIndex = item["receiving_chain_index"]
-        receivingAminoAcidIndex = item["receiving_aa_index"]
-        if count == 0:
-            currentGraftedGlycanSummary = (
-                glycosylate_receiving_model_using_manual_instructions(
-                    initialInputPath,
-                    donorPath,
-                    initialOutputSubsequentInputOutputPath,
-                    glycanIndex,
-                    receivingChainIndex,
-                    receivingAminoAcidIndex,
-                    True,
-                    False,
-                )
+        if (
+            args.user_localReceiverPath is not None
+            and args.user_uniprotID is None
+            and printInfo == False
+        ):
+            uniprotID = None
+            local_input_model_pipeline(
+                args.user_localReceiverPath, donorPath, outputPath, uniprotID
             )
-            messageString = store_grafted_glycans_summary(
-                currentGraftedGlycanSummary, count, len(glycosylations)
+        elif (
+            args.user_localReceiverPath is not None
+            and args.user_uniprotID is not None
+            and printInfo == False
+        ):
+            local_input_model_pipeline(
+                args.user_localReceiverPath, donorPath, outputPath, uniprotID
             )
-            graftedGlycansSummary.append(messageString)
-        else:
-            currentGraftedGlycanSummary = (
-                glycosylate_receiving_model_using_manual_instructions(
-                    initialOutputSubsequentInputOutputPath,
-                    donorPath,
-                    initialOutputSubsequentInputOutputPath,
-                    glycanIndex,
-                    receivingChainIndex,
-                    receivingAminoAcidIndex,
-                    True,
-                    False,
+        elif (
+            args.user_uniprotIDsList is not None
+            and printInfo == False
+            and (
+                args.user_jobs > 1
+                or is_supervision_requested(get_supervision_settings(args))
+            )
+        ):
+            uniprotIDList = import_list_of_uniprotIDs_to_glycosylate(uniprotIDListPath)
+            failedModels = graft_uniprot_models_in_parallel(
+                uniprotIDList,
+                donorPath,
+                inputModelDirectory,
+                outputPath,
+                args.user_jobs,
+                get_supervision_settings(args),
+            )
+            graftingFailed = len(failedModels) > 0
+        elif args.user_uniprotIDsList is not None and printInfo == False:
+            uniprotIDList = import_list_of_uniprotIDs_to_glycosylate(uniprotIDListPath)
+            for idx, uniprotID in enumerate(uniprotIDList):
+                online_input_model_pipeline(
+                    uniprotID, donorPath, inputModelDirectory, outputPath
+                )
+                print(
+                    f"\n{idx+1}/{len(uniprotIDList)}: Successfully finished processing AlphaFoldDB model with UniProt ID of {uniprotID}.\n"
                 )
+        elif args.user_JSONgrafting is not None and printInfo == False:
+            JSONGraftInstructions = parse_json_for_grafting_instructions(
+                JSONgraftingPath
             )
-            messageString = store_grafted_glycans_summary(
-                currentGraftedGlycanSummary, count, len(glycosylations)
+            initialInputPath = JSONGraftInstructions["receiver_path"]
+            initialOutputSubsequentInputOutputPath = JSONGraftInstructions[
+                "output_path"
+            ]
+            glycosylations = JSONGraftInstructions["glycosylations"]
+            graftedGlycansSummary = []
+            for count, item in enumerate(glycosylations):
+                donorPath = resolve_donor_path(
+                    item["donor_path"], donorLibrary, donorDirectory
+                )
+                glycanIndex = item["glycan_index"]
+                receivingChainIndex = item["receiving_chain_index"]
+                receivingAminoAcidIndex = item["receiving_aa_index"]
+                if count == 0:
+                    currentGraftedGlycanSummary = (
+                        glycosylate_receiving_model_using_manual_instructions(
+                            initialInputPath,
+                            donorPath,
+                            initialOutputSubsequentInputOutputPath,
+                            glycanIndex,
+                            receivingChainIndex,
+                            receivingAminoAcidIndex,
+                            True,
+                            False,
+                        )
+                    )
+                    messageString = store_grafted_glycans_summary(
+                        currentGraftedGlycanSummary, count, len(glycosylations)
+                    )
+                    graftedGlycansSummary.append(messageString)
+                else:
+                    currentGraftedGlycanSummary = (
+                        glycosylate_receiving_model_using_manual_instructions(
+                            initialOutputSubsequentInputOutputPath,
+                            donorPath,
+                            initialOutputSubsequentInputOutputPath,
+                            glycanIndex,
+                            receivingChainIndex,
+                            receivingAminoAcidIndex,
+                            True,
+                            False,
+                        )
+                    )
+                    messageString = store_grafted_glycans_summary(
+                        currentGraftedGlycanSummary, count, len(glycosylations)
+                    )
+                    graftedGlycansSummary.append(messageString)
+            print("\n")
+            for message in graftedGlycansSummary:
+                print(message + "\n")
+
+        elif printInfo == True:
+            warnings.warn(
+                "-info flag was provided, overriding all arguments regarding grafting and printing info only. Please remove -info flag if you actually want to graft glycans."
             )
-            graftedGlycansSummary.append(messageString)
-    print("\n")
-    for message in graftedGlycansSummary:
-        print(message + "\n")
-
-elif printInfo == True:
-    warnings.warn(
-        "-info flag was provided, overriding all arguments regarding grafting and printing info only. Please remove -info flag if you actually want to graft glycans."
-    )
-    get_information_about_input_files(
-        args.user_localReceiverPath, args.user_donorPath, args.user_uniprotID
-    )
-else:
-    if printInfo == False:
-        online_input_model_pipeline(
-            uniprotID, donorPath, inputModelDirectory, outputPath
-        )
-    else:
-        warnings.warn(
-            "-info flag was provided, overriding all arguments regarding grafting and printing info only. Please remove -info flag if you actually want to graft glycans."
-        )
+            get_information_about_input_files(
+                args.user_localReceiverPath,
+                donorPath if args.user_donorPath is not None else None,
+                args.user_uniprotID,
+            )
+        else:
+            if printInfo == False:
+                online_input_model_pipeline(
+                    uniprotID, donorPath, inputModelDirectory, outputPath
+                )
+            else:
+                warnings.warn(
+                    "-info flag was provided, overriding all arguments regarding grafting and printing info only. Please remove -info flag if you actually want to graft glycans."
+                )
+    finally:
+        if donorLibrary is not None:
+            donorLibrary.close()
+            shutil.rmtree(donorDirectory)
+        stop_profiling_session(profilingSession)
+    if graftingFailed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+utilityScriptsPath = os.path.join(repositoryPath, "utility_scripts")
+glycamPDBFilesPath = os.path.join(repositoryPath, "glycampdbfiles")
+
+# The scripts import their siblings as top level modules when they are not run as a package.
+if utilityScriptsPath not in sys.path:
+    sys.path.insert(0, utilityScriptsPath)
+
+
+def get_glycam_input_paths(*corpusNames):
+    # Glycam structures only, the corpora also hold converted copies and AlphaFold receiver models.
+    inputFilePaths = []
+    for corpusName in corpusNames:
+        for root, dirs, files in os.walk(os.path.join(glycamPDBFilesPath, corpusName)):
+            if "Converted" in root:
+                continue
+            for name in files:
+                if name.endswith(".pdb") and not name.startswith("AF-"):
+                    inputFilePaths.append(os.path.join(root, name))
+    return sorted(inputFilePaths)
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import anomer_correction
+from conftest import glycamPDBFilesPath
+
+alphaInputPaths = [
+    os.path.join(glycamPDBFilesPath, "Volume", "man5", "Cluster1.pdb"),
+    os.path.join(glycamPDBFilesPath, "Volume", "man9", "Cluster2.pdb"),
+]
+
+
+def read_records(inputFilePath):
+    with open(inputFilePath) as file:
+        return file.readlines()
+
+
+def get_atom(Lines, residueName, atomName):
+    return next(
+        numpy.array(anomer_correction.parse_coordinates(line))
+        for line in Lines
+        if line[:6] in ("ATOM  ", "HETATM")
+        and line[17:20] == residueName
+        and line[12:16].strip() == atomName
+    )
+
+
+@pytest.mark.parametrize("inputFilePath", alphaInputPaths)
+def test_flipped_substituents_have_ideal_bond_lengths(inputFilePath):
+    Lines = read_records(inputFilePath)
+    [correctedLines] = anomer_correction.correctAnomers([Lines])
+    C1 = get_atom(correctedLines, "4YB", "C1")
+    # Coordinates are written with 3 decimals, which bounds how close to the ideal lengths they can be.
+    assert numpy.linalg.norm(get_atom(correctedLines, "4YB", "O1") - C1) == (
+        pytest.approx(1.40, abs=2e-3)
+    )
+    assert numpy.linalg.norm(get_atom(correctedLines, "4YB", "H1") - C1) == (
+        pytest.approx(1.09, abs=2e-3)
+    )
+
+
+def test_O1_and_H1_swap_directions():
+    Lines = read_records(alphaInputPaths[0])
+    [correctedLines] = anomer_correction.correctAnomers([Lines])
+    C1 = get_atom(Lines, "4YA", "C1")
+    oldO1 = get_atom(Lines, "ROH", "O1") - C1
+    oldH1 = get_atom(Lines, "4YA", "H1") - C1
+    newO1 = get_atom(correctedLines, "4YB", "O1") - C1
+    newH1 = get_atom(correctedLines, "4YB", "H1") - C1
+    assert numpy.dot(newO1, oldH1) / (
+        numpy.linalg.norm(newO1) * numpy.linalg.norm(oldH1)
+    ) == pytest.approx(1.0, abs=1e-4)
+    assert numpy.dot(newH1, oldO1) / (
+        numpy.linalg.norm(newH1) * numpy.linalg.norm(oldO1)
+    ) == pytest.approx(1.0, abs=1e-4)
+
+
+def test_aglycone_is_merged_into_the_beta_sugar():
+    Lines = read_records(alphaInputPaths[0])
+    [correctedLines] = anomer_correction.correctAnomers([Lines])
+    assert len(correctedLines) == len(Lines) - 1
+    assert not any(line[12:16].strip() == "HO1" for line in correctedLines)
+    assert not any("ROH" in line or "4YA" in line for line in correctedLines)
+    # The ROH oxygen becomes O1 of the reducing end sugar and is numbered like it.
+    residueSeq = next(line[22:26] for line in Lines if line[17:20] == "4YA")
+    assert [
+        line[12:16].strip()
+        for line in correctedLines
+        if line[17:20] == "4YB" and line[22:26] == residueSeq
+    ] == [
+        line[12:16].strip()
+        for line in Lines
+        if line[17:20] == "4YA" or (line[17:20] == "ROH" and "HO1" not in line)
+    ]
+
+
+def test_beta_structures_are_left_untouched():
+    Lines = read_records(alphaInputPaths[0])
+    [correctedLines] = anomer_correction.correctAnomers([Lines])
+    [uncorrectedLines] = anomer_correction.correctAnomers([correctedLines])
+    assert uncorrectedLines is correctedLines
+
+
+def test_batches_match_single_structures():
+    structures = [read_records(inputFilePath) for inputFilePath in alphaInputPaths]
+    frames = [(str(modelSerial), Lines) for modelSerial, Lines in enumerate(structures)]
+    assert [
+        frameLines
+        for modelSerial, frameLines in anomer_correction.correctAnomersInFrames(
+            frames, batchSize=1
+        )
+    ] == anomer_correction.correctAnomers(structures)
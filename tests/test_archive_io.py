@@ -0,0 +1,118 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import archive_io
+
+structureRecords = "ATOM      1  C1  MAN A   1       1.000   2.000   3.000\nEND\n"
+escapingMemberNames = [
+    "/tmp/escaped.pdb",
+    "../escaped.pdb",
+    "corpus/../../escaped.pdb",
+    "man5/../../escaped.pdb",
+    "..",
+]
+
+
+@pytest.mark.parametrize("memberName", escapingMemberNames)
+def test_members_leaving_the_archive_root_are_refused(memberName):
+    assert archive_io.get_member_relative_path(memberName, "corpus") is None
+
+
+@pytest.mark.parametrize(
+    "memberName, relativePath",
+    [
+        ("corpus/man5/Cluster1.pdb", os.path.join("man5", "Cluster1.pdb")),
+        ("man5/./Cluster1.pdb", os.path.join("man5", "Cluster1.pdb")),
+        ("man5/../man9/Cluster1.pdb", os.path.join("man9", "Cluster1.pdb")),
+    ],
+)
+def test_members_inside_the_archive_root_are_kept(memberName, relativePath):
+    assert archive_io.get_member_relative_path(memberName, "corpus") == relativePath
+
+
+def test_escaping_zip_members_are_skipped(tmp_path):
+    archivePath = str(tmp_path / "corpus.zip")
+    with zipfile.ZipFile(archivePath, "w") as archive:
+        for memberName in escapingMemberNames[:-1] + ["corpus/man5/Cluster1.pdb"]:
+            archive.writestr(memberName, structureRecords)
+    stagingDirectory = tmp_path / "staging"
+    stagingDirectory.mkdir()
+    stagedMembers = archive_io.stage_archive_members(archivePath, str(stagingDirectory))
+    assert stagedMembers == [
+        (
+            str(stagingDirectory / "man5" / "Cluster1.pdb"),
+            os.path.join(archivePath, "man5", "Cluster1.pdb"),
+        )
+    ]
+    assert not (tmp_path / "escaped.pdb").exists()
+
+
+def add_tar_member(archive, memberName, memberType=tarfile.REGTYPE, linkName=""):
+    member = tarfile.TarInfo(memberName)
+    member.type = memberType
+    member.linkname = linkName
+    if memberType == tarfile.REGTYPE:
+        member.size = len(structureRecords)
+        archive.addfile(member, io.BytesIO(structureRecords.encode("utf-8")))
+    else:
+        archive.addfile(member)
+
+
+def test_escaping_and_linked_tar_members_are_skipped(tmp_path):
+    archivePath = str(tmp_path / "corpus.tar.gz")
+    with tarfile.open(archivePath, "w:gz") as archive:
+        for memberName in escapingMemberNames[:-1]:
+            add_tar_member(archive, memberName)
+        add_tar_member(archive, "corpus/man5/Cluster1.pdb")
+        # Links could point anywhere on the machine reading the archive, they are never followed.
+        add_tar_member(
+            archive, "corpus/man5/passwd.pdb", tarfile.SYMTYPE, "/etc/passwd"
+        )
+        add_tar_member(
+            archive,
+            "corpus/man5/Cluster2.pdb",
+            tarfile.LNKTYPE,
+            "corpus/man5/Cluster1.pdb",
+        )
+    assert list(archive_io.iterate_archive_members(archivePath)) == [
+        (os.path.join("man5", "Cluster1.pdb"), structureRecords.splitlines(True))
+    ]
+
+
+def test_symlinked_output_folders_are_refused(tmp_path):
+    outsideDirectory = tmp_path / "outside"
+    outsideDirectory.mkdir()
+    stagingDirectory = tmp_path / "staging"
+    stagingDirectory.mkdir()
+    os.symlink(outsideDirectory, stagingDirectory / "man5")
+    with pytest.raises(ValueError):
+        archive_io.get_safe_output_path(
+            str(stagingDirectory), os.path.join("man5", "Cluster1.pdb")
+        )
+    assert archive_io.get_safe_output_path(
+        str(stagingDirectory), os.path.join("man9", "Cluster1.pdb")
+    ) == str(stagingDirectory / "man9" / "Cluster1.pdb")
+
+
+def test_tar_gz_output_round_trip(tmp_path):
+    sourceDirectory = tmp_path / "converted"
+    relativePaths = [
+        os.path.join("man5", "Cluster1.pdb"),
+        os.path.join("man5", "Cluster2.pdb"),
+        os.path.join("man9", "Cluster1.pdb"),
+    ]
+    for count, relativePath in enumerate(relativePaths):
+        os.makedirs(sourceDirectory / os.path.dirname(relativePath), exist_ok=True)
+        (sourceDirectory / relativePath).write_text(
+            f"REMARK {count}\n" + structureRecords
+        )
+    archivePath = str(tmp_path / "packed" / "converted.tar.gz")
+    assert archive_io.write_output_archive(str(sourceDirectory), archivePath) == 3
+    assert list(archive_io.iterate_archive_members(archivePath)) == [
+        (relativePath, (sourceDirectory / relativePath).read_text().splitlines(True))
+        for relativePath in relativePaths
+    ]
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import argparse
+
+import pytest
+
+import batch_runner
+
+
+def run_task(task):
+    # task is (name, action): "ok" returns the name, the others fail the way a bad native call would.
+    name, action = task
+    if action == "error":
+        raise ValueError(f"bad input {name}")
+    if action == "crash":
+        os._exit(3)
+    if action == "hang":
+        time.sleep(60)
+    return name.upper()
+
+
+def fail_to_initialize():
+    raise ImportError("no privateer")
+
+
+def get_task_name(task):
+    return task[0]
+
+
+tasks = [
+    ("first", "ok"),
+    ("broken", "error"),
+    ("crashing", "crash"),
+    ("hanging", "hang"),
+    ("last", "ok"),
+]
+
+
+def test_supervised_outcomes_come_back_in_input_order():
+    outcomes = list(
+        batch_runner.run_supervised_tasks(run_task, tasks, jobs=2, taskTimeout=1)
+    )
+    assert [task for task, result, failure in outcomes] == tasks
+    assert [result for task, result, failure in outcomes] == [
+        "FIRST",
+        None,
+        None,
+        None,
+        "LAST",
+    ]
+    failures = [failure for task, result, failure in outcomes]
+    assert failures[0] is None and failures[4] is None
+    assert failures[1] == {
+        "reason": "error",
+        "detail": "ValueError: bad input broken",
+        "attempts": 1,
+    }
+    # A crash is retried once on a fresh worker before it is reported.
+    assert failures[2] == {
+        "reason": "crashed",
+        "detail": "worker exited with code 3",
+        "attempts": 2,
+    }
+    assert failures[3]["reason"] == "timed out"
+    assert batch_runner.describe_failure(failures[2]) == (
+        "crashed 2 times (worker exited with code 3)"
+    )
+
+
+def test_crashes_and_timeouts_are_quarantined(tmp_path):
+    quarantinePath = str(tmp_path / "quarantine.json")
+    supervisionSettings = {
+        "taskTimeout": 1,
+        "memoryLimitMegabytes": None,
+        "quarantinePath": quarantinePath,
+    }
+    list(
+        batch_runner.run_supervised_batch(
+            run_task, tasks, 2, supervisionSettings, get_task_name
+        )
+    )
+    with open(quarantinePath) as reportFile:
+        quarantinedInputs = {
+            entry["input"]: entry["reason"]
+            for entry in json.load(reportFile)["quarantined"]
+        }
+    assert quarantinedInputs == {"crashing": "crashed", "hanging": "timed out"}
+    # Quarantined inputs are skipped by later runs even if they would now succeed.
+    outcomes = list(
+        batch_runner.run_supervised_batch(
+            run_task,
+            [("crashing", "ok"), ("hanging", "ok"), ("first", "ok")],
+            2,
+            supervisionSettings,
+            get_task_name,
+        )
+    )
+    assert [failure and failure["reason"] for task, result, failure in outcomes] == [
+        "quarantined",
+        "quarantined",
+        None,
+    ]
+
+
+def test_failed_initializer_fails_every_task():
+    outcomes = list(
+        batch_runner.run_supervised_tasks(
+            run_task, tasks[:1], jobs=1, initializer=fail_to_initialize
+        )
+    )
+    assert outcomes == [
+        (
+            tasks[0],
+            None,
+            {
+                "reason": "error",
+                "detail": "worker initialization failed, ImportError: no privateer",
+                "attempts": 1,
+            },
+        )
+    ]
+
+
+def test_in_process_runner_reports_errors_like_workers():
+    inProcessTasks = [task for task in tasks if task[1] in ("ok", "error")]
+    assert list(batch_runner.run_tasks_in_process(run_task, inProcessTasks)) == list(
+        batch_runner.run_supervised_tasks(run_task, inProcessTasks, jobs=2)
+    )
+
+
+@pytest.mark.parametrize("jobs", [0, -1])
+def test_batches_without_workers_are_refused(jobs):
+    # Raised before anything is iterated, with no workers the tasks would otherwise come back unstarted.
+    with pytest.raises(ValueError):
+        batch_runner.run_supervised_tasks(run_task, tasks, jobs=jobs)
+    with pytest.raises(ValueError):
+        batch_runner.run_supervised_batch(run_task, tasks, jobs, None, get_task_name)
+    with pytest.raises(argparse.ArgumentTypeError):
+        batch_runner.positive_int(str(jobs))
+    assert batch_runner.positive_int("2") == 2
@@ -0,0 +1,137 @@
+import os
+import shutil
+
+import pytest
+
+import conformer_library
+from conftest import glycamPDBFilesPath
+from conformer_library import ConformerLibrary
+
+convertedPath = os.path.join(glycamPDBFilesPath, "VolumeConvertedPDB")
+metadataPath = os.path.join(glycamPDBFilesPath, "VolumeConvertedmmCIF")
+conformerNames = ["man5/Cluster1", "man5/Cluster2", "man9/Cluster1"]
+
+
+def read_bytes(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+@pytest.fixture
+def corpusPath(tmp_path):
+    corpusPath = tmp_path / "corpusConvertedPDB"
+    for name in conformerNames:
+        os.makedirs(corpusPath / os.path.dirname(name), exist_ok=True)
+        shutil.copy(
+            os.path.join(convertedPath, name + ".pdb"), corpusPath / (name + ".pdb")
+        )
+    return corpusPath
+
+
+@pytest.fixture
+def libraryPath(tmp_path, corpusPath):
+    libraryPath = str(tmp_path / "corpus.conformers")
+    assert (
+        conformer_library.buildConformerLibrary(
+            str(corpusPath), libraryPath, metadataPath
+        )
+        == 3
+    )
+    return libraryPath
+
+
+def test_records_are_reproduced_byte_for_byte(libraryPath):
+    with ConformerLibrary(libraryPath) as library:
+        assert library.names() == conformerNames
+        for name in conformerNames:
+            assert library.get_pdb_string(name).encode("utf-8") == read_bytes(
+                os.path.join(convertedPath, name + ".pdb")
+            )
+
+
+def test_coordinates_match_the_pdb_columns(libraryPath):
+    numpy = pytest.importorskip("numpy")
+    for name in conformerNames:
+        with open(os.path.join(convertedPath, name + ".pdb")) as file:
+            coordinates = [
+                [float(line[30:38]), float(line[38:46]), float(line[46:54])]
+                for line in file
+                if line[:6] in ("ATOM  ", "HETATM")
+            ]
+        with ConformerLibrary(libraryPath) as library:
+            libraryCoordinates = library.get_coordinates(name)
+            assert libraryCoordinates.shape == (len(coordinates), 3)
+            assert numpy.array_equal(libraryCoordinates, numpy.array(coordinates))
+            assert library.get_metadata(name)["atoms"] == len(coordinates)
+            del libraryCoordinates
+
+
+def test_metadata_is_read_from_the_mmcif_files(libraryPath):
+    with ConformerLibrary(libraryPath) as library:
+        metadata = library.get_metadata("man5/Cluster1")
+    assert metadata["GlyTouCan"] == "G58214IQ"
+    assert metadata["WURCS"].startswith("WURCS=2.0/")
+    # Cluster1.pdb is named after its torsions in mmcif_export.clusterTorsionNames.
+    assert metadata["torsions"] == {"phi": 66.0, "psi": -179.0, "omega": -177.0}
+    assert metadata["representative"] == "man5/Cluster1"
+
+
+def test_unknown_conformers_are_refused(libraryPath):
+    with ConformerLibrary(libraryPath) as library:
+        assert "man5/missing" not in library
+        with pytest.raises(KeyError):
+            library.get_records("man5/missing")
+
+
+@pytest.mark.parametrize(
+    "headerField, value",
+    [("magic", b"NOTALIB!"), ("version", conformer_library.LIBRARY_VERSION + 1)],
+)
+def test_corrupt_headers_are_refused(libraryPath, headerField, value):
+    header = dict(
+        zip(
+            ("magic", "version", "conformers", "indexOffset", "indexLength"),
+            conformer_library.LIBRARY_HEADER.unpack_from(read_bytes(libraryPath)),
+        )
+    )
+    header[headerField] = value
+    with open(libraryPath, "r+b") as libraryFile:
+        libraryFile.write(conformer_library.LIBRARY_HEADER.pack(*header.values()))
+    with pytest.raises(ValueError):
+        ConformerLibrary(libraryPath)
+
+
+def test_failed_build_leaves_no_file_behind(tmp_path, corpusPath, libraryPath):
+    library = read_bytes(libraryPath)
+    # Coordinates written with more than three decimals cannot be stored losslessly.
+    with open(corpusPath / "man9" / "Cluster1.pdb") as file:
+        Lines = file.readlines()
+    atomIndex = next(
+        idx for idx, line in enumerate(Lines) if line[:6] in ("ATOM  ", "HETATM")
+    )
+    Lines[atomIndex] = Lines[atomIndex][:30] + "  1.2345" + Lines[atomIndex][38:]
+    with open(corpusPath / "man9" / "Cluster1.pdb", "w") as file:
+        file.writelines(Lines)
+    newLibraryPath = str(tmp_path / "new.conformers")
+    for path in (newLibraryPath, libraryPath):
+        with pytest.raises(ValueError):
+            conformer_library.buildConformerLibrary(str(corpusPath), path)
+        assert not os.path.exists(path + ".tmp")
+    assert not os.path.exists(newLibraryPath)
+    # An existing library is left as it was.
+    assert read_bytes(libraryPath) == library
+
+
+def test_near_identical_conformers_share_a_representative(tmp_path, corpusPath):
+    pytest.importorskip("numpy")
+    shutil.copy(
+        corpusPath / "man5" / "Cluster1.pdb", corpusPath / "man5" / "Cluster3.pdb"
+    )
+    libraryPath = str(tmp_path / "dedup.conformers")
+    conformer_library.buildConformerLibrary(
+        str(corpusPath), libraryPath, dedupTolerance=0.1
+    )
+    with ConformerLibrary(libraryPath) as library:
+        assert library.get_representative("man5/Cluster3") == "man5/Cluster1"
+        assert "man5/Cluster3" not in library.get_representative_names()
+        assert "man9/Cluster1" in library.get_representative_names()
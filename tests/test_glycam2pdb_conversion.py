@@ -0,0 +1,172 @@
+import os
+import re
+
+import pytest
+
+import glycam2pdb
+from conftest import get_glycam_input_paths
+
+corpusInputPaths = get_glycam_input_paths(
+    "Volume", "Complex", "conf", "atom_replacement_test", "omannose"
+)
+
+
+# Regex based conversion glycam2pdb used before records were read by fixed columns, kept as the reference output.
+def regex_generateROHReplacementInstructions(Lines):
+    regex = "|".join(
+        "([\\w]({}))".format(k)
+        for k in glycam2pdb.glycamOneLetterToPDBThreeLetterCodeConversion
+    )
+    for idx, line in enumerate(Lines):
+        if re.search("(ROH)", line) is not None:
+            while idx < len(Lines):
+                glycamCodeMatch = re.search(regex, Lines[idx])
+                if glycamCodeMatch is not None:
+                    return {
+                        "replacement_code": glycamCodeMatch.group(),
+                        "replacement_residue_ID": Lines[idx].split()[4],
+                    }
+                idx += 1
+    return None
+
+
+def regex_replaceROH(instructionsForROHReplacement, Lines):
+    if instructionsForROHReplacement == None:
+        return Lines
+    output = []
+    for line in Lines:
+        if "ROH" in line:
+            splitLine = re.split(
+                r"(\s+)",
+                line.replace("ROH", instructionsForROHReplacement["replacement_code"]),
+            )
+            splitLine[8] = re.sub(
+                "\\d",
+                instructionsForROHReplacement["replacement_residue_ID"],
+                splitLine[8],
+            )
+            output.append("".join(splitLine))
+        else:
+            output.append(line)
+    return output
+
+
+def regex_convertGlycamToPDB(inputPDB):
+    conversionTable = glycam2pdb.glycamOneLetterToPDBThreeLetterCodeConversion
+    regex_residue_code = "|".join("([\\w]({}))".format(k) for k in conversionTable)
+    regex_atom_code = "|".join("({})".format(k) for k in glycam2pdb.atom_replacements)
+    output = []
+    for line in inputPDB:
+        splitLine = re.split(r"(\s+)", line)
+        if len(splitLine) > 10:
+            match_residue_code = re.search(regex_residue_code, splitLine[6])
+            match_atom_code = re.search(regex_atom_code, splitLine[4])
+            if match_residue_code is not None:
+                codeToReplace = splitLine[6][
+                    match_residue_code.start() + 1 : match_residue_code.end()
+                ]
+                splitLine[6] = re.sub(
+                    match_residue_code.group(),
+                    conversionTable[codeToReplace]["PDB"],
+                    splitLine[6],
+                )
+            if match_atom_code is not None:
+                codeToReplace = splitLine[4][
+                    match_atom_code.start() : match_atom_code.end()
+                ]
+                splitLine[4] = re.sub(
+                    match_atom_code.group(),
+                    glycam2pdb.atom_replacements[codeToReplace].ljust(
+                        len(codeToReplace)
+                    ),
+                    splitLine[4],
+                )
+            output.append("".join(splitLine))
+        elif splitLine[0] == "TER":
+            match_residue_code = re.search(regex_residue_code, line)
+            codeToReplace = line[
+                match_residue_code.start() + 1 : match_residue_code.end()
+            ]
+            output.append(
+                line.replace(
+                    match_residue_code.group(), conversionTable[codeToReplace]["PDB"]
+                )
+            )
+        else:
+            output.append(line)
+    return output
+
+
+def regex_conversionPipeline(path):
+    glycamPDB = glycam2pdb.import_pdb(path)
+    return regex_convertGlycamToPDB(
+        regex_replaceROH(regex_generateROHReplacementInstructions(glycamPDB), glycamPDB)
+    )
+
+
+@pytest.mark.parametrize(
+    "inputFilePath",
+    corpusInputPaths,
+    ids=[
+        os.path.relpath(inputFilePath, os.path.dirname(os.path.dirname(inputFilePath)))
+        for inputFilePath in corpusInputPaths
+    ],
+)
+def test_fixed_column_conversion_matches_regex_conversion(inputFilePath):
+    assert glycam2pdb.conversionPipeline(inputFilePath) == regex_conversionPipeline(
+        inputFilePath
+    )
+
+
+def test_unsupported_sugars_are_reported(capsys):
+    # The residue of every record is looked up by its columns, so each unsupported residue is reported once per atom.
+    unsupportedCode = next(
+        code
+        for code, conversion in glycam2pdb.glycamOneLetterToPDBThreeLetterCodeConversion.items()
+        if conversion["supported"] == False
+    )
+    residueName = "0" + unsupportedCode
+    Lines = [
+        f"ATOM      1  C1  {residueName:<3} A   1       0.000   0.000   0.000  1.00  0.00           C\n",
+        f"ATOM      2  O5  {residueName:<3} A   1       1.000   0.000   0.000  1.00  0.00           O\n",
+    ]
+    convertedPDB = glycam2pdb.convertGlycamToPDB(
+        glycam2pdb.glycamResidueCodeLookup,
+        glycam2pdb.glycamAtomNameLookup,
+        Lines,
+        "unsupported.pdb",
+        glycam2pdb.get_glycam_record_template,
+    )
+    replacementPDBCode = glycam2pdb.glycamOneLetterToPDBThreeLetterCodeConversion[
+        unsupportedCode
+    ]["PDB"]
+    assert [line[17:20] for line in convertedPDB] == [replacementPDBCode] * 2
+    assert "Detected 2 sugars that are not supported" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "inputFilePath",
+    corpusInputPaths,
+    ids=[
+        os.path.relpath(inputFilePath, os.path.dirname(os.path.dirname(inputFilePath)))
+        for inputFilePath in corpusInputPaths
+    ],
+)
+def test_streaming_conversion_matches_conversion(inputFilePath):
+    assert list(
+        glycam2pdb.streamingConversionPipeline(inputFilePath)
+    ) == glycam2pdb.conversionPipeline(inputFilePath)
+
+
+def test_streamed_ROH_replacement_gives_up_after_lookahead_limit():
+    # The reducing end sugar is the third record, so a lookahead of two records still finds it but one does not.
+    Lines = [
+        "ATOM      1  HO1 ROH     1      24.354  14.597  17.475  0.4450  0.2000       H1  \n",
+        "ATOM      2  O1  ROH     1      23.749  15.086  16.913 -0.6390  1.7210       O1  \n",
+        "ATOM      3  C1  4YA     2      22.664  15.294  17.767  0.4680  1.9080       C1  \n",
+    ]
+    instructionsForROHReplacement = glycam2pdb.generateROHReplacementInstructions(Lines)
+    assert list(
+        glycam2pdb.streamROHReplacement(Lines, lookaheadLimit=2)
+    ) == glycam2pdb.replaceROH(instructionsForROHReplacement, Lines)
+    assert list(glycam2pdb.streamROHReplacement(Lines, lookaheadLimit=1)) == Lines
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+
+import pytest
+
+import glycam2pdb
+from conftest import glycamPDBFilesPath
+
+corpusFiles = ["man5/Cluster1.pdb", "man5/Cluster2.pdb", "man9/Cluster1.pdb"]
+
+
+@pytest.fixture
+def corpusPath(tmp_path):
+    corpusPath = tmp_path / "corpus"
+    for relativeInputPath in corpusFiles:
+        os.makedirs(corpusPath / os.path.dirname(relativeInputPath), exist_ok=True)
+        shutil.copy(
+            os.path.join(glycamPDBFilesPath, "Volume", relativeInputPath),
+            corpusPath / relativeInputPath,
+        )
+    return corpusPath
+
+
+def run_incremental(corpusPath, capsys, *arguments):
+    glycam2pdb.main(["-input", str(corpusPath), "-incremental", *arguments])
+    return capsys.readouterr().out
+
+
+def read_manifest(corpusPath):
+    with open(str(corpusPath) + "ConvertedPDB.manifest.json") as manifestFile:
+        return json.load(manifestFile)
+
+
+def test_unchanged_inputs_are_skipped(corpusPath, capsys):
+    outputPath = str(corpusPath) + "ConvertedPDB"
+    assert "Converted 3 changed files, skipped 0" in run_incremental(corpusPath, capsys)
+    assert sorted(read_manifest(corpusPath)["files"]) == corpusFiles
+    assert os.path.exists(os.path.join(outputPath, "man9", "Cluster1.pdb"))
+    assert "Converted 0 changed files, skipped 3" in run_incremental(corpusPath, capsys)
+
+
+def test_changed_and_missing_outputs_are_reconverted(corpusPath, capsys):
+    outputPath = str(corpusPath) + "ConvertedPDB"
+    run_incremental(corpusPath, capsys)
+    with open(corpusPath / "man5" / "Cluster2.pdb", "a") as inputFile:
+        inputFile.write("REMARK   1 EDITED\n")
+    os.remove(os.path.join(outputPath, "man9", "Cluster1.pdb"))
+    assert "Converted 2 changed files, skipped 1" in run_incremental(corpusPath, capsys)
+    with open(os.path.join(outputPath, "man5", "Cluster2.pdb")) as outputFile:
+        assert outputFile.readlines()[-1] == "REMARK   1 EDITED\n"
+    assert os.path.exists(os.path.join(outputPath, "man9", "Cluster1.pdb"))
+
+
+def test_outputs_of_deleted_inputs_are_pruned(corpusPath, capsys):
+    outputPath = str(corpusPath) + "ConvertedPDB"
+    run_incremental(corpusPath, capsys)
+    os.remove(corpusPath / "man9" / "Cluster1.pdb")
+    output = run_incremental(corpusPath, capsys)
+    assert "Removed output of deleted input man9/Cluster1.pdb" in output
+    assert not os.path.exists(os.path.join(outputPath, "man9", "Cluster1.pdb"))
+    assert "man9/Cluster1.pdb" not in read_manifest(corpusPath)["files"]
+
+
+def test_different_conversion_settings_rebuild_everything(corpusPath, capsys):
+    run_incremental(corpusPath, capsys)
+    assert "Converted 3 changed files, skipped 0" in run_incremental(
+        corpusPath, capsys, "-trajectory", "multimodel"
+    )
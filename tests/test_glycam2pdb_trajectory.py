@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+import glycam2pdb
+from conftest import glycamPDBFilesPath
+
+frameInputPaths = [
+    os.path.join(glycamPDBFilesPath, "Volume", "man5", "Cluster1.pdb"),
+    os.path.join(glycamPDBFilesPath, "Volume", "man5", "Cluster2.pdb"),
+]
+headerLines = ["REMARK   1 TRAJECTORY OF MAN5\n"]
+
+
+def read_frame(inputFilePath):
+    with open(inputFilePath) as file:
+        return [line for line in file if line[:5] != "MODEL" and line[:6] != "ENDMDL"]
+
+
+@pytest.fixture
+def trajectoryPath(tmp_path):
+    # Two MODEL/ENDMDL blocks after a header, as Glycam writes trajectories.
+    trajectoryPath = tmp_path / "trajectory.pdb"
+    with open(trajectoryPath, "w") as file:
+        file.writelines(headerLines)
+        for modelSerial, frameInputPath in enumerate(frameInputPaths, 1):
+            file.write(f"MODEL     {modelSerial:>4}\n")
+            file.writelines(read_frame(frameInputPath))
+            file.write("ENDMDL\n")
+        file.write("END\n")
+    return str(trajectoryPath)
+
+
+def get_converted_frames():
+    return [
+        glycam2pdb.convertFrame(read_frame(frameInputPath), frameInputPath)
+        for frameInputPath in frameInputPaths
+    ]
+
+
+def test_multimodel_keeps_every_frame_in_one_file(trajectoryPath, tmp_path):
+    outputFilePath = str(tmp_path / "converted.pdb")
+    assert glycam2pdb.convertFile(trajectoryPath, outputFilePath, "multimodel") == [
+        outputFilePath
+    ]
+    with open(outputFilePath) as file:
+        frames = list(glycam2pdb.split_pdb_frames(file))
+    assert frames == [
+        (None, glycam2pdb.convertFrame(headerLines, trajectoryPath)),
+        ("1", get_converted_frames()[0]),
+        ("2", get_converted_frames()[1]),
+        (None, ["END\n"]),
+    ]
+
+
+def test_split_writes_one_file_per_frame(trajectoryPath, tmp_path):
+    outputFilePath = str(tmp_path / "converted.pdb")
+    outputFilePaths = glycam2pdb.convertFile(trajectoryPath, outputFilePath, "split")
+    assert outputFilePaths == [
+        str(tmp_path / "converted_model1.pdb"),
+        str(tmp_path / "converted_model2.pdb"),
+    ]
+    for frameFilePath, convertedFrame in zip(outputFilePaths, get_converted_frames()):
+        with open(frameFilePath) as file:
+            assert file.readlines() == headerLines + convertedFrame + ["END\n"]
+
+
+def test_split_without_models_writes_the_input_file(tmp_path):
+    outputFilePath = str(tmp_path / "converted.pdb")
+    assert glycam2pdb.convertFile(frameInputPaths[0], outputFilePath, "split") == [
+        str(tmp_path / "converted_model1927.pdb")
+    ]
+    singleFramePath = tmp_path / "single.pdb"
+    singleFramePath.write_text("".join(read_frame(frameInputPaths[0])))
+    assert glycam2pdb.convertFile(str(singleFramePath), outputFilePath, "split") == [
+        outputFilePath
+    ]
+    with open(outputFilePath) as file:
+        assert file.readlines() == get_converted_frames()[0]
+
+
+def test_multimodel_mmcif_output_is_refused(trajectoryPath, tmp_path):
+    with pytest.raises(ValueError):
+        glycam2pdb.convertFile(
+            trajectoryPath, str(tmp_path / "converted.pdb"), "multimodel", True
+        )
+
+
+def test_anomer_correction_holds_at_most_one_batch_of_frames(
+    monkeypatch, trajectoryPath, tmp_path
+):
+    anomer_correction = pytest.importorskip("anomer_correction")
+    pytest.importorskip("numpy")
+    batchSizes = []
+    correct_frame_batch = anomer_correction.correct_frame_batch
+
+    def record_frame_batch(batch, targetAnomer):
+        batchSizes.append(len(batch))
+        return correct_frame_batch(batch, targetAnomer)
+
+    monkeypatch.setattr(anomer_correction, "correct_frame_batch", record_frame_batch)
+    batchedOutputPath = str(tmp_path / "batched.pdb")
+    glycam2pdb.convertFile(trajectoryPath, batchedOutputPath, "multimodel", False, True)
+    assert batchSizes == [4]
+    monkeypatch.setattr(glycam2pdb, "anomerCorrectionBatchSize", 1)
+    singleFrameOutputPath = str(tmp_path / "single_frame.pdb")
+    glycam2pdb.convertFile(
+        trajectoryPath, singleFrameOutputPath, "multimodel", False, True
+    )
+    # The header, both frames and END are corrected one at a time, with the same result.
+    assert batchSizes == [4, 1, 1, 1, 1]
+    with open(batchedOutputPath) as batchedFile, open(
+        singleFrameOutputPath
+    ) as singleFrameFile:
+        assert batchedFile.read() == singleFrameFile.read()
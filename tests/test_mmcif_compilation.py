@@ -0,0 +1,170 @@
+import os
+
+import pytest
+
+gemmi = pytest.importorskip("gemmi")
+
+import mmcif_compilation
+from conftest import glycamPDBFilesPath
+from mmcif_compilation import CompilationReader
+
+# Written before the index had offsets, WURCS or GlyTouCan IDs.
+legacyCompilationPath = os.path.join(
+    glycamPDBFilesPath, "VolumeConvertedmmCIF", "compilation.mmCIF"
+)
+# Also written before repeated block names were numbered, five of its blocks are named "confConvertedPDB/".
+legacyConformerCompilationPath = os.path.join(
+    glycamPDBFilesPath, "confConvertedmmCIF", "compilation.mmCIF"
+)
+
+
+def get_compilation_blocks(compilationPath):
+    compilationBlocks = []
+    for gemmiBlock in list(gemmi.cif.read(compilationPath))[1:]:
+        WURCS, glytoucanID = mmcif_compilation.get_block_identifiers(gemmiBlock)
+        compilationBlocks.append(
+            {
+                "name": gemmiBlock.name,
+                "block": gemmiBlock.as_string(),
+                "WURCS": WURCS,
+                "GlyTouCan": glytoucanID,
+            }
+        )
+    return compilationBlocks
+
+
+@pytest.fixture(scope="module")
+def compilationBlocks():
+    return get_compilation_blocks(legacyCompilationPath)
+
+
+@pytest.fixture
+def compilationPath(tmp_path, compilationBlocks):
+    compilationPath = str(tmp_path / "compilation.mmCIF")
+    mmcif_compilation.write_compilation(compilationPath, compilationBlocks)
+    return compilationPath
+
+
+def test_compilation_is_a_regular_mmcif_document(compilationPath, compilationBlocks):
+    gemmiDocument = gemmi.cif.read(compilationPath)
+    assert [gemmiBlock.name for gemmiBlock in gemmiDocument] == ["index"] + [
+        compilationBlock["name"] for compilationBlock in compilationBlocks
+    ]
+    with open(compilationPath) as compilationFile:
+        assert compilationFile.read() == gemmiDocument.as_string()
+
+
+def test_index_round_trip(compilationPath, compilationBlocks):
+    with CompilationReader(compilationPath) as compilation:
+        assert len(compilation) == len(compilationBlocks)
+        assert compilation.names() == [
+            compilationBlock["name"] for compilationBlock in compilationBlocks
+        ]
+        for compilationBlock in compilationBlocks:
+            entry = compilation.get_entry(compilationBlock["name"])
+            assert (entry["WURCS"], entry["GlyTouCan"]) == (
+                compilationBlock["WURCS"],
+                compilationBlock["GlyTouCan"],
+            )
+
+
+def test_blocks_are_read_by_offset(compilationPath, compilationBlocks):
+    # Blocks are read in reverse to make sure nothing depends on reading the file front to back.
+    with CompilationReader(compilationPath) as compilation:
+        for compilationBlock in reversed(compilationBlocks):
+            assert (
+                compilation.get_block_text(compilationBlock["name"])
+                == compilationBlock["block"]
+            )
+        name = compilationBlocks[3]["name"]
+        assert compilation.get_structure(name).name == name
+        assert name in compilation
+        assert "man5/missing" not in compilation
+        with pytest.raises(KeyError):
+            compilation.get_entry("man5/missing")
+
+
+def test_blocks_are_found_by_WURCS(compilationPath, compilationBlocks):
+    WURCS = compilationBlocks[0]["WURCS"]
+    with CompilationReader(compilationPath) as compilation:
+        assert compilation.get_names_by_WURCS(WURCS) == [
+            compilationBlock["name"]
+            for compilationBlock in compilationBlocks
+            if compilationBlock["WURCS"] == WURCS
+        ]
+
+
+def test_legacy_compilation_is_scanned(compilationBlocks):
+    with CompilationReader(legacyCompilationPath) as compilation:
+        assert compilation.names() == [
+            compilationBlock["name"] for compilationBlock in compilationBlocks
+        ]
+        for compilationBlock in compilationBlocks:
+            entry = compilation.get_entry(compilationBlock["name"])
+            assert entry["WURCS"] is not None
+            assert (entry["WURCS"], entry["GlyTouCan"]) == (
+                compilationBlock["WURCS"],
+                compilationBlock["GlyTouCan"],
+            )
+            assert (
+                compilation.get_block(compilationBlock["name"]).as_string()
+                == compilationBlock["block"]
+            )
+
+
+def test_repeated_legacy_block_names_are_numbered():
+    with CompilationReader(legacyConformerCompilationPath) as compilation:
+        repeatedNames = [
+            name for name in compilation if name.startswith("confConvertedPDB/#")
+        ]
+        assert repeatedNames == [f"confConvertedPDB/#{count}" for count in range(2, 6)]
+        assert len(set(compilation.names())) == len(compilation) == 7
+        offsets = {compilation.get_entry(name)["offset"] for name in compilation}
+        assert len(offsets) == len(compilation)
+        assert compilation.get_block("confConvertedPDB/#3").name == "confConvertedPDB/"
+
+
+def test_repeated_block_names_are_numbered_before_writing(tmp_path, compilationBlocks):
+    repeatedBlocks = [compilationBlocks[0], compilationBlocks[1], compilationBlocks[0]]
+    compilationPath = str(tmp_path / "compilation.mmCIF")
+    with pytest.raises(ValueError):
+        mmcif_compilation.write_compilation(compilationPath, repeatedBlocks)
+    uniqueBlocks = mmcif_compilation.make_block_names_unique(repeatedBlocks)
+    name = compilationBlocks[0]["name"]
+    assert [compilationBlock["name"] for compilationBlock in uniqueBlocks] == [
+        name,
+        compilationBlocks[1]["name"],
+        name + "#2",
+    ]
+    mmcif_compilation.write_compilation(compilationPath, uniqueBlocks)
+    assert [gemmiBlock.name for gemmiBlock in gemmi.cif.read(compilationPath)][-1] == (
+        name + "#2"
+    )
+
+
+def test_edited_compilation_is_detected(compilationPath, compilationBlocks):
+    with open(compilationPath, "r+b") as compilationFile:
+        contents = compilationFile.read()
+        indexEnd = contents.index(b"\ndata_") + 1
+        compilationFile.seek(indexEnd)
+        compilationFile.write(b"\n" + contents[indexEnd:])
+    with CompilationReader(compilationPath) as compilation:
+        with pytest.raises(ValueError):
+            compilation.get_block_text(compilationBlocks[-1]["name"])
+
+
+def test_extract_writes_a_single_block(tmp_path, compilationPath, compilationBlocks):
+    outputFilePath = str(tmp_path / "block.mmCIF")
+    mmcif_compilation.main(
+        [
+            "-input",
+            compilationPath,
+            "-extract",
+            compilationBlocks[5]["name"],
+            "-output",
+            outputFilePath,
+        ]
+    )
+    assert gemmi.cif.read(outputFilePath).sole_block().as_string() == (
+        compilationBlocks[5]["block"]
+    )
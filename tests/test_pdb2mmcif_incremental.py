@@ -0,0 +1,154 @@
+import os
+import shutil
+
+import pytest
+
+gemmi = pytest.importorskip("gemmi")
+
+import pdb2mmcif
+from conftest import glycamPDBFilesPath
+
+corpusFiles = ["man5/Cluster1.pdb", "man5/Cluster2.pdb", "man9/Cluster1.pdb"]
+
+
+class FakePrivateerMetadata:
+    # Stands in for getMetadataFromPrivateer, which needs Privateer, and records which structures were analysed.
+    def __init__(self):
+        self.inputFilePaths = []
+
+    def __call__(self, inputFilePath, privateerJSON=None):
+        self.inputFilePaths.append(inputFilePath)
+        glycanName = os.path.basename(os.path.dirname(inputFilePath))
+        return {
+            "glycanWURCS": f"WURCS=2.0/{glycanName}",
+            "glytoucanID": glycanName.upper(),
+            "sugar_connections": [],
+        }
+
+
+@pytest.fixture
+def privateerMetadata(monkeypatch):
+    privateerMetadata = FakePrivateerMetadata()
+    monkeypatch.setattr(pdb2mmcif, "getMetadataFromPrivateer", privateerMetadata)
+    monkeypatch.setattr(pdb2mmcif, "get_privateer_version", lambda: "test")
+    return privateerMetadata
+
+
+@pytest.fixture
+def corpusPath(tmp_path):
+    corpusPath = tmp_path / "corpusConvertedPDB"
+    for relativeInputPath in corpusFiles:
+        os.makedirs(corpusPath / os.path.dirname(relativeInputPath), exist_ok=True)
+        shutil.copy(
+            os.path.join(glycamPDBFilesPath, "VolumeConvertedPDB", relativeInputPath),
+            corpusPath / relativeInputPath,
+        )
+    return corpusPath
+
+
+def compile_incrementally(corpusPath, tmp_path):
+    outputPath = str(tmp_path / "corpusConvertedmmCIF")
+    assert (
+        pdb2mmcif.compileCIFDirectory(str(corpusPath), outputPath, incremental=True)
+        == []
+    )
+    return os.path.join(outputPath, "compilation.mmCIF")
+
+
+def compile_from_scratch(corpusPath, tmp_path):
+    outputPath = str(tmp_path / "fullRebuild")
+    shutil.rmtree(outputPath, ignore_errors=True)
+    assert pdb2mmcif.compileCIFDirectory(str(corpusPath), outputPath) == []
+    return os.path.join(outputPath, "compilation.mmCIF")
+
+
+def read_bytes(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_unchanged_blocks_are_copied(privateerMetadata, corpusPath, tmp_path):
+    compilationPath = compile_incrementally(corpusPath, tmp_path)
+    compilation = read_bytes(compilationPath)
+    assert len(privateerMetadata.inputFilePaths) == 3
+    compile_incrementally(corpusPath, tmp_path)
+    assert len(privateerMetadata.inputFilePaths) == 3
+    assert read_bytes(compilationPath) == compilation
+
+
+def test_changed_added_and_deleted_inputs_are_spliced(
+    privateerMetadata, corpusPath, tmp_path
+):
+    compilationPath = compile_incrementally(corpusPath, tmp_path)
+    with open(corpusPath / "man5" / "Cluster2.pdb", "a") as inputFile:
+        inputFile.write("REMARK   1 EDITED\n")
+    os.makedirs(corpusPath / "man6.1")
+    shutil.copy(
+        os.path.join(
+            glycamPDBFilesPath, "VolumeConvertedPDB", "man6.1", "Cluster1.pdb"
+        ),
+        corpusPath / "man6.1" / "Cluster1.pdb",
+    )
+    os.remove(corpusPath / "man9" / "Cluster1.pdb")
+    del privateerMetadata.inputFilePaths[:]
+    compile_incrementally(corpusPath, tmp_path)
+    assert sorted(privateerMetadata.inputFilePaths) == [
+        str(corpusPath / "man5" / "Cluster2.pdb"),
+        str(corpusPath / "man6.1" / "Cluster1.pdb"),
+    ]
+    assert not os.path.exists(
+        tmp_path / "corpusConvertedmmCIF" / "man9" / "Cluster1.mmCIF"
+    )
+    assert read_bytes(compilationPath) == read_bytes(
+        compile_from_scratch(corpusPath, tmp_path)
+    )
+
+
+def test_repeated_block_names_match_a_full_rebuild(
+    privateerMetadata, corpusPath, tmp_path
+):
+    # Cluster1.pdb is named after its torsions, so a file named after them gets the same block name.
+    torsionNamedPath = corpusPath / "man5" / "Phi=66_Psi=-179_Omega=-177.pdb"
+    shutil.copy(corpusPath / "man5" / "Cluster2.pdb", torsionNamedPath)
+    compilationPath = compile_incrementally(corpusPath, tmp_path)
+    assert read_bytes(compilationPath) == read_bytes(
+        compile_from_scratch(corpusPath, tmp_path)
+    )
+    # Once Cluster1.pdb is gone its copied namesake loses the #2 suffix, as it would in a full rebuild.
+    os.remove(corpusPath / "man5" / "Cluster1.pdb")
+    del privateerMetadata.inputFilePaths[:]
+    compile_incrementally(corpusPath, tmp_path)
+    assert privateerMetadata.inputFilePaths == []
+    assert read_bytes(compilationPath) == read_bytes(
+        compile_from_scratch(corpusPath, tmp_path)
+    )
+    assert [gemmiBlock.name for gemmiBlock in gemmi.cif.read(compilationPath)] == [
+        "index",
+        "man5/Phi=66_Psi=-179_Omega=55.1",
+        "man5/Phi=66_Psi=-179_Omega=-177",
+        "man9/Phi=66_Psi=-179_Omega=-177",
+    ]
+
+
+def test_edited_compilation_is_rebuilt(privateerMetadata, corpusPath, tmp_path):
+    compilationPath = compile_incrementally(corpusPath, tmp_path)
+    # Shifting every block by a byte leaves the index offsets pointing at the wrong place.
+    contents = read_bytes(compilationPath)
+    indexEnd = contents.index(b"\ndata_") + 1
+    with open(compilationPath, "wb") as compilationFile:
+        compilationFile.write(contents[:indexEnd] + b"\n" + contents[indexEnd:])
+    del privateerMetadata.inputFilePaths[:]
+    compile_incrementally(corpusPath, tmp_path)
+    assert len(privateerMetadata.inputFilePaths) == 3
+    assert read_bytes(compilationPath) == read_bytes(
+        compile_from_scratch(corpusPath, tmp_path)
+    )
+
+
+def test_unidentified_privateer_rebuilds_everything(
+    monkeypatch, privateerMetadata, corpusPath, tmp_path
+):
+    monkeypatch.setattr(pdb2mmcif, "get_privateer_version", lambda: None)
+    compile_incrementally(corpusPath, tmp_path)
+    compile_incrementally(corpusPath, tmp_path)
+    assert len(privateerMetadata.inputFilePaths) == 6
@@ -0,0 +1,157 @@
+import sys
+import shutil
+
+import pytest
+
+import validation_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+class RecordingValidation:
+    def __init__(self, fileResults):
+        self.fileResults = fileResults
+        self.validatedPaths = []
+
+    def __call__(self, path):
+        self.validatedPaths.append(path)
+        if self.fileResults is None:
+            return None
+        return {"path": path, **self.fileResults}
+
+
+problematicResults = {
+    "Glycans": [{"WURCS": "WURCS=2.0/test", "totalSugars": 3, "problematicSugars": []}]
+}
+
+
+@pytest.fixture
+def privateerVersion(monkeypatch):
+    monkeypatch.setattr(validation_cache, "get_privateer_version", lambda: "1.0")
+
+
+@pytest.fixture
+def structurePath(tmp_path):
+    structurePath = tmp_path / "structure.pdb"
+    structurePath.write_text("ATOM      1  C1  MAN A   1\n")
+    return str(structurePath)
+
+
+def test_unchanged_contents_are_not_validated_again(
+    privateerVersion, structurePath, tmp_path
+):
+    cachePath = str(tmp_path / "cache.sqlite")
+    privateerValidation = RecordingValidation(problematicResults)
+    firstResults = validation_cache.cachedPrivateerValidation(
+        structurePath, privateerValidation, cachePath
+    )
+    # A copy has the same contents, so it is a hit reported under its own path.
+    copyPath = str(tmp_path / "copy.pdb")
+    shutil.copy(structurePath, copyPath)
+    copyResults = validation_cache.cachedPrivateerValidation(
+        copyPath, privateerValidation, cachePath
+    )
+    assert privateerValidation.validatedPaths == [structurePath]
+    assert firstResults == {"path": structurePath, **problematicResults}
+    assert copyResults == {"path": copyPath, **problematicResults}
+
+
+def test_files_without_issues_are_cached(privateerVersion, structurePath, tmp_path):
+    cachePath = str(tmp_path / "cache.sqlite")
+    privateerValidation = RecordingValidation(None)
+    for count in range(2):
+        assert (
+            validation_cache.cachedPrivateerValidation(
+                structurePath, privateerValidation, cachePath
+            )
+            is None
+        )
+    assert privateerValidation.validatedPaths == [structurePath]
+
+
+def test_changed_contents_or_version_are_validated_again(
+    monkeypatch, privateerVersion, structurePath, tmp_path
+):
+    cachePath = str(tmp_path / "cache.sqlite")
+    privateerValidation = RecordingValidation(problematicResults)
+    validation_cache.cachedPrivateerValidation(
+        structurePath, privateerValidation, cachePath
+    )
+    with open(structurePath, "a") as structureFile:
+        structureFile.write("END\n")
+    validation_cache.cachedPrivateerValidation(
+        structurePath, privateerValidation, cachePath
+    )
+    monkeypatch.setattr(validation_cache, "get_privateer_version", lambda: "2.0")
+    validation_cache.cachedPrivateerValidation(
+        structurePath, privateerValidation, cachePath
+    )
+    assert privateerValidation.validatedPaths == [structurePath] * 3
+
+
+def test_unidentified_privateer_is_never_cached(monkeypatch, structurePath, tmp_path):
+    monkeypatch.setattr(validation_cache, "get_privateer_version", lambda: None)
+    cachePath = tmp_path / "cache.sqlite"
+    privateerValidation = RecordingValidation(problematicResults)
+    for count in range(2):
+        validation_cache.cachedPrivateerValidation(
+            structurePath, privateerValidation, str(cachePath)
+        )
+    assert privateerValidation.validatedPaths == [structurePath] * 2
+    assert not cachePath.exists()
+
+
+def test_least_recently_used_results_are_evicted(monkeypatch, tmp_path):
+    monkeypatch.setattr(validation_cache, "time", FakeClock())
+    connection = validation_cache.open_validation_cache(str(tmp_path / "cache.sqlite"))
+    resultSize = len('{"Glycans": []}')
+    for contentHash in ("first", "second"):
+        validation_cache.store_validation_result(
+            connection, contentHash, "1.0", {"Glycans": []}, 2 * resultSize
+        )
+    # Reading first makes second the least recently used result, which is the one dropped to make room for third.
+    assert validation_cache.lookup_validation_result(connection, "first", "1.0") == (
+        True,
+        {"Glycans": []},
+    )
+    validation_cache.store_validation_result(
+        connection, "third", "1.0", {"Glycans": []}, 2 * resultSize
+    )
+    assert sorted(
+        row[0]
+        for row in connection.execute("SELECT content_hash FROM validation_results")
+    ) == ["first", "third"]
+    connection.close()
+
+
+def test_unversioned_privateer_is_identified_by_its_extension(monkeypatch, tmp_path):
+    def package_not_found(name):
+        raise validation_cache.metadata.PackageNotFoundError(name)
+
+    def write_privateer_core(contents):
+        (tmp_path / "privateer" / "privateer_core.py").write_text(contents)
+        validation_cache.get_privateer_version.cache_clear()
+        return validation_cache.get_privateer_version()
+
+    (tmp_path / "privateer").mkdir()
+    (tmp_path / "privateer" / "__init__.py").write_text("")
+    monkeypatch.setattr(validation_cache.metadata, "version", package_not_found)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for moduleName in ("privateer", "privateer.privateer_core"):
+        monkeypatch.delitem(sys.modules, moduleName, raising=False)
+    try:
+        firstVersion = write_privateer_core("build = 1\n")
+        secondVersion = write_privateer_core("build = 2\n")
+    finally:
+        validation_cache.get_privateer_version.cache_clear()
+        for moduleName in ("privateer", "privateer.privateer_core"):
+            sys.modules.pop(moduleName, None)
+    assert firstVersion.startswith("privateer_core-")
+    assert firstVersion != secondVersion
@@ -0,0 +1,313 @@
+import os
+import argparse
+
+try:
+    from .profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+except ImportError:
+    from profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+
+# Python replacement for anomerchange.R(O1switch), which flipped the anomer of the reducing end sugar of GLYCAM models with bio3d.
+# The anomeric centre is found by atom and residue names instead of hardcoded row numbers: the aglycone oxygen O1 of the ROH
+# residue and the C1/H1 atoms of the sugar following it. The O1 and H1 bond vectors are swapped around C1 and rescaled to
+# ideal bond lengths, HO1 is dropped and the ROH oxygen is relabelled into the sugar, whose GLYCAM code changes anomer(4YA -> 4YB).
+# Coordinates of a whole batch of structures(or trajectory frames) are corrected in a single vectorized NumPy operation.
+# NumPy is only imported once there is something to correct.
+
+PDB_RECORD_NAME = slice(0, 6)
+PDB_ATOM_NAME = slice(12, 16)
+PDB_RESIDUE_NAME = slice(17, 20)
+PDB_RESIDUE_SEQ = slice(22, 26)
+PDB_COORDINATES = slice(30, 54)
+PDB_COORDINATE_RECORDS = ("ATOM  ", "HETATM")
+
+ANOMERIC_OXYGEN_BOND_LENGTH = 1.4
+ANOMERIC_HYDROGEN_BOND_LENGTH = 1.09
+ANOMER_CORRECTION_BATCH_SIZE = 256
+
+# Last character of a GLYCAM residue code carries the anomer, e.g. 4YA = alpha, 4YB = beta.
+glycamAnomers = {"A": "alpha", "B": "beta"}
+
+
+def find_anomeric_centre(Lines, targetAnomer="B"):
+    # Returns record indices of the atoms around the anomeric centre, or None if the structure has no ROH aglycone
+    # or its reducing end sugar already is targetAnomer.
+    anomericCentre = {"HO1": None, "O1": None, "C1": None, "H1": None}
+    sugarResidue = None
+    for idx, line in enumerate(Lines):
+        if line[PDB_RECORD_NAME] not in PDB_COORDINATE_RECORDS:
+            continue
+        residueName = line[PDB_RESIDUE_NAME]
+        atomName = line[PDB_ATOM_NAME].strip()
+        if sugarResidue is None:
+            if residueName == "ROH":
+                if atomName in ("HO1", "O1"):
+                    anomericCentre[atomName] = idx
+                    aglyconeSeq = line[PDB_RESIDUE_SEQ]
+            elif anomericCentre["O1"] is not None:
+                sugarResidue = (residueName, line[PDB_RESIDUE_SEQ])
+        elif (residueName, line[PDB_RESIDUE_SEQ]) != sugarResidue:
+            break
+        if sugarResidue is not None and atomName in ("C1", "H1"):
+            anomericCentre[atomName] = idx
+    if sugarResidue is None or anomericCentre["C1"] is None:
+        return None
+    if anomericCentre["H1"] is None:
+        return None
+    residueName, residueSeq = sugarResidue
+    if residueName[-1] not in glycamAnomers or residueName[-1] == targetAnomer:
+        return None
+    anomericCentre["aglyconeSeq"] = aglyconeSeq
+    anomericCentre["residueName"] = residueName
+    anomericCentre["residueSeq"] = residueSeq
+    anomericCentre["correctedResidueName"] = residueName[:-1] + targetAnomer
+    return anomericCentre
+
+
+def parse_coordinates(line):
+    return (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+
+
+def flip_anomeric_substituents(O1, C1, H1):
+    # O1, C1 and H1 are (structures, 3) arrays. The new O1 points along the old C1-H1 bond and the new H1 along the old C1-O1 bond.
+    import numpy
+
+    C1O1 = O1 - C1
+    C1H1 = H1 - C1
+    flippedO1 = C1 + ANOMERIC_OXYGEN_BOND_LENGTH * C1H1 / numpy.linalg.norm(
+        C1H1, axis=1, keepdims=True
+    )
+    flippedH1 = C1 + ANOMERIC_HYDROGEN_BOND_LENGTH * C1O1 / numpy.linalg.norm(
+        C1O1, axis=1, keepdims=True
+    )
+    return flippedO1, flippedH1
+
+
+def replace_coordinates_in_line(line, coordinates):
+    return (
+        line[: PDB_COORDINATES.start]
+        + "".join(f"{coordinate:8.3f}" for coordinate in coordinates)
+        + line[PDB_COORDINATES.stop :]
+    )
+
+
+def relabel_residue_in_line(line, residueName, residueSeq):
+    return (
+        line[: PDB_RESIDUE_NAME.start]
+        + residueName
+        + line[PDB_RESIDUE_NAME.stop : PDB_RESIDUE_SEQ.start]
+        + residueSeq
+        + line[PDB_RESIDUE_SEQ.stop :]
+    )
+
+
+def apply_anomer_correction(Lines, anomericCentre, flippedO1, flippedH1):
+    correctedResidueName = anomericCentre["correctedResidueName"]
+    residueSeq = anomericCentre["residueSeq"]
+    output = []
+    for idx, line in enumerate(Lines):
+        if idx == anomericCentre["HO1"]:
+            continue
+        if idx == anomericCentre["O1"]:
+            line = replace_coordinates_in_line(line, flippedO1)
+        elif idx == anomericCentre["H1"]:
+            line = replace_coordinates_in_line(line, flippedH1)
+        if (line[PDB_RECORD_NAME] in PDB_COORDINATE_RECORDS or line[:3] == "TER") and (
+            (
+                line[PDB_RESIDUE_NAME] == "ROH"
+                and line[PDB_RESIDUE_SEQ] == anomericCentre["aglyconeSeq"]
+            )
+            or (
+                line[PDB_RESIDUE_NAME] == anomericCentre["residueName"]
+                and line[PDB_RESIDUE_SEQ] == residueSeq
+            )
+        ):
+            line = relabel_residue_in_line(line, correctedResidueName, residueSeq)
+        output.append(line)
+    return output
+
+
+def correctAnomers(structures, targetAnomer="B"):
+    # structures is a list of record lists. Returns the corrected record lists in the same order,
+    # structures that need no correction are returned unchanged.
+    structures = list(structures)
+    anomericCentres = [
+        find_anomeric_centre(Lines, targetAnomer) for Lines in structures
+    ]
+    correctedIndices = [
+        idx
+        for idx, anomericCentre in enumerate(anomericCentres)
+        if anomericCentre is not None
+    ]
+    if not correctedIndices:
+        return structures
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Anomer correction requires numpy to be installed")
+
+    coordinates = numpy.array(
+        [
+            [
+                parse_coordinates(structures[idx][anomericCentres[idx][atomName]])
+                for atomName in ("O1", "C1", "H1")
+            ]
+            for idx in correctedIndices
+        ],
+        dtype=float,
+    )
+    flippedO1, flippedH1 = flip_anomeric_substituents(
+        coordinates[:, 0], coordinates[:, 1], coordinates[:, 2]
+    )
+    for batchIndex, idx in enumerate(correctedIndices):
+        structures[idx] = apply_anomer_correction(
+            structures[idx],
+            anomericCentres[idx],
+            flippedO1[batchIndex],
+            flippedH1[batchIndex],
+        )
+    return structures
+
+
+def correctAnomersInFrames(
+    frames, targetAnomer="B", batchSize=ANOMER_CORRECTION_BATCH_SIZE
+):
+    # Takes (model serial, records) pairs as yielded by glycam2pdb.stream_pdb_frames and corrects them batchSize frames at a time.
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) == batchSize:
+            yield from correct_frame_batch(batch, targetAnomer)
+            batch = []
+    if batch:
+        yield from correct_frame_batch(batch, targetAnomer)
+
+
+def correct_frame_batch(batch, targetAnomer):
+    modelSerials = [modelSerial for modelSerial, frameLines in batch]
+    correctedFrames = correctAnomers(
+        [frameLines for modelSerial, frameLines in batch], targetAnomer
+    )
+    return zip(modelSerials, correctedFrames)
+
+
+def get_anomer_corrected_output_path(inputPath, outputPath, inputFilePath):
+    if outputPath is None:
+        return inputFilePath
+    return os.path.join(outputPath, os.path.relpath(inputFilePath, inputPath))
+
+
+def correctAnomersInFiles(
+    filePairs, targetAnomer="B", batchSize=ANOMER_CORRECTION_BATCH_SIZE
+):
+    # filePairs is a list of (input path, output path). Files are read and corrected batchSize files at a time.
+    correctedFiles = []
+    for batchStart in range(0, len(filePairs), batchSize):
+        batch = filePairs[batchStart : batchStart + batchSize]
+        structures = []
+        with profile_stage("read"):
+            for inputFilePath, outputFilePath in batch:
+                with open(inputFilePath, "r") as file:
+                    structures.append(file.readlines())
+        with profile_stage("anomer correction"):
+            correctedStructures = correctAnomers(structures, targetAnomer)
+        for (inputFilePath, outputFilePath), Lines, correctedLines in zip(
+            batch, structures, correctedStructures
+        ):
+            outputDirectory = os.path.dirname(outputFilePath)
+            if outputDirectory and not os.path.exists(outputDirectory):
+                os.makedirs(outputDirectory)
+            if correctedLines is not Lines:
+                correctedFiles.append(inputFilePath)
+                print(f"Corrected reducing end anomer of {inputFilePath}")
+            if correctedLines is not Lines or outputFilePath != inputFilePath:
+                with profile_stage("write"):
+                    with open(outputFilePath, mode="w") as newfile:
+                        newfile.writelines(correctedLines)
+    return correctedFiles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="anomer_correction.py",
+        usage="%(prog)s [options] PATH.",
+        description="Flip the anomer of the reducing end sugar(attached to an ROH aglycone) of GLYCAM PDB files.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Input path either directly to a single file or a root directory that contains multiple PDB files",
+        required=True,
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help="Write corrected files to this path(a directory if the input is a directory, keeping the folder structure). If not provided, files are corrected in place.",
+    )
+    parser.add_argument(
+        "-anomer",
+        action="store",
+        default="beta",
+        choices=["alpha", "beta"],
+        dest="user_anomer",
+        help="Anomer the reducing end sugar is changed to. Sugars that already are this anomer are left untouched. Defaults to beta.",
+    )
+    parser.add_argument(
+        "-batch_size",
+        action="store",
+        type=int,
+        default=ANOMER_CORRECTION_BATCH_SIZE,
+        dest="user_batchSize",
+        help=f"Number of files corrected in a single vectorized step. Defaults to {ANOMER_CORRECTION_BATCH_SIZE}.",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+    targetAnomer = args.user_anomer[0].upper()
+    inputPath = os.path.abspath(args.user_inputPath)
+    outputPath = (
+        os.path.abspath(args.user_outputPath)
+        if args.user_outputPath is not None
+        else None
+    )
+
+    if os.path.isdir(inputPath):
+        filePairs = []
+        for root, dirs, files in os.walk(inputPath):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() != ".pdb":
+                    continue
+                inputFilePath = os.path.join(root, name)
+                filePairs.append(
+                    (
+                        inputFilePath,
+                        get_anomer_corrected_output_path(
+                            inputPath, outputPath, inputFilePath
+                        ),
+                    )
+                )
+    else:
+        filePairs = [(inputPath, outputPath if outputPath is not None else inputPath)]
+    correctedFiles = correctAnomersInFiles(filePairs, targetAnomer, args.user_batchSize)
+    print(
+        f"Corrected {len(correctedFiles)}/{len(filePairs)} files to {args.user_anomer} anomers."
+    )
+    stop_profiling_session(profilingSession)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import io
+import os
+import sys
+import tarfile
+import zipfile
+
+# Reading GLYCAM corpora straight out of zip/tar archives and packing converted outputs back into one, shared by
+# glycam2pdb.py and privateer_quick_validate.py. Members are streamed one at a time, so an archive of thousands of
+# structures never has to be extracted onto a(possibly network) filesystem.
+
+archiveSuffixes = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+tarWriteModes = {
+    ".tar": "w",
+    ".tar.gz": "w:gz",
+    ".tgz": "w:gz",
+    ".tar.bz2": "w:bz2",
+    ".tar.xz": "w:xz",
+}
+
+
+def get_archive_suffix(path):
+    for suffix in sorted(archiveSuffixes, key=len, reverse=True):
+        if path.lower().endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive_path(path):
+    return get_archive_suffix(path) is not None
+
+
+def get_archive_stem(path):
+    fileName = os.path.basename(os.path.normpath(path))
+    return fileName[: len(fileName) - len(get_archive_suffix(fileName))]
+
+
+def is_pdb_member(memberName):
+    # Skips folders, macOS resource forks and anything that is not a PDB(nested archives, csv files, scripts).
+    fileName = memberName.rsplit("/", 1)[-1]
+    return (
+        fileName.lower().endswith(".pdb")
+        and not fileName.startswith("._")
+        and not memberName.startswith("__MACOSX/")
+    )
+
+
+def get_member_relative_path(memberName, archiveStem):
+    # omannose.zip usually holds omannose/man5/cluster1.pdb, in which case the top folder is dropped like for a folder input.
+    # Returns None for members that are absolute or climb out of the archive root(../../x.pdb), which are never written.
+    if memberName.startswith(archiveStem + "/"):
+        memberName = memberName[len(archiveStem) + 1 :]
+    if memberName.startswith("/") or os.path.isabs(memberName):
+        return None
+    relativePath = os.path.normpath(os.path.join(*memberName.split("/")))
+    if (
+        os.path.isabs(relativePath)
+        or os.path.splitdrive(relativePath)[0]
+        or relativePath == os.pardir
+        or relativePath.startswith(os.pardir + os.sep)
+    ):
+        return None
+    return relativePath
+
+
+def get_safe_output_path(outputDirectory, relativePath):
+    # Joins an archive member path onto the folder it is written to, refusing anything that would resolve outside of it.
+    outputFilePath = os.path.join(outputDirectory, relativePath)
+    resolvedDirectory = os.path.realpath(outputDirectory)
+    if (
+        os.path.commonpath([resolvedDirectory, os.path.realpath(outputFilePath)])
+        != resolvedDirectory
+    ):
+        raise ValueError(
+            f"Archive member {relativePath} would be written outside of {outputDirectory}"
+        )
+    return outputFilePath
+
+
+def get_checked_member_path(memberName, archiveStem, archivePath):
+    relativePath = get_member_relative_path(memberName, archiveStem)
+    if relativePath is None:
+        print(
+            f"Skipping archive member {memberName} of {archivePath}, its path leaves the archive root",
+            file=sys.stderr,
+        )
+    return relativePath
+
+
+def read_member_lines(memberFile):
+    # Same universal newline handling as open() in text mode. Streamed tar members are not seekable, so they are read in one go.
+    return io.StringIO(memberFile.read().decode("utf-8"), newline=None).readlines()
+
+
+def iterate_archive_members(archivePath):
+    # Yields (relative path, records) for every PDB member in archive order.
+    archiveStem = get_archive_stem(archivePath)
+    if get_archive_suffix(archivePath) == ".zip":
+        with zipfile.ZipFile(archivePath) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not is_pdb_member(member.filename):
+                    continue
+                relativePath = get_checked_member_path(
+                    member.filename, archiveStem, archivePath
+                )
+                if relativePath is None:
+                    continue
+                with archive.open(member) as memberFile:
+                    yield relativePath, read_member_lines(memberFile)
+    else:
+        # Sequential mode, compressed tarballs are decompressed once front to back instead of seeking around.
+        with tarfile.open(archivePath, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not is_pdb_member(member.name):
+                    continue
+                relativePath = get_checked_member_path(
+                    member.name, archiveStem, archivePath
+                )
+                if relativePath is None:
+                    continue
+                yield relativePath, read_member_lines(archive.extractfile(member))
+
+
+def stage_archive_members(archivePath, stagingDirectory):
+    # For tools that need real files(Privateer), members are written below stagingDirectory. Returns
+    # (staged path, <archive>/<member path>) pairs in archive order.
+    stagedMembers = []
+    for relativePath, Lines in iterate_archive_members(archivePath):
+        stagedFilePath = get_safe_output_path(stagingDirectory, relativePath)
+        os.makedirs(os.path.dirname(stagedFilePath), exist_ok=True)
+        with open(stagedFilePath, mode="w") as stagedFile:
+            stagedFile.writelines(Lines)
+        stagedMembers.append((stagedFilePath, os.path.join(archivePath, relativePath)))
+    return stagedMembers
+
+
+def get_staged_member_path(stagedFilePath, stagingDirectory, archivePath):
+    # Files destined for an archive are written to a local staging folder first, but reported as archive members.
+    return os.path.join(archivePath, os.path.relpath(stagedFilePath, stagingDirectory))
+
+
+def relabel_validation_results(fileResults, path):
+    if fileResults is None:
+        return None
+    return {**fileResults, "path": path}
+
+
+def write_output_archive(sourceDirectory, archivePath):
+    # Packs every file below sourceDirectory into archivePath, keeping paths relative to sourceDirectory.
+    filePaths = []
+    for root, dirs, files in os.walk(sourceDirectory):
+        for name in files:
+            filePaths.append(os.path.join(root, name))
+    filePaths.sort()
+    archiveDirectory = os.path.dirname(archivePath)
+    if archiveDirectory and not os.path.exists(archiveDirectory):
+        os.makedirs(archiveDirectory)
+    suffix = get_archive_suffix(archivePath)
+    if suffix == ".zip":
+        with zipfile.ZipFile(archivePath, "w", zipfile.ZIP_DEFLATED) as archive:
+            for filePath in filePaths:
+                archive.write(filePath, os.path.relpath(filePath, sourceDirectory))
+    else:
+        with tarfile.open(archivePath, tarWriteModes[suffix]) as archive:
+            for filePath in filePaths:
+                archive.add(filePath, os.path.relpath(filePath, sourceDirectory))
+    return len(filePaths)
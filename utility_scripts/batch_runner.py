@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import signal
+import argparse
+import collections
+import multiprocessing
+import multiprocessing.connection
+
+# Supervised worker processes for batches of native Privateer work(GlycosylationComposition_memsafe, pvtmodelling.Builder).
+# A malformed structure can abort the whole interpreter from C++, so every task runs in a worker process that holds
+# exactly one task at a time: a crash is attributed to that task, the worker is replaced and the rest of the batch
+# carries on at full width. Tasks can also be given a wall clock timeout and a memory limit. Inputs that crash twice,
+# time out or run out of memory are quarantined: written to a JSON report and skipped by later runs given the same report.
+
+defaultCrashAttempts = 2
+
+quarantinedReasons = ("crashed", "timed out", "memory limit exceeded")
+unsupervisedSettings = {
+    "taskTimeout": None,
+    "memoryLimitMegabytes": None,
+    "quarantinePath": None,
+}
+
+
+def set_memory_limit(memoryLimitMegabytes):
+    # The limit is on address space(RLIMIT_AS), which is what a runaway native allocation grows. Not available on Windows.
+    if memoryLimitMegabytes is None:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = int(memoryLimitMegabytes * 1024 * 1024)
+    softLimit, hardLimit = resource.getrlimit(resource.RLIMIT_AS)
+    if hardLimit != resource.RLIM_INFINITY:
+        limit = min(limit, hardLimit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hardLimit))
+
+
+def supervised_worker_loop(
+    connection, function, initializer, initargs, memoryLimitMegabytes
+):
+    # Ctrl+C reaches the whole process group, stopping the workers is left to the supervisor.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_memory_limit(memoryLimitMegabytes)
+    # A broken installation should fail every task, not get every input quarantined as a crash.
+    initializerError = None
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+    except Exception as exception:
+        initializerError = (
+            f"worker initialization failed, {type(exception).__name__}: {exception}"
+        )
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        if initializerError is not None:
+            connection.send(("error", initializerError))
+            continue
+        try:
+            connection.send(("done", function(task)))
+        except MemoryError:
+            connection.send(("memory limit exceeded", "MemoryError"))
+            break
+        except Exception as exception:
+            connection.send(("error", f"{type(exception).__name__}: {exception}"))
+
+
+def describe_exit_code(exitcode):
+    if exitcode is not None and exitcode < 0:
+        try:
+            return f"worker killed by {signal.Signals(-exitcode).name}"
+        except ValueError:
+            pass
+    return f"worker exited with code {exitcode}"
+
+
+class SupervisedWorker:
+    def __init__(self, function, initializer, initargs, memoryLimitMegabytes):
+        self.connection, workerConnection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=supervised_worker_loop,
+            args=(
+                workerConnection,
+                function,
+                initializer,
+                initargs,
+                memoryLimitMegabytes,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        workerConnection.close()
+        self.task = None
+        self.startTime = None
+
+    def submit(self, index, task, attempt):
+        self.task = (index, task, attempt)
+        self.startTime = time.monotonic()
+        try:
+            self.connection.send(task)
+        except (BrokenPipeError, OSError):
+            # The worker died while idle, which shows up as a crash of this task once its sentinel is waited on.
+            pass
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def check_job_count(jobs):
+    # Checked when a batch is set up rather than when it is first iterated. With no workers every task would be left
+    # unstarted without an error.
+    if jobs < 1:
+        raise ValueError(f"jobs must be at least 1, got {jobs}")
+
+
+def run_supervised_tasks(
+    function,
+    tasks,
+    jobs=1,
+    initializer=None,
+    initargs=(),
+    taskTimeout=None,
+    memoryLimitMegabytes=None,
+    crashAttempts=defaultCrashAttempts,
+    skipTask=None,
+):
+    # Yields (task, result, failure) in input order, failure being None or {"reason": ..., "detail": ..., "attempts": ...}.
+    # reason is "error" for Python exceptions raised by function, which are not retried. A task that crashes its worker is
+    # rerun on a fresh worker up to crashAttempts times in total, timeouts and memory errors are not retried.
+    # skipTask(task) can return a failure for tasks that should not be started at all.
+    # tasks is consumed lazily, so a generator reading archive members only holds as many inputs as there are workers.
+    check_job_count(jobs)
+    return supervise_tasks(
+        function,
+        tasks,
+        jobs,
+        initializer,
+        initargs,
+        taskTimeout,
+        memoryLimitMegabytes,
+        crashAttempts,
+        skipTask,
+    )
+
+
+def supervise_tasks(
+    function,
+    tasks,
+    jobs,
+    initializer,
+    initargs,
+    taskTimeout,
+    memoryLimitMegabytes,
+    crashAttempts,
+    skipTask,
+):
+    taskIterator = iter(tasks)
+    tasksExhausted = False
+    retries = collections.deque()
+    nextIndexToSubmit = 0
+    nextIndexToYield = 0
+    outcomes = {}
+    workers = []
+
+    def next_task():
+        nonlocal tasksExhausted, nextIndexToSubmit
+        if retries:
+            return retries.popleft()
+        while not tasksExhausted:
+            try:
+                task = next(taskIterator)
+            except StopIteration:
+                tasksExhausted = True
+                break
+            nextIndexToSubmit += 1
+            skipFailure = skipTask(task) if skipTask is not None else None
+            if skipFailure is None:
+                return (nextIndexToSubmit - 1, task, 1)
+            outcomes[nextIndexToSubmit - 1] = (task, None, skipFailure)
+        return None
+
+    def replace_worker(worker):
+        worker.kill()
+        workers.remove(worker)
+
+    try:
+        while True:
+            for worker in workers + [None] * (jobs - len(workers)):
+                if worker is not None and worker.task is not None:
+                    continue
+                queuedTask = next_task()
+                if queuedTask is None:
+                    break
+                if worker is None:
+                    worker = SupervisedWorker(
+                        function, initializer, initargs, memoryLimitMegabytes
+                    )
+                    workers.append(worker)
+                worker.submit(*queuedTask)
+            busyWorkers = [worker for worker in workers if worker.task is not None]
+            if not busyWorkers:
+                yield from (outcomes.pop(index) for index in sorted(outcomes))
+                break
+
+            waitTimeout = None
+            if taskTimeout is not None:
+                earliestStart = min(worker.startTime for worker in busyWorkers)
+                waitTimeout = max(earliestStart + taskTimeout - time.monotonic(), 0)
+            ready = multiprocessing.connection.wait(
+                [worker.connection for worker in busyWorkers]
+                + [worker.process.sentinel for worker in busyWorkers],
+                timeout=waitTimeout,
+            )
+            for worker in busyWorkers:
+                index, task, attempt = worker.task
+                failure = None
+                if worker.connection in ready or worker.process.sentinel in ready:
+                    try:
+                        status, payload = worker.connection.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        status = "crashed"
+                        payload = describe_exit_code(worker.process.exitcode)
+                    worker.task = None
+                    if status == "done":
+                        outcomes[index] = (task, payload, None)
+                        continue
+                    failure = {"reason": status, "detail": payload, "attempts": attempt}
+                    if status != "error":
+                        replace_worker(worker)
+                    if status == "crashed" and attempt < crashAttempts:
+                        retries.append((index, task, attempt + 1))
+                        continue
+                elif (
+                    taskTimeout is not None
+                    and time.monotonic() - worker.startTime >= taskTimeout
+                ):
+                    worker.task = None
+                    replace_worker(worker)
+                    failure = {
+                        "reason": "timed out",
+                        "detail": f"no result after {taskTimeout} s",
+                        "attempts": attempt,
+                    }
+                else:
+                    continue
+                outcomes[index] = (task, None, failure)
+
+            while nextIndexToYield in outcomes:
+                yield outcomes.pop(nextIndexToYield)
+                nextIndexToYield += 1
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+class QuarantineReport:
+    # JSON report of inputs that crashed, timed out or ran out of memory, keyed by input name. Inputs already listed are
+    # skipped by later runs, delete the entry(or the file) to try them again.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path is not None and os.path.isfile(path):
+            with open(path, "r") as reportFile:
+                for entry in json.load(reportFile)["quarantined"]:
+                    self.entries[entry["input"]] = entry
+
+    def is_quarantined(self, name):
+        return name in self.entries
+
+    def add(self, name, failure):
+        self.entries[name] = {"input": name, **failure}
+
+    def save(self):
+        if self.path is None:
+            return
+        with open(self.path, "w") as reportFile:
+            json.dump(
+                {"quarantined": list(self.entries.values())}, reportFile, indent=4
+            )
+
+
+def run_supervised_batch(
+    function,
+    tasks,
+    jobs,
+    supervisionSettings,
+    get_task_name,
+    initializer=None,
+    initargs=(),
+):
+    # run_supervised_tasks with the -task_timeout/-memory_limit/-quarantine settings of a script. Tasks quarantined by an
+    # earlier run are not started and come back with reason "quarantined". The report is saved even if the batch is
+    # interrupted, so the inputs quarantined so far are not lost.
+    check_job_count(jobs)
+    return supervise_batch(
+        function, tasks, jobs, supervisionSettings, get_task_name, initializer, initargs
+    )
+
+
+def supervise_batch(
+    function, tasks, jobs, supervisionSettings, get_task_name, initializer, initargs
+):
+    if supervisionSettings is None:
+        supervisionSettings = unsupervisedSettings
+    quarantineReport = QuarantineReport(supervisionSettings["quarantinePath"])
+
+    def skip_quarantined_task(task):
+        if quarantineReport.is_quarantined(get_task_name(task)):
+            return {
+                "reason": "quarantined",
+                "detail": f'listed in {supervisionSettings["quarantinePath"]}',
+                "attempts": 0,
+            }
+        return None
+
+    try:
+        for task, result, failure in run_supervised_tasks(
+            function,
+            tasks,
+            jobs,
+            initializer,
+            initargs,
+            supervisionSettings["taskTimeout"],
+            supervisionSettings["memoryLimitMegabytes"],
+            skipTask=skip_quarantined_task,
+        ):
+            if failure is not None and failure["reason"] in quarantinedReasons:
+                quarantineReport.add(get_task_name(task), failure)
+            yield task, result, failure
+    finally:
+        quarantineReport.save()
+
+
+def run_tasks_in_process(function, tasks):
+    # Serial counterpart of run_supervised_tasks for -jobs 1 without supervision: same (task, result, failure) outcomes,
+    # so a Python exception fails only its own task. Nothing protects against native crashes here.
+    for task in tasks:
+        try:
+            yield task, function(task), None
+        except Exception as exception:
+            yield task, None, {
+                "reason": "error",
+                "detail": f"{type(exception).__name__}: {exception}",
+                "attempts": 1,
+            }
+
+
+def describe_failure(failure):
+    if failure["reason"] == "error":
+        return failure["detail"]
+    if failure["reason"] == "crashed" and failure["attempts"] > 1:
+        return f'crashed {failure["attempts"]} times ({failure["detail"]})'
+    return f'{failure["reason"]} ({failure["detail"]})'
+
+
+def is_supervision_requested(supervisionSettings):
+    return supervisionSettings is not None and any(
+        value is not None for value in supervisionSettings.values()
+    )
+
+
+def get_supervision_settings(args):
+    return {
+        "taskTimeout": args.user_taskTimeout,
+        "memoryLimitMegabytes": args.user_memoryLimit,
+        "quarantinePath": args.user_quarantinePath,
+    }
+
+
+def positive_int(value):
+    # argparse type of -jobs, a worker count below 1 would start no workers and convert nothing.
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def add_supervision_arguments(parser):
+    parser.add_argument(
+        "-task_timeout",
+        action="store",
+        type=float,
+        default=None,
+        dest="user_taskTimeout",
+        help="Give up on a file after this many seconds. Its worker process is killed and replaced, and the file is quarantined.",
+    )
+    parser.add_argument(
+        "-memory_limit",
+        action="store",
+        type=float,
+        default=None,
+        dest="user_memoryLimit",
+        help="Limit every worker process to this many megabytes of address space. Files that exceed it are quarantined. Not available on Windows.",
+    )
+    parser.add_argument(
+        "-quarantine",
+        action="store",
+        default=None,
+        dest="user_quarantinePath",
+        help="JSON report of files that crashed Privateer twice, timed out or exceeded the memory limit. Files already listed in it are skipped.",
+    )
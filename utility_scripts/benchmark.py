@@ -0,0 +1,455 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+
+# Throughput benchmark of the conversion(conversionPipeline), validation(privateerValidation) and mmCIF compilation(pdb2mmcif)
+# stages over the bundled GLYCAM corpora and a synthetically inflated trajectory. Every stage of every corpus runs in a fresh
+# process, so that its peak RSS is not hidden by the stages before it. Results are written as a JSON report, which can be
+# compared against a report from another version with -compare to catch throughput regressions.
+
+scriptDirectoryPath = os.path.dirname(os.path.abspath(__file__))
+defaultCorporaPath = os.path.join(
+    os.path.dirname(scriptDirectoryPath), "glycampdbfiles"
+)
+defaultCorpora = ["Volume", "omannose", "Complex", "glycanfrags"]
+benchmarkStages = ["conversion", "validation", "mmcif"]
+syntheticCorpusName = "synthetic"
+defaultSyntheticFrames = 200
+defaultRepeats = 3
+defaultRegressionThreshold = 10.0
+BENCHMARK_REPORT_VERSION = 1
+convertedFolderSuffixes = ("ConvertedPDB", "ConvertedmmCIF")
+
+
+def load_pipeline_modules():
+    try:
+        from . import glycam2pdb, pdb2mmcif
+    except ImportError:
+        import glycam2pdb, pdb2mmcif
+    return glycam2pdb, pdb2mmcif
+
+
+def find_corpus_files(corpusPath):
+    # Previously converted folders that live inside a corpus(e.g. omannose/man9ConvertedPDB) are not inputs.
+    corpusFiles = []
+    for root, dirs, files in os.walk(corpusPath):
+        dirs[:] = sorted(
+            directory
+            for directory in dirs
+            if not directory.endswith(convertedFolderSuffixes)
+        )
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() == ".pdb":
+                corpusFiles.append(os.path.join(root, name))
+    return corpusFiles
+
+
+def find_golden_output(corpusPath, inputFilePath):
+    # glycam2pdb writes <corpus>ConvertedPDB/<folder>/<name> for a corpus, or <folder>ConvertedPDB/<name> for a nested folder.
+    relativePath = os.path.relpath(inputFilePath, corpusPath)
+    folder, name = os.path.split(relativePath)
+    candidates = [
+        os.path.join(corpusPath + "ConvertedPDB", relativePath),
+        os.path.join(corpusPath + "ConvertedPDB", os.path.basename(folder), name),
+    ]
+    if folder:
+        candidates.append(os.path.join(corpusPath, folder + "ConvertedPDB", name))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def count_atoms(filePaths):
+    numberOfAtoms = 0
+    for filePath in filePaths:
+        with open(filePath, "r") as file:
+            for line in file:
+                if line[:6] in ("ATOM  ", "HETATM"):
+                    numberOfAtoms += 1
+    return numberOfAtoms
+
+
+def write_synthetic_trajectory(corpusPath, outputFilePath, numberOfFrames):
+    # Inflates the largest structure of the corpus into a numberOfFrames long MODEL/ENDMDL trajectory.
+    largestFilePath = max(find_corpus_files(corpusPath), key=os.path.getsize)
+    with open(largestFilePath, "r") as file:
+        frameLines = [
+            line for line in file if line[:5] != "MODEL" and line[:6] != "ENDMDL"
+        ]
+    with open(outputFilePath, "w") as newfile:
+        for modelSerial in range(1, numberOfFrames + 1):
+            newfile.write(f"MODEL     {modelSerial:>4}\n")
+            newfile.writelines(frameLines)
+            newfile.write("ENDMDL\n")
+    return outputFilePath
+
+
+def get_peak_rss_megabytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peakRSS / (1024 * 1024)
+    return peakRSS / 1024
+
+
+def time_repeats(function, repeats):
+    # Best wall-clock time of several runs, together with the result of the last run.
+    bestSeconds = None
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        result = function()
+        elapsedSeconds = time.perf_counter() - startTime
+        if bestSeconds is None or elapsedSeconds < bestSeconds:
+            bestSeconds = elapsedSeconds
+    return bestSeconds, result
+
+
+def convert_files(glycam2pdb, inputFilePaths):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ["".join(glycam2pdb.conversionPipeline(path)) for path in inputFilePaths]
+
+
+def write_converted_files(glycam2pdb, corpusPath, inputFilePaths, outputDirectory):
+    # Keeps the folder structure of the corpus, which pdb2mmcif uses to name the mmCIF blocks.
+    convertedFilePaths = []
+    for inputFilePath, convertedPDB in zip(
+        inputFilePaths, convert_files(glycam2pdb, inputFilePaths)
+    ):
+        convertedFilePath = os.path.join(
+            outputDirectory, os.path.relpath(inputFilePath, corpusPath)
+        )
+        os.makedirs(os.path.dirname(convertedFilePath), exist_ok=True)
+        with open(convertedFilePath, "w") as newfile:
+            newfile.write(convertedPDB)
+        convertedFilePaths.append(convertedFilePath)
+    return convertedFilePaths
+
+
+def compare_with_golden_outputs(corpusPath, inputFilePaths, convertedPDBs):
+    golden = {"identical": 0, "different": 0, "missing": 0, "differentFiles": []}
+    for inputFilePath, convertedPDB in zip(inputFilePaths, convertedPDBs):
+        goldenFilePath = find_golden_output(corpusPath, inputFilePath)
+        if goldenFilePath is None:
+            golden["missing"] += 1
+            continue
+        with open(goldenFilePath, "r") as file:
+            if file.read() == convertedPDB:
+                golden["identical"] += 1
+            else:
+                golden["different"] += 1
+                golden["differentFiles"].append(
+                    os.path.relpath(inputFilePath, corpusPath)
+                )
+    return golden
+
+
+def benchmark_conversion(glycam2pdb, pdb2mmcif, corpusPath, inputFilePaths, repeats):
+    seconds, convertedPDBs = time_repeats(
+        lambda: convert_files(glycam2pdb, inputFilePaths), repeats
+    )
+    outputDigest = hashlib.sha256()
+    for convertedPDB in convertedPDBs:
+        outputDigest.update(convertedPDB.encode("utf-8"))
+    return {
+        "seconds": seconds,
+        "outputDigest": outputDigest.hexdigest(),
+        "golden": compare_with_golden_outputs(
+            corpusPath, inputFilePaths, convertedPDBs
+        ),
+    }
+
+
+def benchmark_validation(glycam2pdb, pdb2mmcif, corpusPath, inputFilePaths, repeats):
+    from privateer import privateer_core
+
+    try:
+        from .privateer_validation import privateerValidation
+    except ImportError:
+        from privateer_validation import privateerValidation
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        convertedFilePaths = write_converted_files(
+            glycam2pdb, corpusPath, inputFilePaths, temporaryDirectory
+        )
+        seconds, validationResults = time_repeats(
+            lambda: [privateerValidation(path) for path in convertedFilePaths],
+            repeats,
+        )
+    return {
+        "seconds": seconds,
+        "filesWithIssues": sum(
+            fileResults is not None for fileResults in validationResults
+        ),
+    }
+
+
+def benchmark_mmcif(glycam2pdb, pdb2mmcif, corpusPath, inputFilePaths, repeats):
+    import gemmi
+    from privateer import privateer_core
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        convertedDirectory = os.path.join(
+            temporaryDirectory, os.path.basename(corpusPath) + "ConvertedPDB"
+        )
+        write_converted_files(
+            glycam2pdb, corpusPath, inputFilePaths, convertedDirectory
+        )
+        outputDirectory = os.path.join(temporaryDirectory, "mmcif")
+
+        def compile_mmcif():
+            with contextlib.redirect_stdout(io.StringIO()):
+                pdb2mmcif.compileCIFDirectory(convertedDirectory, outputDirectory)
+
+        seconds, _ = time_repeats(compile_mmcif, repeats)
+        compilationSize = os.path.getsize(
+            os.path.join(outputDirectory, "compilation.mmCIF")
+        )
+    return {"seconds": seconds, "compilationBytes": compilationSize}
+
+
+stageBenchmarks = {
+    "conversion": benchmark_conversion,
+    "validation": benchmark_validation,
+    "mmcif": benchmark_mmcif,
+}
+
+
+def run_benchmark_stage(stageName, corpusName, corpusPath, inputFilePaths, repeats):
+    # Runs in a fresh process. A stage whose dependencies are not installed is reported as skipped.
+    glycam2pdb, pdb2mmcif = load_pipeline_modules()
+    stageResult = {
+        "corpus": corpusName,
+        "stage": stageName,
+        "files": len(inputFilePaths),
+        "atoms": count_atoms(inputFilePaths),
+    }
+    try:
+        stageResult.update(
+            stageBenchmarks[stageName](
+                glycam2pdb, pdb2mmcif, corpusPath, inputFilePaths, repeats
+            )
+        )
+    except ImportError as exception:
+        stageResult["skipped"] = f"{type(exception).__name__}: {exception}"
+        return stageResult
+    seconds = stageResult["seconds"]
+    stageResult["filesPerSecond"] = (
+        stageResult["files"] / seconds if seconds > 0 else None
+    )
+    stageResult["atomsPerSecond"] = (
+        stageResult["atoms"] / seconds if seconds > 0 else None
+    )
+    stageResult["peakRSSMegabytes"] = get_peak_rss_megabytes()
+    return stageResult
+
+
+def run_in_fresh_process(function, *arguments):
+    with multiprocessing.get_context("spawn").Pool(processes=1) as pool:
+        return pool.apply(function, arguments)
+
+
+def get_git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=scriptDirectoryPath,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_stage_result(stageResult):
+    label = f'{stageResult["corpus"]:<12} {stageResult["stage"]:<11}'
+    if "skipped" in stageResult:
+        print(f'{label} skipped({stageResult["skipped"]})')
+        return
+    message = f'{label} {stageResult["files"]:>5} files {stageResult["seconds"]:9.3f} s {stageResult["filesPerSecond"]:10.1f} files/s {stageResult["atomsPerSecond"]:12.0f} atoms/s'
+    if stageResult["peakRSSMegabytes"] is not None:
+        message += f' {stageResult["peakRSSMegabytes"]:8.1f} MB peak RSS'
+    print(message)
+    if "golden" in stageResult:
+        golden = stageResult["golden"]
+        print(
+            f'{"":<24} golden outputs: {golden["identical"]} identical, {golden["different"]} different, {golden["missing"]} missing'
+        )
+
+
+def compare_benchmark_reports(previousReport, currentReport, regressionThreshold):
+    # Returns the (corpus, stage) pairs whose throughput dropped by more than regressionThreshold percent.
+    previousResults = {
+        (stageResult["corpus"], stageResult["stage"]): stageResult
+        for stageResult in previousReport["results"]
+    }
+    regressions = []
+    print(f'\nCompared with {previousReport.get("revision")}:')
+    for stageResult in currentReport["results"]:
+        key = (stageResult["corpus"], stageResult["stage"])
+        previousResult = previousResults.get(key)
+        if (
+            previousResult is None
+            or "skipped" in stageResult
+            or "skipped" in previousResult
+        ):
+            continue
+        change = (
+            stageResult["filesPerSecond"] / previousResult["filesPerSecond"] - 1
+        ) * 100
+        message = f"{key[0]:<12} {key[1]:<11} {change:+7.1f}% files/s"
+        if stageResult.get("outputDigest") != previousResult.get("outputDigest"):
+            message += ", converted output changed"
+        if change < -regressionThreshold:
+            message += " REGRESSION"
+            regressions.append(key)
+        print(message)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        usage="%(prog)s [options]",
+        description="Benchmark conversion, Privateer validation and mmCIF compilation throughput over the bundled GLYCAM corpora.",
+    )
+    parser.add_argument(
+        "-corpora_path",
+        action="store",
+        default=defaultCorporaPath,
+        dest="user_corporaPath",
+        help=f"Folder that contains the corpora. Defaults to '{defaultCorporaPath}'",
+    )
+    parser.add_argument(
+        "-corpora",
+        action="store",
+        nargs="+",
+        default=defaultCorpora,
+        dest="user_corpora",
+        help=f"Corpora(folders inside -corpora_path) to benchmark. Defaults to {' '.join(defaultCorpora)}.",
+    )
+    parser.add_argument(
+        "-stages",
+        action="store",
+        nargs="+",
+        default=benchmarkStages,
+        choices=benchmarkStages,
+        dest="user_stages",
+        help="Stages to benchmark. Stages whose dependencies(Privateer, gemmi) are not installed are reported as skipped.",
+    )
+    parser.add_argument(
+        "-synthetic_frames",
+        action="store",
+        type=int,
+        default=defaultSyntheticFrames,
+        dest="user_syntheticFrames",
+        help=f"Also benchmark a synthetic trajectory made of this many copies of the largest structure of the first corpus. 0 disables it. Defaults to {defaultSyntheticFrames}.",
+    )
+    parser.add_argument(
+        "-repeat",
+        action="store",
+        type=int,
+        default=defaultRepeats,
+        dest="user_repeats",
+        help=f"Every stage is timed this many times and the fastest run is reported. Defaults to {defaultRepeats}.",
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default="benchmark_report.json",
+        dest="user_outputPath",
+        help="Path of the JSON report. Defaults to benchmark_report.json",
+    )
+    parser.add_argument(
+        "-compare",
+        action="store",
+        default=None,
+        dest="user_comparePath",
+        help="JSON report of a previous run. Throughput changes are printed and the script exits with 1 if any stage regressed.",
+    )
+    parser.add_argument(
+        "-regression_threshold",
+        action="store",
+        type=float,
+        default=defaultRegressionThreshold,
+        dest="user_regressionThreshold",
+        help=f"Percentage drop in files/sec that counts as a regression with -compare. Defaults to {defaultRegressionThreshold}.",
+    )
+    args = parser.parse_args(argv)
+
+    corpora = []
+    for corpusName in args.user_corpora:
+        corpusPath = os.path.join(args.user_corporaPath, corpusName)
+        if not os.path.isdir(corpusPath):
+            raise ValueError(f"Corpus {corpusName} was not found in {corpusPath}")
+        corpora.append((corpusName, corpusPath, find_corpus_files(corpusPath)))
+
+    temporaryDirectory = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        if args.user_syntheticFrames > 0 and corpora:
+            syntheticFilePath = write_synthetic_trajectory(
+                corpora[0][1],
+                os.path.join(temporaryDirectory, "synthetic_trajectory.pdb"),
+                args.user_syntheticFrames,
+            )
+            corpora.append(
+                (syntheticCorpusName, temporaryDirectory, [syntheticFilePath])
+            )
+
+        report = {
+            "reportVersion": BENCHMARK_REPORT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": get_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.user_repeats,
+            "syntheticFrames": args.user_syntheticFrames,
+            "results": [],
+        }
+        for corpusName, corpusPath, inputFilePaths in corpora:
+            for stageName in args.user_stages:
+                stageResult = run_in_fresh_process(
+                    run_benchmark_stage,
+                    stageName,
+                    corpusName,
+                    corpusPath,
+                    inputFilePaths,
+                    args.user_repeats,
+                )
+                print_stage_result(stageResult)
+                report["results"].append(stageResult)
+    finally:
+        shutil.rmtree(temporaryDirectory, ignore_errors=True)
+
+    with open(args.user_outputPath, "w") as reportFile:
+        json.dump(report, reportFile, indent=1, sort_keys=True)
+    print(f"Benchmark report written to {args.user_outputPath}")
+
+    if args.user_comparePath is not None:
+        with open(args.user_comparePath, "r") as previousReportFile:
+            previousReport = json.load(previousReportFile)
+        regressions = compare_benchmark_reports(
+            previousReport, report, args.user_regressionThreshold
+        )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
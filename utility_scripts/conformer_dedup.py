@@ -0,0 +1,235 @@
+import os
+import json
+import argparse
+
+try:
+    from .archive_io import is_archive_path, iterate_archive_members
+    from .profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+except ImportError:
+    from archive_io import is_archive_path, iterate_archive_members
+    from profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+
+# Groups near-identical conformers(cluster representatives such as man6.1/Cluster1.pdb and cluster1b.pdb, or repeated
+# trajectory frames) so that Privateer validation only has to run once per group. Conformers are compared on their heavy
+# atoms: structures with the same atoms(names, residues and order) are superposed with the Kabsch algorithm and end up
+# in the same group when their RMSD to the group representative(the first conformer of the group in input order) is
+# within the tolerance. Each new conformer is compared against every representative of its topology in one vectorized
+# NumPy step. NumPy is only imported once there is something to compare.
+
+defaultDeduplicationTolerance = 0.25
+
+PDB_RECORD_NAME = slice(0, 6)
+PDB_ATOM_NAME = slice(12, 16)
+PDB_RESIDUE_NAME = slice(17, 20)
+PDB_RESIDUE_SEQ = slice(22, 26)
+PDB_COORDINATE_RECORDS = ("ATOM  ", "HETATM")
+
+
+def is_heavy_atom(atomName):
+    return atomName.lstrip("0123456789")[:1] != "H"
+
+
+def get_heavy_atoms(Lines):
+    # Returns the heavy atom signature(residue name, residue number and atom name of every heavy atom) and coordinates.
+    signature = []
+    coordinates = []
+    for line in Lines:
+        # Multi-model files are compared on their first model.
+        if line[PDB_RECORD_NAME] == "ENDMDL":
+            break
+        if line[PDB_RECORD_NAME] not in PDB_COORDINATE_RECORDS:
+            continue
+        atomName = line[PDB_ATOM_NAME].strip()
+        if not is_heavy_atom(atomName):
+            continue
+        signature.append(
+            (line[PDB_RESIDUE_NAME], line[PDB_RESIDUE_SEQ].strip(), atomName)
+        )
+        coordinates.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+    return tuple(signature), coordinates
+
+
+def superposed_rmsd_to_representatives(representatives, coordinates):
+    # representatives is a (groups, atoms, 3) array of centred coordinates, coordinates a centred (atoms, 3) array.
+    # Optimal superposition RMSD from the singular values of the covariance matrices(Kabsch), reflections excluded.
+    import numpy
+
+    covariances = numpy.einsum("gai,aj->gij", representatives, coordinates)
+    U, singularValues, Vt = numpy.linalg.svd(covariances)
+    reflections = numpy.sign(numpy.linalg.det(U) * numpy.linalg.det(Vt))
+    singularValues[:, 2] *= reflections
+    squaredDeviation = (
+        numpy.einsum("gai,gai->g", representatives, representatives)
+        + numpy.einsum("ai,ai->", coordinates, coordinates)
+        - 2 * singularValues.sum(axis=1)
+    )
+    return numpy.sqrt(numpy.maximum(squaredDeviation, 0) / len(coordinates))
+
+
+def groupConformers(structures, tolerance=defaultDeduplicationTolerance):
+    # structures is an iterable of (name, records). Returns groups in input order as
+    # {"representative": name, "members": [{"name": name, "rmsd": RMSD to the representative}, ...]}.
+    # Structures without heavy atoms are never grouped.
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Conformer deduplication requires numpy to be installed")
+
+    groups = []
+    topologies = {}
+    for name, Lines in structures:
+        with profile_stage("conformer fingerprint"):
+            signature, coordinates = get_heavy_atoms(Lines)
+        if not signature:
+            groups.append(
+                {"representative": name, "members": [{"name": name, "rmsd": 0.0}]}
+            )
+            continue
+        coordinates = numpy.array(coordinates, dtype=float)
+        coordinates -= coordinates.mean(axis=0)
+        topology = topologies.setdefault(signature, {"groups": [], "coordinates": []})
+        with profile_stage("conformer superposition"):
+            if topology["groups"]:
+                rmsd = superposed_rmsd_to_representatives(
+                    numpy.stack(topology["coordinates"]), coordinates
+                )
+                closestIndex = int(numpy.argmin(rmsd))
+                if rmsd[closestIndex] <= tolerance:
+                    topology["groups"][closestIndex]["members"].append(
+                        {"name": name, "rmsd": float(rmsd[closestIndex])}
+                    )
+                    continue
+        group = {"representative": name, "members": [{"name": name, "rmsd": 0.0}]}
+        topology["groups"].append(group)
+        topology["coordinates"].append(coordinates)
+        groups.append(group)
+    return groups
+
+
+def groupConformerFiles(paths, tolerance=defaultDeduplicationTolerance):
+    def iterate_structures():
+        for path in paths:
+            with profile_stage("read"):
+                with open(path, "r") as file:
+                    Lines = file.readlines()
+            yield path, Lines
+
+    return groupConformers(iterate_structures(), tolerance)
+
+
+def get_representatives(groups):
+    # Maps every conformer to the representative its validation results are taken from.
+    return {
+        member["name"]: group["representative"]
+        for group in groups
+        for member in group["members"]
+    }
+
+
+def print_deduplication_summary(groups, tolerance):
+    numberOfConformers = sum(len(group["members"]) for group in groups)
+    print(
+        f"Deduplicated {numberOfConformers} conformers into {len(groups)} groups(heavy atom RMSD <= {tolerance} A), only representatives are validated."
+    )
+
+
+class CollectedValidationResults:
+    # Stands in for a ValidationResultsWriter, so results of representatives are kept rather than printed.
+    def __init__(self):
+        self.results = {}
+
+    def write(self, path, fileResults):
+        self.results[path] = fileResults
+
+
+def add_deduplication_arguments(parser):
+    parser.add_argument(
+        "-dedup",
+        action="store",
+        nargs="?",
+        type=float,
+        default=None,
+        const=defaultDeduplicationTolerance,
+        dest="user_dedupTolerance",
+        help=f"Validate only one representative of each group of near-identical conformers(heavy atom RMSD after superposition within the given tolerance in A, {defaultDeduplicationTolerance} if no value is given) and report its results for every member. Requires numpy.",
+    )
+
+
+def iterate_input_structures(inputPath):
+    if os.path.isfile(inputPath) and is_archive_path(inputPath):
+        for relativePath, Lines in iterate_archive_members(inputPath):
+            yield os.path.join(inputPath, relativePath), Lines
+        return
+    for root, dirs, files in os.walk(inputPath):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() != ".pdb":
+                continue
+            with open(os.path.join(root, name), "r") as file:
+                yield os.path.join(root, name), file.readlines()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="conformer_dedup.py",
+        usage="%(prog)s [options] PATH.",
+        description="Group near-identical conformers of a folder or archive of PDB files by heavy atom RMSD after superposition.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Root directory or .zip/.tar(.gz/.bz2/.xz) archive of PDB files.",
+        required=True,
+    )
+    parser.add_argument(
+        "-tolerance",
+        action="store",
+        type=float,
+        default=defaultDeduplicationTolerance,
+        dest="user_tolerance",
+        help=f"Largest heavy atom RMSD in A between a conformer and its group representative. Defaults to {defaultDeduplicationTolerance}.",
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help="Write the groups as JSON to this path.",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+
+    groups = groupConformers(
+        iterate_input_structures(os.path.abspath(args.user_inputPath)),
+        args.user_tolerance,
+    )
+    for group in groups:
+        if len(group["members"]) > 1:
+            print(f'{group["representative"]}:')
+            for member in group["members"][1:]:
+                print(f'\t{member["name"]}\tRMSD {member["rmsd"]:.3f} A')
+    numberOfConformers = sum(len(group["members"]) for group in groups)
+    print(
+        f"{numberOfConformers} conformers form {len(groups)} groups within {args.user_tolerance} A."
+    )
+    if args.user_outputPath is not None:
+        with open(args.user_outputPath, "w") as outputFile:
+            json.dump(groups, outputFile, indent=4)
+    stop_profiling_session(profilingSession)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+import os
+import re
+import sys
+import csv
+import json
+import mmap
+import array
+import struct
+import argparse
+import functools
+
+try:
+    from .profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+    from .conformer_dedup import (
+        defaultDeduplicationTolerance,
+        get_representatives,
+        groupConformerFiles,
+    )
+except ImportError:
+    from profiling import (
+        add_profiling_arguments,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+    from conformer_dedup import (
+        defaultDeduplicationTolerance,
+        get_representatives,
+        groupConformerFiles,
+    )
+
+# Single-container conformer library: every converted structure of a corpus packed into one binary file, instead of
+# hundreds of tiny PDBs in nested folders. Conformers are named after their path relative to the converted folder
+# without the extension(man9/Cluster1) and stored as
+#   header   - magic, format version, number of conformers, offset and length of the index
+#   data     - per conformer, the coordinates as a float64 (atoms, 3) array followed by its PDB records with the
+#              coordinate columns cut out
+#   index    - JSON list with the offsets and metadata(WURCS, GlyTouCan ID, cluster torsions and, when the library was
+#              deduplicated, the representative of its group of near-identical conformers) of every conformer
+# ConformerLibrary maps the file once and looks conformers up by name in a dict, so loading one conformer is a slice of
+# the mapping. Coordinates are returned as NumPy arrays backed by the mapping, NumPy is only imported for those.
+
+LIBRARY_MAGIC = b"GLYCNFLB"
+LIBRARY_VERSION = 1
+LIBRARY_HEADER = struct.Struct("<8sIIQQ")
+LIBRARY_SUFFIX = ".conformers"
+
+PDB_RECORD_NAME = slice(0, 6)
+PDB_COORDINATES = slice(30, 54)
+PDB_COORDINATE_RECORDS = ("ATOM  ", "HETATM")
+
+# Same naming as mmcif_export.clusterTorsionNames, e.g. Phi=66_Psi=-179_Omega=-177.
+torsionNamePattern = re.compile(r"([A-Za-z]+)=(-?[0-9.]+)")
+clusterNumberPattern = re.compile(r"^cluster(\d+)", re.IGNORECASE)
+
+
+def get_conformer_name(inputPath, inputFilePath):
+    return os.path.splitext(os.path.relpath(inputFilePath, inputPath))[0].replace(
+        os.sep, "/"
+    )
+
+
+def format_coordinates(coordinates):
+    return "".join(f"{coordinate:8.3f}" for coordinate in coordinates)
+
+
+def split_coordinates_from_records(Lines, name):
+    # Returns the flat coordinate list and the records with columns 31-54 removed. Coordinates have to survive the
+    # float64 round trip byte for byte, otherwise the library would not reproduce the converted PDB.
+    coordinates = []
+    records = []
+    for line in Lines:
+        if line[PDB_RECORD_NAME] in PDB_COORDINATE_RECORDS:
+            coordinateField = line[PDB_COORDINATES]
+            atomCoordinates = (
+                float(coordinateField[0:8]),
+                float(coordinateField[8:16]),
+                float(coordinateField[16:24]),
+            )
+            if format_coordinates(atomCoordinates) != coordinateField:
+                raise ValueError(
+                    f"{name}: coordinates '{coordinateField}' are not in the PDB %8.3f format and cannot be stored losslessly."
+                )
+            coordinates.extend(atomCoordinates)
+            line = line[: PDB_COORDINATES.start] + line[PDB_COORDINATES.stop :]
+        records.append(line)
+    return coordinates, "".join(records).encode("utf-8")
+
+
+def parse_torsion_name(torsionName):
+    return {
+        angle.lower(): float(value)
+        for angle, value in torsionNamePattern.findall(torsionName)
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def load_cluster_torsion_tables(directory):
+    # GLYCAM clustering results(e.g. tria.61o.csv) sit next to the cluster representatives, one row per cluster.
+    tables = {}
+    if not os.path.isdir(directory):
+        return tables
+    for fileName in sorted(os.listdir(directory)):
+        if os.path.splitext(fileName)[1].lower() != ".csv":
+            continue
+        with open(os.path.join(directory, fileName), newline="") as csvFile:
+            for row in csv.DictReader(csvFile):
+                if "cluster" not in row:
+                    break
+                tables.setdefault(
+                    int(row["cluster"]),
+                    {
+                        key: float(value)
+                        for key, value in row.items()
+                        if key != "cluster" and value not in (None, "")
+                    },
+                )
+    return tables
+
+
+def get_cluster_torsions(inputFilePath):
+    try:
+        from .mmcif_export import clusterTorsionNames
+    except ImportError:
+        from mmcif_export import clusterTorsionNames
+
+    fileName = os.path.basename(inputFilePath)
+    if fileName in clusterTorsionNames:
+        return parse_torsion_name(clusterTorsionNames[fileName])
+    clusterNumber = clusterNumberPattern.match(fileName)
+    if clusterNumber is None:
+        return None
+    return load_cluster_torsion_tables(os.path.dirname(inputFilePath)).get(
+        int(clusterNumber.group(1))
+    )
+
+
+def read_mmcif_pair(Lines, tag):
+    # Minimal reader for the _WURCS/_GlyTouCan pairs written by mmcif_export, so gemmi is not needed to build a library.
+    for idx, line in enumerate(Lines):
+        if line.split(maxsplit=1)[:1] != [tag]:
+            continue
+        value = line[len(tag) :].strip()
+        if value == "" and idx + 1 < len(Lines):
+            value = Lines[idx + 1].rstrip("\n")
+            if value.startswith(";"):
+                textField = [value[1:]]
+                for textLine in Lines[idx + 2 :]:
+                    if textLine.startswith(";"):
+                        break
+                    textField.append(textLine.rstrip("\n"))
+                return "\n".join(textField).strip()
+            value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        return None if value in ("?", ".") else value
+    return None
+
+
+def get_glycan_identifiers(mmCIFPath):
+    if mmCIFPath is None or not os.path.isfile(mmCIFPath):
+        return None, None
+    with open(mmCIFPath, "r") as file:
+        Lines = file.readlines()
+    return read_mmcif_pair(Lines, "_WURCS"), read_mmcif_pair(Lines, "_GlyTouCan")
+
+
+def get_mmcif_metadata_path(inputPath, inputFilePath, metadataPath):
+    # mmCIFs written by glycam2pdb -mmcif sit next to the PDBs, pdb2mmcif writes them into a parallel folder.
+    relativePath = os.path.relpath(inputFilePath, inputPath)
+    return os.path.join(
+        metadataPath if metadataPath is not None else inputPath,
+        os.path.splitext(relativePath)[0] + ".mmCIF",
+    )
+
+
+class ConformerLibraryWriter:
+    def __init__(self, libraryPath):
+        self.libraryPath = libraryPath
+        self.entries = []
+        self.names = set()
+        libraryDirectory = os.path.dirname(libraryPath)
+        if libraryDirectory and not os.path.exists(libraryDirectory):
+            os.makedirs(libraryDirectory)
+        # Written next to libraryPath and only moved over it once complete, so a failed build leaves no partial library
+        # behind and an existing library intact.
+        self.temporaryLibraryPath = libraryPath + ".tmp"
+        self.file = open(self.temporaryLibraryPath, "wb")
+        # Header is rewritten with the index location once every conformer is in.
+        self.file.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, LIBRARY_VERSION, 0, 0, 0))
+
+    def pad_to_alignment(self):
+        padding = -self.file.tell() % 8
+        if padding:
+            self.file.write(b"\0" * padding)
+
+    def add(
+        self,
+        name,
+        Lines,
+        WURCS=None,
+        glytoucanID=None,
+        torsions=None,
+        representative=None,
+    ):
+        if name in self.names:
+            raise ValueError(f"Conformer {name} is already in {self.libraryPath}")
+        coordinates, records = split_coordinates_from_records(Lines, name)
+        self.pad_to_alignment()
+        coordinatesOffset = self.file.tell()
+        array.array("d", coordinates).tofile(self.file)
+        recordsOffset = self.file.tell()
+        self.file.write(records)
+        self.names.add(name)
+        self.entries.append(
+            {
+                "name": name,
+                "atoms": len(coordinates) // 3,
+                "coordinatesOffset": coordinatesOffset,
+                "recordsOffset": recordsOffset,
+                "recordsLength": len(records),
+                "WURCS": WURCS,
+                "GlyTouCan": glytoucanID,
+                "torsions": torsions,
+                "representative": representative,
+            }
+        )
+
+    def close(self):
+        if self.file is None:
+            return
+        index = json.dumps(
+            {"byteorder": sys.byteorder, "conformers": self.entries}
+        ).encode("utf-8")
+        self.pad_to_alignment()
+        indexOffset = self.file.tell()
+        self.file.write(index)
+        self.file.seek(0)
+        self.file.write(
+            LIBRARY_HEADER.pack(
+                LIBRARY_MAGIC,
+                LIBRARY_VERSION,
+                len(self.entries),
+                indexOffset,
+                len(index),
+            )
+        )
+        self.file.close()
+        self.file = None
+        os.replace(self.temporaryLibraryPath, self.libraryPath)
+
+    def discard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.remove(self.temporaryLibraryPath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        if exceptionType is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+class ConformerLibrary:
+    def __init__(self, libraryPath):
+        self.libraryPath = libraryPath
+        with open(libraryPath, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            numberOfConformers,
+            indexOffset,
+            indexLength,
+        ) = LIBRARY_HEADER.unpack_from(self.mapping)
+        if magic != LIBRARY_MAGIC:
+            self.close()
+            raise ValueError(f"{libraryPath} is not a conformer library")
+        if version != LIBRARY_VERSION:
+            self.close()
+            raise ValueError(
+                f"{libraryPath} uses conformer library format {version}, expected {LIBRARY_VERSION}"
+            )
+        index = json.loads(self.mapping[indexOffset : indexOffset + indexLength])
+        if index["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(
+                f"{libraryPath} was written on a {index['byteorder']} endian machine"
+            )
+        self.index = {entry["name"]: entry for entry in index["conformers"]}
+
+    def names(self):
+        return list(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def get_entry(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError(f"No conformer named {name} in {self.libraryPath}")
+
+    def get_metadata(self, name):
+        entry = self.get_entry(name)
+        return {
+            "name": name,
+            "atoms": entry["atoms"],
+            "WURCS": entry["WURCS"],
+            "GlyTouCan": entry["GlyTouCan"],
+            "torsions": entry["torsions"],
+            "representative": self.get_representative(name),
+        }
+
+    def get_representative(self, name):
+        # Conformers are their own representative unless the library was built with -dedup.
+        return self.get_entry(name).get("representative") or name
+
+    def get_representative_names(self):
+        return [name for name in self.index if self.get_representative(name) == name]
+
+    def get_coordinates(self, name):
+        # Read-only (atoms, 3) float64 NumPy array backed by the mapping itself, nothing is copied.
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "Conformer coordinate arrays require numpy to be installed"
+            )
+
+        entry = self.get_entry(name)
+        return numpy.frombuffer(
+            self.mapping,
+            dtype=numpy.float64,
+            count=entry["atoms"] * 3,
+            offset=entry["coordinatesOffset"],
+        ).reshape(entry["atoms"], 3)
+
+    def get_records(self, name):
+        entry = self.get_entry(name)
+        coordinates = array.array("d")
+        coordinates.frombytes(
+            self.mapping[
+                entry["coordinatesOffset"] : entry["coordinatesOffset"]
+                + entry["atoms"] * 24
+            ]
+        )
+        start = entry["recordsOffset"]
+        records = (
+            self.mapping[start : start + entry["recordsLength"]]
+            .decode("utf-8")
+            .splitlines(keepends=True)
+        )
+        atomIndex = 0
+        for idx, line in enumerate(records):
+            if line[PDB_RECORD_NAME] in PDB_COORDINATE_RECORDS:
+                records[idx] = (
+                    line[: PDB_COORDINATES.start]
+                    + format_coordinates(coordinates[atomIndex : atomIndex + 3])
+                    + line[PDB_COORDINATES.start :]
+                )
+                atomIndex += 3
+        return records
+
+    def get_pdb_string(self, name):
+        return "".join(self.get_records(name))
+
+    def write_pdb(self, name, outputFilePath):
+        with open(outputFilePath, mode="w") as newfile:
+            newfile.writelines(self.get_records(name))
+        return outputFilePath
+
+    def close(self):
+        if self.mapping is None:
+            return
+        try:
+            self.mapping.close()
+        except BufferError:
+            # Coordinate arrays handed out by get_coordinates still point into the mapping, it is unmapped once they are gone.
+            pass
+        self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+
+def iterate_converted_files(inputPath):
+    for root, dirs, files in os.walk(inputPath):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() == ".pdb":
+                yield os.path.join(root, name)
+
+
+def buildConformerLibrary(
+    inputPath, libraryPath, metadataPath=None, dedupTolerance=None
+):
+    # Packs every converted PDB below inputPath. WURCS and GlyTouCan IDs are taken from the matching mmCIF files when
+    # there are any, cluster torsions from mmcif_export.clusterTorsionNames or the clustering csv next to the PDB.
+    # With dedupTolerance, every conformer also records the representative of its group of near-identical conformers.
+    inputFilePaths = list(iterate_converted_files(inputPath))
+    representatives = {}
+    if dedupTolerance is not None:
+        with profile_stage("deduplication"):
+            representatives = get_representatives(
+                groupConformerFiles(inputFilePaths, dedupTolerance)
+            )
+    with ConformerLibraryWriter(libraryPath) as writer:
+        for inputFilePath in inputFilePaths:
+            with profile_stage("read"):
+                with open(inputFilePath, "r") as file:
+                    Lines = file.readlines()
+            with profile_stage("conformer metadata"):
+                WURCS, glytoucanID = get_glycan_identifiers(
+                    get_mmcif_metadata_path(inputPath, inputFilePath, metadataPath)
+                )
+                torsions = get_cluster_torsions(inputFilePath)
+            with profile_stage("library write"):
+                writer.add(
+                    get_conformer_name(inputPath, inputFilePath),
+                    Lines,
+                    WURCS,
+                    glytoucanID,
+                    torsions,
+                    get_conformer_name(
+                        inputPath, representatives.get(inputFilePath, inputFilePath)
+                    ),
+                )
+        numberOfConformers = len(writer.entries)
+    return numberOfConformers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="conformer_library.py",
+        usage="%(prog)s [options] PATH.",
+        description="Pack a folder of converted PDB files into a single conformer library file, or extract conformers from one.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Folder of converted PDB files(e.g. VolumeConvertedPDB) to pack, or a conformer library when used with -list or -extract.",
+        required=True,
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help=f"Path of the conformer library. Defaults to <input>{LIBRARY_SUFFIX}. With -extract, the PDB file the conformer is written to.",
+    )
+    parser.add_argument(
+        "-metadata",
+        action="store",
+        default=None,
+        dest="user_metadataPath",
+        help="Folder of mmCIF files(e.g. VolumeConvertedmmCIF) mirroring the input, WURCS and GlyTouCan IDs are read from them. By default mmCIFs next to the PDB files(glycam2pdb.py -mmcif) are used if there are any.",
+    )
+    parser.add_argument(
+        "-dedup",
+        action="store",
+        nargs="?",
+        type=float,
+        default=None,
+        const=defaultDeduplicationTolerance,
+        dest="user_dedupTolerance",
+        help=f"Record for every conformer the representative of its group of near-identical conformers(heavy atom RMSD after superposition within the given tolerance in A, {defaultDeduplicationTolerance} if no value is given), see conformer_dedup.py. Requires numpy.",
+    )
+    parser.add_argument(
+        "-list",
+        action="store_true",
+        default=False,
+        dest="user_list",
+        help="Print the name, number of atoms and metadata of every conformer in the library.",
+    )
+    parser.add_argument(
+        "-extract",
+        action="store",
+        default=None,
+        dest="user_extractName",
+        help="Write the conformer with this name(e.g. man9/Cluster1) out as a PDB file.",
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+
+    if args.user_list is True or args.user_extractName is not None:
+        with ConformerLibrary(args.user_inputPath) as library:
+            if args.user_list is True:
+                for name in library:
+                    print(json.dumps(library.get_metadata(name)))
+            if args.user_extractName is not None:
+                outputFilePath = args.user_outputPath
+                if outputFilePath is None:
+                    outputFilePath = os.path.basename(args.user_extractName) + ".pdb"
+                library.write_pdb(args.user_extractName, outputFilePath)
+                print(f"Wrote {args.user_extractName} to {outputFilePath}")
+    else:
+        inputPath = os.path.normpath(args.user_inputPath)
+        libraryPath = args.user_outputPath
+        if libraryPath is None:
+            libraryPath = inputPath + LIBRARY_SUFFIX
+        numberOfConformers = buildConformerLibrary(
+            inputPath, libraryPath, args.user_metadataPath, args.user_dedupTolerance
+        )
+        print(f"Packed {numberOfConformers} conformers into {libraryPath}")
+    stop_profiling_session(profilingSession)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,109 @@
+import io
 import os
-import re
+import sys
+import json
+import hashlib
 import shutil
+import functools
+import string
 import argparse
-from privateer import privateer_core as pvtcore
-from prettytable import PrettyTable
+import tempfile
+import contextlib
+
+try:
+    from .privateer_validation import runPrivateerValidation, print_validation_outcome
+    from .validation_cache import (
+        hash_file_contents,
+        defaultValidationCachePath,
+        defaultValidationCacheMaxMegabytes,
+    )
+    from .glycomics_cache import defaultGlycomicsCachePath
+    from .validation_output import (
+        add_validation_output_arguments,
+        make_validation_results_writer,
+    )
+    from .archive_io import (
+        is_archive_path,
+        get_archive_stem,
+        get_safe_output_path,
+        get_staged_member_path,
+        iterate_archive_members,
+        relabel_validation_results,
+        write_output_archive,
+    )
+    from .conformer_library import buildConformerLibrary
+    from .batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
+    from .conformer_dedup import (
+        add_deduplication_arguments,
+        get_representatives,
+        groupConformerFiles,
+        print_deduplication_summary,
+    )
+    from .profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        is_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+except ImportError:
+    from privateer_validation import runPrivateerValidation, print_validation_outcome
+    from validation_cache import (
+        hash_file_contents,
+        defaultValidationCachePath,
+        defaultValidationCacheMaxMegabytes,
+    )
+    from glycomics_cache import defaultGlycomicsCachePath
+    from validation_output import (
+        add_validation_output_arguments,
+        make_validation_results_writer,
+    )
+    from archive_io import (
+        is_archive_path,
+        get_archive_stem,
+        get_safe_output_path,
+        get_staged_member_path,
+        iterate_archive_members,
+        relabel_validation_results,
+        write_output_archive,
+    )
+    from conformer_library import buildConformerLibrary
+    from batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
+    from conformer_dedup import (
+        add_deduplication_arguments,
+        get_representatives,
+        groupConformerFiles,
+        print_deduplication_summary,
+    )
+    from profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        is_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
 
 # import gemmi
 # from privateer import libprivateer as pvt
@@ -780,6 +880,39 @@ def import_pdb(path):
     return outputLines
 
 
+def stream_pdb(path):
+    with open(path, "r") as file:
+        for line in file:
+            if line[:5] != "MODEL":
+                yield line
+
+
+def split_pdb_frames(Lines):
+    # Yields (model serial, records) for every MODEL/ENDMDL block, so only a single frame is held in memory.
+    # Records outside of any MODEL block(headers, END, or a file without MODEL records) are yielded with a serial of None.
+    modelSerial = None
+    frameLines = []
+    for line in Lines:
+        if line[:5] == "MODEL":
+            if frameLines or modelSerial is not None:
+                yield modelSerial, frameLines
+            modelSerial = line[5:].strip()
+            frameLines = []
+        elif line[:6] == "ENDMDL":
+            yield modelSerial, frameLines
+            modelSerial = None
+            frameLines = []
+        else:
+            frameLines.append(line)
+    if frameLines or modelSerial is not None:
+        yield modelSerial, frameLines
+
+
+def stream_pdb_frames(path):
+    with open(path, "r") as file:
+        yield from split_pdb_frames(file)
+
+
 def export_pdb(path, output):
     file = open(path, "a")
     file.writelines(output)
@@ -803,27 +936,95 @@ def replace_char_at_index(org_str, index, replacement):
     return new_str
 
 
+# Fixed PDB columns(0-based slices) read by the conversion engine.
+PDB_RECORD_NAME = slice(0, 6)
+PDB_ATOM_NAME = slice(12, 16)
+PDB_RESIDUE_NAME = slice(17, 20)
+PDB_RESIDUE_SEQ = slice(22, 26)
+PDB_COORDINATE_RECORDS = ("ATOM  ", "HETATM")
+
+# Maximum number of records held back while looking for the sugar that an ROH aglycone is attached to.
+ROH_LOOKAHEAD_LIMIT = 256
+
+# First character of a Glycam residue name encodes the linkage positions, the remaining two are the sugar code.
+glycamResiduePrefixCharacters = string.ascii_letters + string.digits + "_"
+
+
+def build_residue_code_lookup(conversionTable):
+    # Residue names are three columns wide, so only the two letter Glycam codes can ever be matched.
+    residueCodeLookup = {}
+    for glycamCode, replacementDictionary in conversionTable.items():
+        if len(glycamCode) != 2:
+            continue
+        for prefix in glycamResiduePrefixCharacters:
+            residueCodeLookup[prefix + glycamCode] = (
+                replacementDictionary["PDB"],
+                replacementDictionary["supported"],
+            )
+    return residueCodeLookup
+
+
+def resolve_atom_name_field(atomNameField, atom_replacements):
+    for start in range(len(atomNameField)):
+        for glycamAtomName, pdbAtomName in atom_replacements.items():
+            if atomNameField.startswith(glycamAtomName, start):
+                end = start + len(glycamAtomName)
+                return (
+                    atomNameField[:start]
+                    + pdbAtomName.ljust(len(glycamAtomName))
+                    + atomNameField[end:]
+                )  # Adds whitespace if were replacing C2N with C7 for example.
+    return atomNameField
+
+
+def build_atom_name_lookup(atom_replacements):
+    # Precomputes every placement of a Glycam atom name within the 4 column atom name field.
+    # Fields that are not covered are resolved by lookup_atom_name_field.
+    atomNameLookup = {}
+    for glycamAtomName in atom_replacements:
+        for start in range(4 - len(glycamAtomName) + 1):
+            atomNameField = (" " * start + glycamAtomName).ljust(4)
+            atomNameLookup[atomNameField] = resolve_atom_name_field(
+                atomNameField, atom_replacements
+            )
+    return atomNameLookup
+
+
+def lookup_atom_name_field(atomNameField, atomNameLookup, atom_replacements):
+    replacementField = atomNameLookup.get(atomNameField)
+    if replacementField is None:
+        replacementField = resolve_atom_name_field(atomNameField, atom_replacements)
+    return replacementField
+
+
+glycamResidueCodeLookup = build_residue_code_lookup(
+    glycamOneLetterToPDBThreeLetterCodeConversion
+)
+glycamAtomNameLookup = build_atom_name_lookup(atom_replacements)
+# Number of converted atom name/residue name columns get_glycam_record_template keeps. A corpus only holds a few hundred
+# distinct ones, the bound keeps files with arbitrary atom names from growing the cache for the lifetime of the process.
+RECORD_TEMPLATE_CACHE_SIZE = 4096
+
+
 def find_location_of_glycam_residue_code(line):
-    regex = "|".join(
-        "([\w]({}))".format(k) for k in glycamOneLetterToPDBThreeLetterCodeConversion
-    )
-    match = re.search(regex, line)
-    if match is not None:
-        return {"start": match.start(), "end": match.end(), "match": match.group()}
-    else:
-        return None
+    if line[PDB_RECORD_NAME] in PDB_COORDINATE_RECORDS or line[:3] == "TER":
+        residueName = line[PDB_RESIDUE_NAME]
+        if residueName in glycamResidueCodeLookup:
+            return {
+                "start": PDB_RESIDUE_NAME.start,
+                "end": PDB_RESIDUE_NAME.stop,
+                "match": residueName,
+            }
+    return None
 
 
 def generateROHReplacementInstructions(Lines):
     for idx, line in enumerate(Lines):
-        ROHregex = "(ROH)"
-        ROHmatch = re.search(ROHregex, line)
-        if ROHmatch is not None:
+        if line[PDB_RESIDUE_NAME] == "ROH":
             while idx < len(Lines):
                 glycamCodeMatch = find_location_of_glycam_residue_code(Lines[idx])
                 if glycamCodeMatch is not None:
-                    splitLine = Lines[idx].split()
-                    residueID = splitLine[4]
+                    residueID = Lines[idx][PDB_RESIDUE_SEQ].strip()
                     return {
                         "replacement_code": glycamCodeMatch["match"],
                         "replacement_residue_ID": residueID,
@@ -832,6 +1033,18 @@ def generateROHReplacementInstructions(Lines):
     return None
 
 
+def replace_ROH_in_line(line, replacementResidue, replacement_residue_ID):
+    if line[PDB_RESIDUE_NAME] != "ROH":
+        return line
+    return (
+        line[: PDB_RESIDUE_NAME.start]
+        + replacementResidue
+        + line[PDB_RESIDUE_NAME.stop : PDB_RESIDUE_SEQ.start]
+        + replacement_residue_ID.rjust(PDB_RESIDUE_SEQ.stop - PDB_RESIDUE_SEQ.start)
+        + line[PDB_RESIDUE_SEQ.stop :]
+    )
+
+
 def replaceROH(instructionsForROHReplacement, Lines):
     output = []
     if instructionsForROHReplacement == None:
@@ -840,81 +1053,117 @@ def replaceROH(instructionsForROHReplacement, Lines):
         replacementResidue = instructionsForROHReplacement["replacement_code"]
         replacement_residue_ID = instructionsForROHReplacement["replacement_residue_ID"]
         for line in Lines:
-            if "ROH" in line:
-                ROHreplaced = line.replace("ROH", replacementResidue)
-                splitLine = re.split(r"(\s+)", ROHreplaced)
-                splitLine[8] = re.sub("\d", replacement_residue_ID, splitLine[8])
-                outputLine = "".join(splitLine)
-                output.append(outputLine)
-            else:
-                output.append(line)
+            output.append(
+                replace_ROH_in_line(line, replacementResidue, replacement_residue_ID)
+            )
     return output
 
 
-def convertGlycamToPDB(
-    glycamOneLetterToPDBThreeLetterCodeConversion, atom_replacements, inputPDB, path
-):
-    output = []
-    unsupportedByPrivaterCodes = []
+def streamROHReplacement(Lines, lookaheadLimit=ROH_LOOKAHEAD_LIMIT):
+    # Lines from the first ROH onwards are held back until the reducing end sugar that follows the aglycone is seen.
+    # If no Glycam residue turns up within lookaheadLimit lines, the ROH is left untouched, as replaceROH would do.
+    instructionsForROHReplacement = None
+    searchFinished = False
+    lookahead = []
+    for line in Lines:
+        if instructionsForROHReplacement is not None:
+            yield replace_ROH_in_line(
+                line,
+                instructionsForROHReplacement["replacement_code"],
+                instructionsForROHReplacement["replacement_residue_ID"],
+            )
+        elif searchFinished:
+            yield line
+        elif lookahead or line[PDB_RESIDUE_NAME] == "ROH":
+            lookahead.append(line)
+            glycamCodeMatch = find_location_of_glycam_residue_code(line)
+            if glycamCodeMatch is not None:
+                instructionsForROHReplacement = {
+                    "replacement_code": glycamCodeMatch["match"],
+                    "replacement_residue_ID": line[PDB_RESIDUE_SEQ].strip(),
+                }
+                for bufferedLine in lookahead:
+                    yield replace_ROH_in_line(
+                        bufferedLine,
+                        instructionsForROHReplacement["replacement_code"],
+                        instructionsForROHReplacement["replacement_residue_ID"],
+                    )
+                lookahead = []
+            elif len(lookahead) > lookaheadLimit:
+                searchFinished = True
+                yield from lookahead
+                lookahead = []
+        else:
+            yield line
+    yield from lookahead
+
 
-    regex_residue_code = "|".join(
-        "([\w]({}))".format(k) for k in glycamOneLetterToPDBThreeLetterCodeConversion
+def build_record_template(recordTemplateField, residueCodeLookup, atomNameLookup):
+    # recordTemplateField holds columns 13-20 of an ATOM/HETATM record: atom name(4), altLoc(1) and residue name(3).
+    # Returns the converted columns and the unsupported sugar entry the record adds, or None if Privateer supports the residue.
+    atomNameField = recordTemplateField[:4]
+    altLoc = recordTemplateField[4]
+    residueName = recordTemplateField[5:]
+    replacementAtomNameField = lookup_atom_name_field(
+        atomNameField, atomNameLookup, atom_replacements
     )
-    regex_atom_code = "|".join("({})".format(k) for k in atom_replacements)
-    for line in inputPDB:
-        splitLine = re.split(r"(\s+)", line)
-        if len(splitLine) > 10:
-            match_residue_code = re.search(regex_residue_code, splitLine[6])
-            match_atom_code = re.search(regex_atom_code, splitLine[4])
-            if match_residue_code is not None:
-                codeToReplace = splitLine[6][
-                    match_residue_code.start() + 1 : match_residue_code.end()
-                ]
-                replacementDictionary = glycamOneLetterToPDBThreeLetterCodeConversion[
-                    codeToReplace
-                ]
-                replacementPDBCode = replacementDictionary["PDB"]
-                supportedByPrivateer = replacementDictionary["supported"]
-                splitLine[6] = re.sub(
-                    match_residue_code.group(), replacementPDBCode, splitLine[6]
-                )
+    unsupportedCode = None
+    residueReplacement = residueCodeLookup.get(residueName)
+    if residueReplacement is not None:
+        replacementPDBCode, supportedByPrivateer = residueReplacement
+        if supportedByPrivateer == False:
+            unsupportedCode = {
+                "GlycamCode": residueName,
+                "PDBCode": replacementPDBCode,
+            }
+    else:
+        replacementPDBCode = residueName
+    return replacementAtomNameField + altLoc + replacementPDBCode, unsupportedCode
 
-                if supportedByPrivateer == False:
-                    unsupportedByPrivaterCodes.append(
-                        {
-                            "GlycamCode": match_residue_code.group(),
-                            "PDBCode": replacementPDBCode,
-                        }
-                    )
-            if match_atom_code is not None:
-                codeToReplace = splitLine[4][
-                    match_atom_code.start() : match_atom_code.end()
-                ]
-                replacementAtomCode = atom_replacements[codeToReplace]
-                replacementAtomCode = replacementAtomCode.ljust(
-                    len(codeToReplace)
-                )  # Adds whitespace if were replacing C2N with C7 for example.
-                splitLine[4] = re.sub(
-                    match_atom_code.group(), replacementAtomCode, splitLine[4]
-                )
 
-            outputLine = "".join(splitLine)
-            output.append(outputLine)
-        elif splitLine[0] == "TER":
-            match_residue_code = re.search(regex_residue_code, line)
-            codeToReplace = line[
-                match_residue_code.start() + 1 : match_residue_code.end()
-            ]
-            replacementDictionary = glycamOneLetterToPDBThreeLetterCodeConversion[
-                codeToReplace
-            ]
-            replacementPDBCode = replacementDictionary["PDB"]
-            supportedByPrivateer = replacementDictionary["supported"]
-            outputLine = line.replace(match_residue_code.group(), replacementPDBCode)
-            output.append(outputLine)
+@functools.lru_cache(maxsize=RECORD_TEMPLATE_CACHE_SIZE)
+def get_glycam_record_template(recordTemplateField):
+    return build_record_template(
+        recordTemplateField, glycamResidueCodeLookup, glycamAtomNameLookup
+    )
+
+
+def convert_glycam_record(
+    line,
+    residueCodeLookup,
+    atomNameLookup,
+    unsupportedByPrivaterCodes,
+    getRecordTemplate=None,
+):
+    # getRecordTemplate is a memoized build_record_template(e.g. get_glycam_record_template) looked up per ATOM/HETATM
+    # atom name/residue name columns, so most records are a cache hit plus a splice around the serial and coordinates.
+    recordName = line[PDB_RECORD_NAME]
+    if recordName in PDB_COORDINATE_RECORDS and len(line) >= PDB_RESIDUE_NAME.stop:
+        recordTemplateField = line[PDB_ATOM_NAME.start : PDB_RESIDUE_NAME.stop]
+        if getRecordTemplate is None:
+            recordTemplate = build_record_template(
+                recordTemplateField, residueCodeLookup, atomNameLookup
+            )
         else:
-            output.append(line)
+            recordTemplate = getRecordTemplate(recordTemplateField)
+        convertedField, unsupportedCode = recordTemplate
+        if unsupportedCode is not None:
+            unsupportedByPrivaterCodes.append(dict(unsupportedCode))
+        return (
+            line[: PDB_ATOM_NAME.start] + convertedField + line[PDB_RESIDUE_NAME.stop :]
+        )
+    elif recordName[:3] == "TER" and len(line) >= PDB_RESIDUE_NAME.stop:
+        residueReplacement = residueCodeLookup.get(line[PDB_RESIDUE_NAME])
+        if residueReplacement is not None:
+            return (
+                line[: PDB_RESIDUE_NAME.start]
+                + residueReplacement[0]
+                + line[PDB_RESIDUE_NAME.stop :]
+            )
+    return line
 
+
+def print_unsupported_codes(unsupportedByPrivaterCodes, path):
     if len(unsupportedByPrivaterCodes):
         print(
             f"Detected {len(unsupportedByPrivaterCodes)} sugars that are not supported by Privateer in the following structure {path}!"
@@ -924,211 +1173,882 @@ def convertGlycamToPDB(
                 f'{idx}/{len(unsupportedByPrivaterCodes)}: Glycam ID - {unsupportedCode["GlycamCode"]}\t\tPDB ID: {unsupportedCode["PDBCode"]}'
             )
 
-    return output
+
+def streamGlycamToPDB(
+    residueCodeLookup, atomNameLookup, inputPDB, path, getRecordTemplate=None
+):
+    unsupportedByPrivaterCodes = []
+    for line in inputPDB:
+        yield convert_glycam_record(
+            line,
+            residueCodeLookup,
+            atomNameLookup,
+            unsupportedByPrivaterCodes,
+            getRecordTemplate,
+        )
+    print_unsupported_codes(unsupportedByPrivaterCodes, path)
+
+
+def convertGlycamToPDB(
+    residueCodeLookup, atomNameLookup, inputPDB, path, getRecordTemplate=None
+):
+    return list(
+        streamGlycamToPDB(
+            residueCodeLookup, atomNameLookup, inputPDB, path, getRecordTemplate
+        )
+    )
 
 
-def conversionPipeline(path):
-    glycamPDB = import_pdb(path)
+def convertFrame(glycamPDB, path):
     instructionsForROHReplacement = generateROHReplacementInstructions(glycamPDB)
     ROH_removed = replaceROH(instructionsForROHReplacement, glycamPDB)
     convertedPDB = convertGlycamToPDB(
-        glycamOneLetterToPDBThreeLetterCodeConversion,
-        atom_replacements,
+        glycamResidueCodeLookup,
+        glycamAtomNameLookup,
         ROH_removed,
         path,
+        get_glycam_record_template,
     )
     return convertedPDB
 
 
-def privateerValidation(path):
-    outputList = []
-    glycosylation = pvtcore.GlycosylationComposition_memsafe(path)
-    numGlycans = glycosylation.get_number_of_glycan_chains_detected()
-    for glycanIndex in range(numGlycans):
-        glycanList = []
-        glycan = glycosylation.get_glycan(glycanIndex)
-        glycanWURCS = glycan.get_wurcs_notation()
-        numSugars = glycan.get_total_number_of_sugars()
-        for sugarIndex in range(numSugars):
-            sugar = glycan.get_monosaccharide(sugarIndex)
-            sugarPDBCode = sugar.get_name_short()
-            sugarPDBChain = sugar.get_sugar_chain_id()
-            sugarPDBID = int(sugar.get_sugar_pdb_id())
-            sugarCremerPople = sugar.get_cremer_pople_params()
-            puckeringAmplitude = sugarCremerPople[0]
-            Phi = sugarCremerPople[1]
-            Theta = sugarCremerPople[2]
-            sugarType = sugar.get_denomination()
-            sugarConformation = sugar.get_conformation_name()
-            sugarBFac = sugar.get_bfactor()
-            sugarCtx = sugar.get_glycosylation_type()
-            sugarPrivateerDiagnostic = sugar.get_privateer_diagnostic()
-            if sugarConformation != "4c1" or sugarPrivateerDiagnostic != "yes":
-                glycanList.append(
-                    {
-                        "Code": sugarPDBCode,
-                        "Chain": sugarPDBChain,
-                        "ID": sugarPDBID,
-                        "Q": puckeringAmplitude,
-                        "Phi": Phi,
-                        "Theta": Theta,
-                        "detectedType": sugarType,
-                        "cnf": sugarConformation,
-                        "bfac": sugarBFac,
-                        "ctx": sugarCtx,
-                        "diagnostic": sugarPrivateerDiagnostic,
-                    }
+# Number of trajectory frames -fix_anomers holds in memory to correct in one vectorized step(-anomer_batch_size). Frames
+# are otherwise streamed one at a time, so this is what bounds the peak memory of a corrected trajectory.
+ANOMER_CORRECTION_FRAME_BATCH_SIZE = 16
+anomerCorrectionBatchSize = ANOMER_CORRECTION_FRAME_BATCH_SIZE
+
+
+def set_anomer_correction_batch_size(batchSize):
+    global anomerCorrectionBatchSize
+    anomerCorrectionBatchSize = batchSize
+
+
+def anomerCorrectionStage(frames):
+    # Flips alpha reducing end sugars attached to ROH to beta, replacing anomerchange.R. NumPy is only loaded when requested.
+    try:
+        from .anomer_correction import correctAnomersInFrames
+    except ImportError:
+        from anomer_correction import correctAnomersInFrames
+
+    return correctAnomersInFrames(frames, batchSize=anomerCorrectionBatchSize)
+
+
+def conversionPipeline(path, fixAnomers=False, Lines=None):
+    # Lines are the already read records of path, e.g. a member of an archive. Otherwise path is read from disk.
+    with profile_stage("read"):
+        if Lines is None:
+            glycamPDB = import_pdb(path)
+        else:
+            glycamPDB = [line for line in Lines if line[:5] != "MODEL"]
+    if fixAnomers is True:
+        with profile_stage("anomer correction"):
+            [(modelSerial, glycamPDB)] = anomerCorrectionStage([(None, glycamPDB)])
+    with profile_stage("convert"):
+        return convertFrame(glycamPDB, path)
+
+
+def streamingConversionPipeline(path):
+    # Same conversion as conversionPipeline, but records are pulled lazily through every stage
+    # so that only the ROH lookahead is ever held in memory.
+    return streamGlycamToPDB(
+        glycamResidueCodeLookup,
+        glycamAtomNameLookup,
+        streamROHReplacement(stream_pdb(path)),
+        path,
+        get_glycam_record_template,
+    )
+
+
+def frameConversionPipeline(path, fixAnomers=False, Lines=None):
+    # Every MODEL/ENDMDL block of a trajectory is converted independently, with its own ROH replacement.
+    if Lines is None:
+        frames = stream_pdb_frames(path)
+    else:
+        frames = split_pdb_frames(Lines)
+    if fixAnomers is True:
+        frames = anomerCorrectionStage(frames)
+    for modelSerial, frameLines in frames:
+        with profile_stage("convert frame"):
+            if modelSerial is None:
+                convertedFrame = convertFrame(frameLines, path)
+            else:
+                convertedFrame = convertFrame(
+                    frameLines, f"{path} (MODEL {modelSerial})"
                 )
-        if len(glycanList):
-            sortedList = sorted(glycanList, key=lambda k: k["ID"])
-            outputDict = {
-                "WURCS": glycanWURCS,
-                "totalSugars": numSugars,
-                "problematicSugars": sortedList,
-            }
-            outputList.append(outputDict)
+        yield modelSerial, convertedFrame
+
+
+def write_multimodel_pdb(outputFilePath, convertedFrames):
+    with open(outputFilePath, mode="w") as newfile:
+        for modelSerial, frameLines in convertedFrames:
+            if modelSerial is None:
+                newfile.writelines(frameLines)
+            else:
+                newfile.write(f"MODEL     {modelSerial:>4}\n")
+                newfile.writelines(frameLines)
+                newfile.write("ENDMDL\n")
+    return [outputFilePath]
+
+
+def write_split_frames(outputFilePath, convertedFrames, exportmmCIF=False):
+    # Each frame is written to <output>_model<serial>.pdb. Records preceding the first MODEL are repeated at the top of every frame.
+    outputRoot, outputExtension = os.path.splitext(outputFilePath)
+    headerLines = []
+    outputFilePaths = []
+    for modelSerial, frameLines in convertedFrames:
+        if modelSerial is None:
+            if not outputFilePaths:
+                headerLines.extend(frameLines)
+            continue
+        frameFilePath = f"{outputRoot}_model{modelSerial}{outputExtension}"
+        with open(frameFilePath, mode="w") as newfile:
+            newfile.writelines(headerLines)
+            newfile.writelines(frameLines)
+            newfile.write("END\n")
+        if exportmmCIF is True:
+            exportConvertedRecordsTommCIF(
+                headerLines + frameLines + ["END\n"], frameFilePath
+            )
+        outputFilePaths.append(frameFilePath)
+    if not outputFilePaths:
+        with open(outputFilePath, mode="w") as newfile:
+            newfile.writelines(headerLines)
+        if exportmmCIF is True:
+            exportConvertedRecordsTommCIF(headerLines, outputFilePath)
+        outputFilePaths.append(outputFilePath)
+    return outputFilePaths
+
+
+def get_mmcif_output_path(convertedPDBPath):
+    return os.path.splitext(convertedPDBPath)[0] + ".mmCIF"
+
+
+def get_conversion_settings(args):
+    return {
+        "glycomicsCachePath": args.user_glycomicsCachePath,
+        "anomerBatchSize": args.user_anomerBatchSize,
+    }
 
-    if len(outputList):
-        return {"path": path, "Glycans": outputList}
+
+def apply_conversion_settings(conversionSettings):
+    # Process wide settings of a conversion run, applied in the main process and in every worker.
+    if conversionSettings is None:
+        return
+    set_anomer_correction_batch_size(conversionSettings["anomerBatchSize"])
+    # mmcif_export is only imported when -glycomics_cache was given.
+    if conversionSettings["glycomicsCachePath"] is not None:
+        try:
+            from .mmcif_export import set_glycomics_cache_path
+        except ImportError:
+            from mmcif_export import set_glycomics_cache_path
+
+        set_glycomics_cache_path(conversionSettings["glycomicsCachePath"])
+
+
+def initialize_conversion_worker(profilingSettings, conversionSettings):
+    initialize_worker_profiling(*profilingSettings)
+    apply_conversion_settings(conversionSettings)
+
+
+def exportConvertedRecordsTommCIF(convertedPDB, convertedPDBPath):
+    # gemmi and Privateer's offline database are only loaded once mmCIF output is actually requested.
+    try:
+        from .mmcif_export import convertRecordsToCIF
+    except ImportError:
+        from mmcif_export import convertRecordsToCIF
+
+    with profile_stage("mmCIF export"):
+        return convertRecordsToCIF(
+            convertedPDB, convertedPDBPath, get_mmcif_output_path(convertedPDBPath)
+        )
+
+
+def convertFile(
+    inputFilePath,
+    outputFilePath,
+    trajectoryMode=None,
+    exportmmCIF=False,
+    fixAnomers=False,
+    inputLines=None,
+):
+    if trajectoryMode == "multimodel":
+        if exportmmCIF is True:
+            raise ValueError(
+                "mmCIF output of trajectories is only supported one file per frame, use '-trajectory split'."
+            )
+        return write_multimodel_pdb(
+            outputFilePath,
+            frameConversionPipeline(inputFilePath, fixAnomers, inputLines),
+        )
+    elif trajectoryMode == "split":
+        return write_split_frames(
+            outputFilePath,
+            frameConversionPipeline(inputFilePath, fixAnomers, inputLines),
+            exportmmCIF,
+        )
+    # When profiling, the file is read, converted and written in separate steps so that each can be timed on its own.
+    if (
+        exportmmCIF is True
+        or fixAnomers is True
+        or inputLines is not None
+        or is_profiling()
+    ):
+        convertedPDB = conversionPipeline(inputFilePath, fixAnomers, inputLines)
+        with profile_stage("write"):
+            with open(outputFilePath, mode="w") as newfile:
+                newfile.writelines(convertedPDB)
+        if exportmmCIF is True:
+            exportConvertedRecordsTommCIF(convertedPDB, outputFilePath)
+        return [outputFilePath]
+    with open(outputFilePath, mode="w") as newfile:
+        newfile.writelines(streamingConversionPipeline(inputFilePath))
+    return [outputFilePath]
+
+
+def validateConvertedFile(
+    outputFilePath, validationCacheSettings=None, resultsWriter=None
+):
+    fileResults = runPrivateerValidation(outputFilePath, validationCacheSettings)
+    print_validation_outcome(outputFilePath, fileResults, resultsWriter)
+
+
+def convertAndValidateFile(conversionTask):
+    # Runs in a worker process. Everything the conversion prints is captured so that results can be reported in input order,
+    # and any exception is returned rather than raised so that one bad file does not abort the rest of the directory.
+    (
+        inputFilePath,
+        outputFilePath,
+        trajectoryMode,
+        exportmmCIF,
+        fixAnomers,
+        validate,
+        validationCacheSettings,
+        inputLines,
+        outputArchive,
+    ) = conversionTask
+    conversionLog = io.StringIO()
+    validationResults = []
+    outputFilePaths = []
+    error = None
+    try:
+        with contextlib.redirect_stdout(conversionLog):
+            outputFilePaths = convertFile(
+                inputFilePath,
+                outputFilePath,
+                trajectoryMode,
+                exportmmCIF,
+                fixAnomers,
+                inputLines,
+            )
+            if validate is True:
+                for convertedFilePath in outputFilePaths:
+                    fileResults = runPrivateerValidation(
+                        convertedFilePath, validationCacheSettings
+                    )
+                    if outputArchive is not None:
+                        convertedFilePath = get_staged_member_path(
+                            convertedFilePath, *outputArchive
+                        )
+                        fileResults = relabel_validation_results(
+                            fileResults, convertedFilePath
+                        )
+                    validationResults.append((convertedFilePath, fileResults))
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    return {
+        "input": inputFilePath,
+        "log": conversionLog.getvalue(),
+        "outputs": outputFilePaths,
+        "validation": validationResults,
+        "error": error,
+        "profile": drain_stage_events(),
+    }
+
+
+def validate_representative(validationTask):
+    # Runs in a worker process when -dedup is used, stages travel back with the result.
+    convertedFilePath, validationCacheSettings = validationTask
+    fileResults = runPrivateerValidation(convertedFilePath, validationCacheSettings)
+    return fileResults, drain_stage_events()
+
+
+def validateDeduplicatedOutputs(
+    convertedFilePaths,
+    jobs,
+    validationCacheSettings,
+    dedupTolerance,
+    resultsWriter=None,
+    outputArchive=None,
+    supervisionSettings=None,
+):
+    # Converted files are grouped once conversion has finished, only one representative per group of near-identical
+    # conformers is validated and its results are reported for every member, in conversion order.
+    with profile_stage("deduplication"):
+        groups = groupConformerFiles(convertedFilePaths, dedupTolerance)
+    print_deduplication_summary(groups, dedupTolerance)
+    validationTasks = [
+        (group["representative"], validationCacheSettings) for group in groups
+    ]
+    representativeOutcomes = {}
+    if jobs > 1 or is_supervision_requested(supervisionSettings):
+        for (representativePath, settings), outcome, failure in run_supervised_batch(
+            validate_representative,
+            validationTasks,
+            jobs,
+            supervisionSettings,
+            lambda validationTask: validationTask[0],
+            initialize_worker_profiling,
+            get_worker_profiling_settings(),
+        ):
+            if failure is None:
+                add_stage_events(outcome[1])
+                representativeOutcomes[representativePath] = (outcome[0], None)
+            else:
+                representativeOutcomes[representativePath] = (None, failure)
     else:
-        return None
+        for representativePath, settings in validationTasks:
+            fileResults, stageEvents = validate_representative(
+                (representativePath, settings)
+            )
+            add_stage_events(stageEvents)
+            representativeOutcomes[representativePath] = (fileResults, None)
+    representatives = get_representatives(groups)
+    failedPaths = []
+    for convertedFilePath in convertedFilePaths:
+        reportedPath = convertedFilePath
+        if outputArchive is not None:
+            reportedPath = get_staged_member_path(convertedFilePath, *outputArchive)
+        fileResults, failure = representativeOutcomes[
+            representatives[convertedFilePath]
+        ]
+        if failure is not None:
+            print(
+                f"Privateer failed to validate {reportedPath}: {describe_failure(failure)}"
+            )
+            failedPaths.append(reportedPath)
+            continue
+        print_validation_outcome(
+            reportedPath,
+            relabel_validation_results(fileResults, reportedPath),
+            resultsWriter,
+        )
+    return failedPaths
+
 
+def iterate_archive_conversion_tasks(
+    archivePath,
+    outputpath,
+    trajectoryMode,
+    exportmmCIF,
+    fixAnomers,
+    validate,
+    validationCacheSettings,
+    outputArchive,
+):
+    # Archive members are read one at a time as the tasks are consumed and reported as <archive>/<member path>.
+    for relativePath, Lines in iterate_archive_members(archivePath):
+        outputFilePath = get_safe_output_path(outputpath, relativePath)
+        os.makedirs(os.path.dirname(outputFilePath), exist_ok=True)
+        yield (
+            os.path.join(archivePath, relativePath),
+            outputFilePath,
+            trajectoryMode,
+            exportmmCIF,
+            fixAnomers,
+            validate,
+            validationCacheSettings,
+            Lines,
+            outputArchive,
+        )
 
-def print_privateer_validation_results(fileResults):
-    totalSugars = 0
-    totalProblematicSugars = 0
-    table = PrettyTable()
-    table.field_names = [
-        "Sugar",
-        "Q",
-        "Phi",
-        "Theta",
-        "Detected type",
-        "Cnf",
-        "<Bfac>",
-        "Ctx",
-        "Ok?",
+
+def report_failed_conversions(conversionResults):
+    failedInputs = [
+        conversionResult
+        for conversionResult in conversionResults
+        if conversionResult["error"] is not None
     ]
-    path = fileResults["path"]
-    glycans = fileResults["Glycans"]
-    print(f"File path: {path}")
-    for idx, glycan in enumerate(glycans):
-        print(f'Glycans - {idx+1}/{len(glycans)}: Conversion WURCS: {glycan["WURCS"]}')
-        problematicSugars = glycan["problematicSugars"]
-        totalSugars += glycan["totalSugars"]
-        totalProblematicSugars += len(problematicSugars)
-        for sugar in problematicSugars:
-            sugarString = f'{sugar["Code"]}-{sugar["Chain"]}-{sugar["ID"]}'
-            table.add_row(
-                [
-                    sugarString,
-                    sugar["Q"],
-                    sugar["Phi"],
-                    sugar["Theta"],
-                    sugar["detectedType"],
-                    sugar["cnf"],
-                    sugar["bfac"],
-                    sugar["ctx"],
-                    sugar["diagnostic"],
-                ]
+    if len(failedInputs):
+        print(f"{len(failedInputs)}/{len(conversionResults)} files failed to convert:")
+        for conversionResult in failedInputs:
+            print(f'\t{conversionResult["input"]}: {conversionResult["error"]}')
+    return failedInputs
+
+
+def print_conversion_result(conversionResult, resultsWriter=None):
+    add_stage_events(conversionResult["profile"])
+    print(conversionResult["log"], end="")
+    for convertedFilePath, fileResults in conversionResult["validation"]:
+        print_validation_outcome(convertedFilePath, fileResults, resultsWriter)
+    if conversionResult["error"] is not None:
+        print(
+            f'Failed to convert {conversionResult["input"]}: {conversionResult["error"]}'
+        )
+
+
+def get_failed_conversion_result(conversionTask, failure):
+    # Stands in for the result of a task whose worker crashed, timed out or ran out of memory, or that was quarantined.
+    return {
+        "input": conversionTask[0],
+        "log": "",
+        "outputs": [],
+        "validation": [],
+        "error": describe_failure(failure),
+        "profile": [],
+    }
+
+
+def convertFilesInParallel(
+    conversionTasks,
+    jobs,
+    resultsWriter=None,
+    supervisionSettings=None,
+    conversionSettings=None,
+):
+    # Workers are supervised(see batch_runner.py), so a file that makes Privateer abort only fails itself.
+    conversionResults = []
+    if jobs > 1 or is_supervision_requested(supervisionSettings):
+        for conversionTask, conversionResult, failure in run_supervised_batch(
+            convertAndValidateFile,
+            conversionTasks,
+            jobs,
+            supervisionSettings,
+            lambda conversionTask: conversionTask[0],
+            initialize_conversion_worker,
+            (get_worker_profiling_settings(), conversionSettings),
+        ):
+            if failure is not None:
+                conversionResult = get_failed_conversion_result(conversionTask, failure)
+            print_conversion_result(conversionResult, resultsWriter)
+            conversionResults.append(conversionResult)
+    else:
+        apply_conversion_settings(conversionSettings)
+        for conversionTask in conversionTasks:
+            conversionResult = convertAndValidateFile(conversionTask)
+            print_conversion_result(conversionResult, resultsWriter)
+            conversionResults.append(conversionResult)
+    return conversionResults
+
+
+def conversion_tables_version(trajectoryMode, exportmmCIF, fixAnomers=False):
+    # Any change to the conversion tables or to the way frames are written invalidates every output in the manifest.
+    tables = json.dumps(
+        {
+            "residues": glycamOneLetterToPDBThreeLetterCodeConversion,
+            "atoms": atom_replacements,
+            "trajectory": trajectoryMode,
+            "mmCIF": exportmmCIF,
+            "anomers": fixAnomers,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(tables.encode("utf-8")).hexdigest()
+
+
+def get_manifest_path(outputpath):
+    return os.path.normpath(outputpath) + ".manifest.json"
+
+
+def load_conversion_manifest(manifestPath, tablesVersion):
+    # Returns None when there is no usable manifest, which means the output directory has to be rebuilt from scratch.
+    if not os.path.exists(manifestPath):
+        return None
+    try:
+        with open(manifestPath) as manifestFile:
+            manifest = json.load(manifestFile)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("tables_version") != tablesVersion:
+        return None
+    return manifest
+
+
+def save_conversion_manifest(manifestPath, manifest):
+    temporaryManifestPath = manifestPath + ".tmp"
+    with open(temporaryManifestPath, "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(temporaryManifestPath, manifestPath)
+
+
+def prune_stale_outputs(manifest, outputpath, currentInputs):
+    for relativeInputPath in sorted(set(manifest["files"]) - currentInputs):
+        for relativeOutputPath in manifest["files"][relativeInputPath]["outputs"]:
+            staleOutputPath = os.path.join(outputpath, relativeOutputPath)
+            if os.path.exists(staleOutputPath):
+                os.remove(staleOutputPath)
+            print(
+                f"Removed output of deleted input {relativeInputPath}: {staleOutputPath}"
             )
-    print(table)
-    print(
-        f"{totalProblematicSugars}/{totalSugars} sugars in the input file have been detected as having problems.\n\n"
+        del manifest["files"][relativeInputPath]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="glycam2pdb.py",
+        usage="%(prog)s [options] PATH.",
+        description=f"Convert Glycam notation PDBs to standard PDB files.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Input path either directly to a single file, a root directory that contains multiple PDB files(no trailing slash should be left) or a .zip/.tar(.gz/.bz2/.xz) archive, whose PDB members are converted without extracting it",
+        required=True,
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help="Output converted file to a specific path or if directory is converted - to a specific directory. A .zip/.tar(.gz/.bz2/.xz) path packs all converted files into that archive instead.",
+    )
+    parser.add_argument(
+        "-validate",
+        action="store_true",
+        default=False,
+        dest="user_validate",
+        help="Validate converted file with Privateer and output summary results at the end of the script",
+    )
+    parser.add_argument(
+        "-trajectory",
+        action="store",
+        default=None,
+        choices=["multimodel", "split"],
+        dest="user_trajectoryMode",
+        help="Convert every MODEL/ENDMDL block of the input as an independent frame. 'multimodel' writes all converted frames into a single multi-model PDB, 'split' writes every frame into its own <name>_model<serial>.pdb file.",
+    )
+    parser.add_argument(
+        "-mmcif",
+        action="store_true",
+        default=False,
+        dest="user_mmcif",
+        help="Also write every converted structure as an mmCIF file(<name>.mmCIF next to the PDB) with sugar-sugar covalent connections, _WURCS and _GlyTouCan annotations, built directly from the converted records. Requires gemmi.",
+    )
+    parser.add_argument(
+        "-glycomics_cache",
+        action="store",
+        nargs="?",
+        default=None,
+        const=defaultGlycomicsCachePath,
+        dest="user_glycomicsCachePath",
+        help=f"Used with -mmcif. Keep the WURCS and GlyTouCan IDs looked up in the offline glycomics database in an on-disk cache, '{defaultGlycomicsCachePath}' unless another path is given, so every glycan is looked up once across runs and worker processes instead of once per conformer.",
+    )
+    parser.add_argument(
+        "-fix_anomers",
+        action="store_true",
+        default=False,
+        dest="user_fixAnomers",
+        help="Before conversion, flip alpha reducing end sugars attached to an ROH aglycone to beta(e.g. 4YA -> 4YB), moving O1 and H1 to ideal bond lengths and dropping HO1. Trajectory frames are corrected in vectorized batches of -anomer_batch_size frames. Requires numpy.",
+    )
+    parser.add_argument(
+        "-anomer_batch_size",
+        action="store",
+        type=positive_int,
+        default=ANOMER_CORRECTION_FRAME_BATCH_SIZE,
+        dest="user_anomerBatchSize",
+        help=f"Number of trajectory frames -fix_anomers holds in memory and corrects in one vectorized step. Peak memory grows with it rather than with a single frame, larger batches trade memory for speed. Defaults to {ANOMER_CORRECTION_FRAME_BATCH_SIZE}.",
+    )
+    parser.add_argument(
+        "-jobs",
+        action="store",
+        type=positive_int,
+        default=1,
+        dest="user_jobs",
+        help="Number of worker processes used to convert(and validate) files when a directory is provided as input. Results are still reported in the order the files are found.",
+    )
+    parser.add_argument(
+        "-incremental",
+        action="store_true",
+        default=False,
+        dest="user_incremental",
+        help="Keep the output directory and only reconvert(and revalidate) input files whose contents changed since the last run. Content hashes are stored in <output directory>.manifest.json, outputs of deleted inputs are removed.",
+    )
+    parser.add_argument(
+        "-library",
+        action="store",
+        default=None,
+        dest="user_libraryPath",
+        help="Also pack every converted structure of a folder or archive input into a single conformer library file at this path, see conformer_library.py. WURCS and GlyTouCan IDs are included when used with -mmcif, the representative of every group of near-identical conformers when used with -dedup.",
     )
 
+    parser.add_argument(
+        "-validation_cache",
+        action="store",
+        nargs="?",
+        default=None,
+        const=defaultValidationCachePath,
+        dest="user_validationCachePath",
+        help=f"Reuse Privateer validation results of files whose contents and Privateer version have not changed. Results are stored in an on-disk cache, '{defaultValidationCachePath}' unless another path is given.",
+    )
+    parser.add_argument(
+        "-validation_cache_size",
+        action="store",
+        type=int,
+        default=defaultValidationCacheMaxMegabytes,
+        dest="user_validationCacheSize",
+        help=f"Maximum size of the validation cache in megabytes, least recently used results are evicted first. Defaults to {defaultValidationCacheMaxMegabytes}.",
+    )
 
-parser = argparse.ArgumentParser(
-    prog="glycam2pdb.py",
-    usage="%(prog)s [options] PATH.",
-    description=f"Convert Glycam notation PDBs to standard PDB files.",
-)
-required = parser.add_argument_group("required arguments")
-required.add_argument(
-    "-input",
-    action="store",
-    dest="user_inputPath",
-    help="Input path either directly to a single file or a root directory that contains multiple PDB files(no trailing slash should be left)",
-    required=True,
-)
-parser.add_argument(
-    "-output",
-    action="store",
-    default=None,
-    dest="user_outputPath",
-    help="Output converted file to a specific path or if directory is converted - to a specific directory.",
-)
-parser.add_argument(
-    "-validate",
-    action="store_true",
-    default=False,
-    dest="user_validate",
-    help="Validate converted file with Privateer and output summary results at the end of the script",
-)
+    add_validation_output_arguments(parser)
+    add_deduplication_arguments(parser)
+    add_supervision_arguments(parser)
+    add_profiling_arguments(parser)
 
-args = parser.parse_args()
-inputpath = args.user_inputPath
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+    inputpath = args.user_inputPath
+    resultsWriter = make_validation_results_writer(args)
 
-currentDirectory = os.getcwd()
-completeInputPath = os.path.join(currentDirectory, inputpath)
+    validationCacheSettings = None
+    if args.user_validationCachePath is not None:
+        validationCacheSettings = {
+            "path": args.user_validationCachePath,
+            "maxMegabytes": args.user_validationCacheSize,
+        }
+    supervisionSettings = get_supervision_settings(args)
+    conversionSettings = get_conversion_settings(args)
+    apply_conversion_settings(conversionSettings)
+    # With -dedup, converted files are validated together once everything is converted rather than one by one in the workers.
+    validateInWorkers = args.user_validate is True and args.user_dedupTolerance is None
 
-if completeInputPath[-1] == "/":
-    basePath = os.path.dirname(os.path.dirname(completeInputPath))
-else:
-    basePath = os.path.dirname(completeInputPath)
+    currentDirectory = os.getcwd()
+    completeInputPath = os.path.join(currentDirectory, inputpath)
 
-if os.path.isdir(completeInputPath):
-    inputDirectory = os.path.basename(os.path.normpath(completeInputPath))
-    if args.user_outputPath is None:
-        outputDirectory = inputDirectory + "ConvertedPDB"
-        outputpath = os.path.join(basePath, outputDirectory)
-    else:
-        outputpath = os.path.join(currentDirectory, args.user_outputPath)
-    CreateFolder(outputpath)
-    for root, dirs, files in os.walk(completeInputPath, topdown=False):
-        for name in files:
-            head, tail = os.path.split(root)
-            difference = os.path.relpath(head, outputpath)
-            if len(difference) > 2:
-                outputroot = os.path.join(outputpath, tail)
-                if not os.path.exists(outputroot):
-                    os.makedirs(outputroot)
-                outputFilePath = os.path.join(outputroot, name)
-                with open(outputFilePath, mode="w") as newfile:
-                    newfile.writelines(conversionPipeline(os.path.join(root, name)))
-                if args.user_validate is True:
-                    fileResults = privateerValidation(outputFilePath)
-                    if fileResults is not None:
-                        print_privateer_validation_results(fileResults)
-                    else:
-                        print(f"Privateer detected no issues in: {outputFilePath}")
-            else:
-                outputroot = os.path.join(head, outputDirectory)
-                outputFilePath = os.path.join(outputroot, name)
-                with open(outputFilePath, mode="w") as newfile:
-                    newfile.writelines(conversionPipeline(os.path.join(root, name)))
-                if args.user_validate is True:
-                    fileResults = privateerValidation(outputFilePath)
-                    if fileResults is not None:
-                        print_privateer_validation_results(fileResults)
-                    else:
-                        print(f"Privateer detected no issues in: {outputFilePath}")
-elif os.path.isdir(completeInputPath) is False:
-    inputFileName = os.path.basename(os.path.normpath(completeInputPath))
-    if args.user_outputPath is None:
-        outputFileName = "CONVERTED_" + inputFileName
-        outputFilePath = os.path.join(basePath, outputFileName)
+    if completeInputPath[-1] == "/":
+        basePath = os.path.dirname(os.path.dirname(completeInputPath))
     else:
-        outputFilePath = os.path.join(currentDirectory, args.user_outputPath)
-    with open(os.path.join(outputFilePath), mode="w") as newfile:
-        newfile.writelines(conversionPipeline(os.path.join(completeInputPath)))
-    if args.user_validate is True:
-        fileResults = privateerValidation(outputFilePath)
-        if fileResults is not None:
-            print_privateer_validation_results(fileResults)
+        basePath = os.path.dirname(completeInputPath)
+
+    outputArchive = None
+    if args.user_outputPath is not None and is_archive_path(args.user_outputPath):
+        # Converted files are staged in a local temporary folder and packed into the archive once everything is converted.
+        if args.user_incremental is True:
+            raise ValueError(
+                "-incremental needs the converted files to stay in an output folder, it cannot write into an archive."
+            )
+        outputArchive = (
+            tempfile.mkdtemp(prefix="glycam2pdb_"),
+            os.path.join(currentDirectory, args.user_outputPath),
+        )
+
+    failedInputs = []
+    failedValidations = []
+    if os.path.isfile(completeInputPath) and is_archive_path(completeInputPath):
+        if args.user_incremental is True:
+            raise ValueError("-incremental is only supported for folder inputs.")
+        if outputArchive is not None:
+            outputpath = outputArchive[0]
+        elif args.user_outputPath is None:
+            outputpath = os.path.join(
+                basePath, get_archive_stem(completeInputPath) + "ConvertedPDB"
+            )
         else:
-            print(f"Privateer detected no issues in: {outputFilePath}")
-else:
-    raise ValueError(
-        f"Unable to determine whether {completeInputPath} is a file or a directory!"
-    )
+            outputpath = os.path.join(currentDirectory, args.user_outputPath)
+        CreateFolder(outputpath)
+        conversionResults = convertFilesInParallel(
+            iterate_archive_conversion_tasks(
+                completeInputPath,
+                outputpath,
+                args.user_trajectoryMode,
+                args.user_mmcif,
+                args.user_fixAnomers,
+                validateInWorkers,
+                validationCacheSettings,
+                outputArchive,
+            ),
+            args.user_jobs,
+            resultsWriter,
+            supervisionSettings,
+            conversionSettings,
+        )
+        failedInputs = report_failed_conversions(conversionResults)
+        convertedFilePaths = [
+            convertedFilePath
+            for conversionResult in conversionResults
+            for convertedFilePath in conversionResult["outputs"]
+        ]
+    elif os.path.isdir(completeInputPath):
+        inputDirectory = os.path.basename(os.path.normpath(completeInputPath))
+        if outputArchive is not None:
+            outputpath = outputArchive[0]
+        elif args.user_outputPath is None:
+            outputDirectory = inputDirectory + "ConvertedPDB"
+            outputpath = os.path.join(basePath, outputDirectory)
+        else:
+            outputpath = os.path.join(currentDirectory, args.user_outputPath)
+        manifest = None
+        if args.user_incremental is True:
+            tablesVersion = conversion_tables_version(
+                args.user_trajectoryMode, args.user_mmcif, args.user_fixAnomers
+            )
+            manifestPath = get_manifest_path(outputpath)
+            manifest = load_conversion_manifest(manifestPath, tablesVersion)
+        if manifest is None:
+            CreateFolder(outputpath)
+        conversionTasks = []
+        inputHashes = {}
+        skippedInputs = 0
+        for root, dirs, files in os.walk(completeInputPath, topdown=False):
+            for name in files:
+                head, tail = os.path.split(root)
+                difference = os.path.relpath(head, outputpath)
+                if len(difference) > 2:
+                    outputroot = os.path.join(outputpath, tail)
+                    if not os.path.exists(outputroot):
+                        os.makedirs(outputroot)
+                    outputFilePath = os.path.join(outputroot, name)
+                else:
+                    outputroot = os.path.join(head, outputDirectory)
+                    outputFilePath = os.path.join(outputroot, name)
+                inputFilePath = os.path.join(root, name)
+                if args.user_incremental is True:
+                    relativeInputPath = os.path.relpath(
+                        inputFilePath, completeInputPath
+                    )
+                    inputHashes[relativeInputPath] = hash_file_contents(inputFilePath)
+                    manifestEntry = (
+                        manifest["files"].get(relativeInputPath)
+                        if manifest is not None
+                        else None
+                    )
+                    if (
+                        manifestEntry is not None
+                        and manifestEntry["hash"] == inputHashes[relativeInputPath]
+                        and all(
+                            os.path.exists(os.path.join(outputpath, relativeOutputPath))
+                            for relativeOutputPath in manifestEntry["outputs"]
+                        )
+                    ):
+                        skippedInputs += 1
+                        continue
+                conversionTasks.append(
+                    (
+                        inputFilePath,
+                        outputFilePath,
+                        args.user_trajectoryMode,
+                        args.user_mmcif,
+                        args.user_fixAnomers,
+                        validateInWorkers,
+                        validationCacheSettings,
+                        None,
+                        outputArchive,
+                    )
+                )
+        conversionResults = convertFilesInParallel(
+            conversionTasks,
+            args.user_jobs,
+            resultsWriter,
+            supervisionSettings,
+            conversionSettings,
+        )
+        if args.user_incremental is True:
+            if manifest is None:
+                manifest = {"tables_version": tablesVersion, "files": {}}
+            prune_stale_outputs(manifest, outputpath, set(inputHashes))
+            for conversionResult in conversionResults:
+                relativeInputPath = os.path.relpath(
+                    conversionResult["input"], completeInputPath
+                )
+                if conversionResult["error"] is not None:
+                    manifest["files"].pop(relativeInputPath, None)
+                    continue
+                relativeOutputPaths = [
+                    os.path.relpath(convertedFilePath, outputpath)
+                    for convertedFilePath in conversionResult["outputs"]
+                ]
+                if args.user_mmcif is True:
+                    relativeOutputPaths += [
+                        os.path.relpath(
+                            get_mmcif_output_path(convertedFilePath), outputpath
+                        )
+                        for convertedFilePath in conversionResult["outputs"]
+                    ]
+                previousEntry = manifest["files"].get(relativeInputPath)
+                if previousEntry is not None:
+                    for relativeOutputPath in previousEntry["outputs"]:
+                        staleOutputPath = os.path.join(outputpath, relativeOutputPath)
+                        if relativeOutputPath not in relativeOutputPaths and (
+                            os.path.exists(staleOutputPath)
+                        ):
+                            os.remove(staleOutputPath)
+                manifest["files"][relativeInputPath] = {
+                    "hash": inputHashes[relativeInputPath],
+                    "outputs": relativeOutputPaths,
+                }
+            save_conversion_manifest(manifestPath, manifest)
+            print(
+                f"Converted {len(conversionTasks)} changed files, skipped {skippedInputs} unchanged files."
+            )
+        failedInputs = report_failed_conversions(conversionResults)
+        convertedFilePaths = [
+            convertedFilePath
+            for conversionResult in conversionResults
+            for convertedFilePath in conversionResult["outputs"]
+        ]
+    elif os.path.isdir(completeInputPath) is False:
+        if outputArchive is not None:
+            raise ValueError(
+                "Archive output is only supported for folder or archive inputs."
+            )
+        if args.user_libraryPath is not None:
+            raise ValueError(
+                "Conformer libraries are only built from folder or archive inputs."
+            )
+        inputFileName = os.path.basename(os.path.normpath(completeInputPath))
+        if args.user_outputPath is None:
+            outputFileName = "CONVERTED_" + inputFileName
+            outputFilePath = os.path.join(basePath, outputFileName)
+        else:
+            outputFilePath = os.path.join(currentDirectory, args.user_outputPath)
+        outputFilePaths = convertFile(
+            completeInputPath,
+            outputFilePath,
+            args.user_trajectoryMode,
+            args.user_mmcif,
+            args.user_fixAnomers,
+        )
+        convertedFilePaths = outputFilePaths
+        if validateInWorkers is True:
+            for convertedFilePath in outputFilePaths:
+                validateConvertedFile(
+                    convertedFilePath, validationCacheSettings, resultsWriter
+                )
+    else:
+        raise ValueError(
+            f"Unable to determine whether {completeInputPath} is a file or a directory!"
+        )
+
+    if args.user_validate is True and args.user_dedupTolerance is not None:
+        failedValidations = validateDeduplicatedOutputs(
+            convertedFilePaths,
+            args.user_jobs,
+            validationCacheSettings,
+            args.user_dedupTolerance,
+            resultsWriter,
+            outputArchive,
+            supervisionSettings,
+        )
+
+    if args.user_libraryPath is not None:
+        libraryPath = os.path.join(currentDirectory, args.user_libraryPath)
+        with profile_stage("conformer library"):
+            numberOfConformers = buildConformerLibrary(
+                outputpath, libraryPath, dedupTolerance=args.user_dedupTolerance
+            )
+        print(f"Packed {numberOfConformers} conformers into {libraryPath}")
+
+    if outputArchive is not None:
+        numberOfFiles = write_output_archive(*outputArchive)
+        shutil.rmtree(outputArchive[0])
+        print(f"Wrote {numberOfFiles} converted files into {outputArchive[1]}")
+
+    if resultsWriter is not None:
+        resultsWriter.close()
+    stop_profiling_session(profilingSession)
+    if len(failedInputs) or len(failedValidations):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
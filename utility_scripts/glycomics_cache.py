@@ -0,0 +1,99 @@
+import os
+import json
+import sqlite3
+
+try:
+    from .validation_cache import get_privateer_version
+except ImportError:
+    from validation_cache import get_privateer_version
+
+# Memoized offline glycomics database lookups(WURCS and GlyTouCan ID) for mmcif_export.getMetadataFromPrivateer.
+# A lookup only depends on the topology of the glycan, which every conformer of a glycan shares, so results are keyed by
+# the WURCS Privateer derives from the structure and the database is queried once per distinct glycan: in memory for the
+# lifetime of the process and, when a cache path is given, in an SQLite file shared by runs and worker processes.
+# The database ships with Privateer, entries are only reused while the installed Privateer version stays the same.
+
+defaultGlycomicsCachePath = os.path.join(
+    os.path.expanduser("~"), ".cache", "project_alliance", "glycomics_lookup.sqlite"
+)
+
+# Bump whenever the stored lookup results change shape.
+GLYCOMICS_RECORD_VERSION = "1"
+
+memoizedLookups = {}
+
+
+def get_database_version():
+    # None when the installed Privateer cannot be identified, lookups are then only memoized in memory.
+    if get_privateer_version() is None:
+        return None
+    return GLYCOMICS_RECORD_VERSION + ":" + get_privateer_version()
+
+
+def open_glycomics_cache(cachePath):
+    cacheDirectory = os.path.dirname(cachePath)
+    if cacheDirectory and not os.path.exists(cacheDirectory):
+        os.makedirs(cacheDirectory, exist_ok=True)
+    connection = sqlite3.connect(cachePath, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS glycomics_lookups ("
+        "topology TEXT NOT NULL, "
+        "database_version TEXT NOT NULL, "
+        "result TEXT NOT NULL, "
+        "PRIMARY KEY (topology, database_version))"
+    )
+    return connection
+
+
+def lookup_glycomics_result(connection, topologyKey, databaseVersion):
+    row = connection.execute(
+        "SELECT result FROM glycomics_lookups WHERE topology = ? AND database_version = ?",
+        (topologyKey, databaseVersion),
+    ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0])
+
+
+def store_glycomics_result(connection, topologyKey, databaseVersion, glycomics):
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO glycomics_lookups VALUES (?, ?, ?)",
+            (topologyKey, databaseVersion, json.dumps(glycomics)),
+        )
+
+
+def cachedOfflineDatabaseQuery(topologyKey, queryOfflineDatabase, cachePath=None):
+    # Stands in for inputGlycan.query_offline_database(...), which queryOfflineDatabase() runs on a miss. Only the
+    # "wurcs" and "glytoucan_id" of the result are kept. Glycans Privateer cannot write a WURCS for are never cached.
+    if not topologyKey:
+        return queryOfflineDatabase()
+    glycomics = memoizedLookups.get(topologyKey)
+    if glycomics is not None:
+        return glycomics
+
+    databaseVersion = get_database_version()
+    connection = None
+    if cachePath is not None and databaseVersion is not None:
+        connection = open_glycomics_cache(cachePath)
+    try:
+        if connection is not None:
+            glycomics = lookup_glycomics_result(
+                connection, topologyKey, databaseVersion
+            )
+        if glycomics is None:
+            queryResult = queryOfflineDatabase()
+            glycomics = {
+                "wurcs": queryResult["wurcs"],
+                "glytoucan_id": queryResult["glytoucan_id"],
+            }
+            if connection is not None:
+                store_glycomics_result(
+                    connection, topologyKey, databaseVersion, glycomics
+                )
+    finally:
+        if connection is not None:
+            connection.close()
+    memoizedLookups[topologyKey] = glycomics
+    return glycomics
@@ -0,0 +1,349 @@
+import os
+import json
+import mmap
+import argparse
+
+# compilation.mmCIF layout shared by pdb2mmcif.py(writer) and CompilationReader(reader). The file is an ordinary multi-block
+# mmCIF document, the blocks of the annotated structures preceded by an index block:
+#   data_index
+#   loop_
+#   _index.id _index.block_name _index.WURCS _index.GlyTouCan _index.offset _index.length
+# offset and length are the position of every block in the file in bytes, so a single block can be sliced out and parsed
+# without reading the rest of the document. Compilations written before the offsets were added only have id and
+# block_name, CompilationReader finds their blocks by scanning the file for data_ lines instead.
+# Block names have to be unique within a document, repeated names get a #2, #3, ... suffix(see get_unique_block_names).
+# gemmi is only imported to write or parse the index and to parse the blocks that are read.
+
+indexColumns = ["id", "block_name", "WURCS", "GlyTouCan", "offset", "length"]
+blockSeparator = b"\n"
+
+
+def get_block_identifiers(gemmiBlock):
+    # _WURCS and _GlyTouCan pairs written by mmcif_export.make_annotated_mmcif_document.
+    import gemmi
+
+    identifiers = []
+    for tag in ("_WURCS", "_GlyTouCan"):
+        value = gemmiBlock.find_value(tag)
+        identifiers.append(
+            None
+            if value is None or gemmi.cif.is_null(value)
+            else gemmi.cif.as_string(value)
+        )
+    return tuple(identifiers)
+
+
+def get_unique_block_names(blockNames):
+    # Conformers whose files share a folder name and a file name(or torsion name) get the same block name. gemmi refuses
+    # to read a document that repeats one, so every repeat is renamed to <name>#2, <name>#3, ... in order of appearance.
+    takenNames = set(blockNames)
+    usedNames = set()
+    uniqueNames = []
+    for name in blockNames:
+        uniqueName = name
+        count = 1
+        while uniqueName in usedNames or (
+            uniqueName != name and uniqueName in takenNames
+        ):
+            count += 1
+            uniqueName = f"{name}#{count}"
+        usedNames.add(uniqueName)
+        uniqueNames.append(uniqueName)
+    return uniqueNames
+
+
+def rename_block(blockText, name):
+    # blockText starts with its data_ line.
+    return f"data_{name}" + blockText[blockText.index("\n") :]
+
+
+def make_block_names_unique(compilationBlocks):
+    uniqueNames = get_unique_block_names(
+        [compilationBlock["name"] for compilationBlock in compilationBlocks]
+    )
+    return [
+        (
+            compilationBlock
+            if compilationBlock["name"] == uniqueName
+            else {
+                **compilationBlock,
+                "name": uniqueName,
+                "block": rename_block(compilationBlock["block"], uniqueName),
+            }
+        )
+        for compilationBlock, uniqueName in zip(compilationBlocks, uniqueNames)
+    ]
+
+
+def quote_identifier(value):
+    import gemmi
+
+    return "?" if value is None else gemmi.cif.quote(value)
+
+
+def make_index_text(compilationBlocks):
+    # Block offsets depend on the length of the index block, which depends on the number of digits of the offsets.
+    # Lengths only grow with the offsets, so recomputing until the index length stops changing takes a couple of rounds.
+    import gemmi
+
+    blockLengths = [
+        len(compilationBlock["block"].encode("utf-8"))
+        for compilationBlock in compilationBlocks
+    ]
+    indexLength = 0
+    while True:
+        indexDocument = gemmi.cif.Document()
+        indexLoop = indexDocument.add_new_block(name="index").init_loop(
+            "_index.", indexColumns
+        )
+        offset = indexLength + len(blockSeparator)
+        for count, (compilationBlock, blockLength) in enumerate(
+            zip(compilationBlocks, blockLengths)
+        ):
+            indexLoop.add_row(
+                [
+                    str(count),
+                    compilationBlock["name"],
+                    quote_identifier(compilationBlock["WURCS"]),
+                    quote_identifier(compilationBlock["GlyTouCan"]),
+                    str(offset),
+                    str(blockLength),
+                ]
+            )
+            offset += blockLength + len(blockSeparator)
+        indexText = indexDocument.as_string()
+        if len(indexText.encode("utf-8")) == indexLength:
+            return indexText
+        indexLength = len(indexText.encode("utf-8"))
+
+
+def write_compilation(compilationPath, compilationBlocks):
+    # compilationBlocks are {"name", "block", "WURCS", "GlyTouCan"} dicts in compilation order, "block" being the text of a
+    # single mmCIF block(gemmi.cif.Block.as_string()). gemmi separates the blocks of a document with an empty line, so the
+    # file is the same as a gemmi.cif.Document holding all of them would write, plus the offsets in the index.
+    # Written in binary so that offsets are not shifted by newline translation.
+    blockNames = [compilationBlock["name"] for compilationBlock in compilationBlocks]
+    if len(set(blockNames)) != len(blockNames):
+        raise ValueError(
+            "Block names of a compilation have to be unique, see make_block_names_unique"
+        )
+    with open(compilationPath, "wb") as compilationFile:
+        compilationFile.write(
+            blockSeparator.join(
+                [make_index_text(compilationBlocks).encode("utf-8")]
+                + [
+                    compilationBlock["block"].encode("utf-8")
+                    for compilationBlock in compilationBlocks
+                ]
+            )
+        )
+
+
+class CompilationReader:
+    def __init__(self, compilationPath):
+        self.compilationPath = compilationPath
+        with open(compilationPath, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self.mapping[:11] == b"data_index\n":
+            self.close()
+            raise ValueError(f"{compilationPath} does not start with an index block")
+        firstBlockOffset = self.find_next_block(0)
+        self.entries = self.read_index(
+            self.mapping[:firstBlockOffset].decode("utf-8"), firstBlockOffset
+        )
+        # Blocks are looked up by their unique name, which only differs from block_name in compilations written before
+        # repeated names were renamed.
+        self.index = {entry["name"]: entry for entry in self.entries}
+        self.namesByWURCS = {}
+        for entry in self.entries:
+            if entry["WURCS"] is not None:
+                self.namesByWURCS.setdefault(entry["WURCS"], []).append(entry["name"])
+
+    def find_next_block(self, offset):
+        nextBlockOffset = self.mapping.find(b"\ndata_", offset)
+        return len(self.mapping) if nextBlockOffset == -1 else nextBlockOffset + 1
+
+    def read_index(self, indexText, firstBlockOffset):
+        import gemmi
+
+        indexBlock = gemmi.cif.read_string(indexText).sole_block()
+        columns = {
+            column: [
+                None if gemmi.cif.is_null(value) else gemmi.cif.as_string(value)
+                for value in indexBlock.find_loop("_index." + column)
+            ]
+            for column in indexColumns
+        }
+        numberOfBlocks = len(columns["block_name"])
+        for column in indexColumns:
+            if len(columns[column]) != numberOfBlocks:
+                columns[column] = [None] * numberOfBlocks
+        if numberOfBlocks and columns["offset"][0] is None:
+            # Compilation without offsets, every block runs up to the next data_ line. Its index has no WURCS or GlyTouCan
+            # ID either, those are read from the blocks themselves.
+            columns["offset"] = []
+            columns["length"] = []
+            columns["WURCS"] = []
+            columns["GlyTouCan"] = []
+            offset = firstBlockOffset
+            for name in columns["block_name"]:
+                nextBlockOffset = self.find_next_block(offset)
+                WURCS, glytoucanID = get_block_identifiers(
+                    gemmi.cif.read_string(
+                        self.mapping[offset:nextBlockOffset].decode("utf-8")
+                    ).sole_block()
+                )
+                columns["offset"].append(offset)
+                columns["length"].append(nextBlockOffset - offset)
+                columns["WURCS"].append(WURCS)
+                columns["GlyTouCan"].append(glytoucanID)
+                offset = nextBlockOffset
+        uniqueNames = get_unique_block_names(columns["block_name"])
+        return [
+            {
+                "name": uniqueNames[count],
+                "block_name": columns["block_name"][count],
+                "WURCS": columns["WURCS"][count],
+                "GlyTouCan": columns["GlyTouCan"][count],
+                "offset": int(columns["offset"][count]),
+                "length": int(columns["length"][count]),
+            }
+            for count in range(numberOfBlocks)
+        ]
+
+    def names(self):
+        return [entry["name"] for entry in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def get_entry(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError(f"No block named {name} in {self.compilationPath}")
+
+    def get_names_by_WURCS(self, WURCS):
+        # Every conformer of a glycan has the same WURCS, so this is usually several blocks.
+        return list(self.namesByWURCS.get(WURCS, []))
+
+    def get_block_text(self, name):
+        entry = self.get_entry(name)
+        blockText = self.mapping[
+            entry["offset"] : entry["offset"] + entry["length"]
+        ].decode("utf-8")
+        if not blockText.startswith(f"data_{entry['block_name']}\n"):
+            raise ValueError(
+                f"Index of {self.compilationPath} does not match its blocks, the file was edited after it was compiled"
+            )
+        return blockText
+
+    def get_block(self, name):
+        import gemmi
+
+        return gemmi.cif.read_string(self.get_block_text(name)).sole_block()
+
+    def get_blocks_by_WURCS(self, WURCS):
+        return [self.get_block(name) for name in self.get_names_by_WURCS(WURCS)]
+
+    def get_structure(self, name):
+        import gemmi
+
+        return gemmi.make_structure_from_block(self.get_block(name))
+
+    def write_block(self, name, outputFilePath):
+        with open(outputFilePath, mode="w") as newfile:
+            newfile.write(self.get_block_text(name))
+        return outputFilePath
+
+    def close(self):
+        if self.mapping is None:
+            return
+        self.mapping.close()
+        self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mmcif_compilation.py",
+        usage="%(prog)s [options] PATH.",
+        description="List or extract blocks of a compilation.mmCIF written by pdb2mmcif.py without parsing the whole file.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Path to compilation.mmCIF.",
+        required=True,
+    )
+    parser.add_argument(
+        "-list",
+        action="store_true",
+        default=False,
+        dest="user_list",
+        help="Print the name, WURCS, GlyTouCan ID, offset and length of every block.",
+    )
+    parser.add_argument(
+        "-extract",
+        action="store",
+        default=None,
+        dest="user_extractName",
+        help="Write the block with this name(e.g. man9/Phi=66_Psi=-179_Omega=-177) out as a single mmCIF file.",
+    )
+    parser.add_argument(
+        "-wurcs",
+        action="store",
+        default=None,
+        dest="user_WURCS",
+        help="Write every block with this WURCS out as a single mmCIF file, into the -output folder.",
+    )
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help="With -extract, the mmCIF file the block is written to. With -wurcs, the folder the blocks are written to. Defaults to the current directory.",
+    )
+    args = parser.parse_args(argv)
+
+    with CompilationReader(args.user_inputPath) as compilation:
+        if args.user_list is True:
+            for name in compilation:
+                print(json.dumps(compilation.get_entry(name)))
+        if args.user_extractName is not None:
+            outputFilePath = args.user_outputPath
+            if outputFilePath is None:
+                outputFilePath = os.path.basename(args.user_extractName) + ".mmCIF"
+            compilation.write_block(args.user_extractName, outputFilePath)
+            print(f"Wrote {args.user_extractName} to {outputFilePath}")
+        if args.user_WURCS is not None:
+            names = compilation.get_names_by_WURCS(args.user_WURCS)
+            if not len(names):
+                print(f"No blocks with WURCS {args.user_WURCS}")
+            outputDirectory = args.user_outputPath or os.getcwd()
+            if not os.path.exists(outputDirectory):
+                os.makedirs(outputDirectory)
+            for name in names:
+                # Block names are <glycan>/<cluster>, the file is named after both.
+                outputFilePath = os.path.join(
+                    outputDirectory, name.replace("/", "_") + ".mmCIF"
+                )
+                compilation.write_block(name, outputFilePath)
+                print(f"Wrote {name} to {outputFilePath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import tempfile
+
+try:
+    from .profiling import profile_stage
+    from .glycomics_cache import cachedOfflineDatabaseQuery
+except ImportError:
+    from profiling import profile_stage
+    from glycomics_cache import cachedOfflineDatabaseQuery
+
+# Shared mmCIF export used by pdb2mmcif.py and by glycam2pdb.py -mmcif. Privateer supplies the WURCS, GlyTouCan ID and
+# sugar linkages, gemmi builds the structure and writes the annotated mmCIF block.
+# gemmi and Privateer(https://github.com/glycojones/privateer/tree/privateerpython) are imported inside the functions
+# that need them, so importing this module stays cheap.
+
+# Cluster representatives of the Volume corpus are named after their glycosidic torsions, any other file keeps its own name.
+clusterTorsionNames = {
+    "Cluster1.pdb": "Phi=66_Psi=-179_Omega=-177",
+    "Cluster2.pdb": "Phi=66_Psi=-179_Omega=55.1",
+}
+
+offlineDatabase = None
+# SQLite file the offline database lookups are persisted in(see glycomics_cache.py), None keeps them in memory only.
+glycomicsCachePath = None
+
+
+# Privateer/gemmi functions
+def getMetadataFromPrivateer(inputFilePath, privateerJSON=None):
+    # privateerJSON is the pvt.OfflineDatabase to query. When None, it is only loaded once a lookup misses the cache.
+    from privateer import privateer_core as pvt
+
+    glycosylation = pvt.GlycosylationComposition(inputFilePath)
+    # The block level WURCS and GlyTouCan ID describe the first glycan, sugar connections cover every glycan.
+    inputGlycan = glycosylation.get_glycan(0)
+    with profile_stage("glycomics lookup"):
+        glycomics = cachedOfflineDatabaseQuery(
+            inputGlycan.get_wurcs_notation(),
+            lambda: inputGlycan.query_offline_database(
+                privateerJSON if privateerJSON is not None else get_offline_database(),
+                False,
+                False,
+            ),
+            glycomicsCachePath,
+        )
+    glycanWURCS = glycomics["wurcs"]
+    glytoucanID = glycomics["glytoucan_id"]
+
+    linkages = []
+    for glycanIndex in range(glycosylation.get_number_of_glycan_chains_detected()):
+        glycan = glycosylation.get_glycan(glycanIndex)
+        totalNumberOfSugars = glycan.get_total_number_of_sugars()
+        for i in range(totalNumberOfSugars):
+            currentSugar = glycan.get_monosaccharide(i)
+            outputLinkageInfo = {
+                "glycan_index": glycanIndex,
+                "index": i,
+                "pdb_id": int(currentSugar.get_sugar_pdb_id()),
+                "chain_id": currentSugar.get_sugar_chain_id(),
+                "linkage_info": currentSugar.get_sugar_linkage_info(),
+            }
+
+            linkages.append(outputLinkageInfo)
+
+    output = {
+        "glycanWURCS": glycanWURCS,
+        "glytoucanID": glytoucanID,
+        "sugar_connections": linkages,
+    }
+
+    return output
+
+
+def addGemmiConnectionsBetweenSugars(gemmiStructure, privateerMetaData):
+    # Sugars are looked up by (glycan, index in the glycan) for the linkage partners Privateer reports and by
+    # (chain, seqID) for the gemmi residues, so every linkage is resolved in constant time, for every glycan of the first
+    # model. Structures with a single chain(GLYCAM conversions, which have a blank chain ID) are matched on seqID only.
+    import gemmi
+
+    outputGemmiStructure = gemmiStructure
+    model = outputGemmiStructure[0]
+    matchChains = len(model) > 1
+
+    def get_residue_key(chainID, seqID):
+        return (chainID.strip() if matchChains else "", seqID)
+
+    sugarsByIndex = {}
+    sugarsByResidue = {}
+    for sugar in privateerMetaData["sugar_connections"]:
+        sugarsByIndex[(sugar["glycan_index"], sugar["index"])] = sugar
+        sugarsByResidue.setdefault(
+            get_residue_key(sugar["chain_id"], sugar["pdb_id"]), sugar
+        )
+
+    residuesByKey = {}
+    for chain in model:
+        for residue in chain:
+            residuesByKey.setdefault(
+                get_residue_key(chain.name, residue.seqid.num), (chain, residue)
+            )
+
+    # Connections are added in residue order, residues that are not sugars(protein, aglycones, water) are skipped.
+    for residueKey, (chain, residue_Alpha) in residuesByKey.items():
+        sugar = sugarsByResidue.get(residueKey)
+        if sugar is None:
+            continue
+        currentPDBID = residue_Alpha.seqid.num
+        currentResidueName = residue_Alpha.name
+        for connection in sugar["linkage_info"]:
+            connectedToSugar = sugarsByIndex[
+                (sugar["glycan_index"], connection["connectedToSugarID"])
+            ]
+            connectedToChain, residue_Bravo = residuesByKey[
+                get_residue_key(
+                    connectedToSugar["chain_id"], connectedToSugar["pdb_id"]
+                )
+            ]
+            connectedToPDBID = residue_Bravo.seqid.num
+            connectedToResidueName = residue_Bravo.name
+
+            currentResidueAtomName = "O" + connection["donorPosition"]
+            connectedToResidueAtomName = "C" + connection["acceptorPosition"]
+
+            new_connection = gemmi.Connection()
+            new_connection.name = (
+                str(currentPDBID)
+                + currentResidueName
+                + "_"
+                + currentResidueAtomName
+                + "-"
+                + connectedToResidueAtomName
+                + "_"
+                + connectedToResidueName
+                + str(connectedToPDBID)
+            )
+            if matchChains:
+                new_connection.name = chain.name + "_" + new_connection.name
+            new_connection.type = gemmi.ConnectionType.Covale
+            new_connection.asu = gemmi.Asu.Same
+
+            new_connection.partner1 = gemmi.make_address(
+                chain, residue_Alpha, residue_Alpha.sole_atom(currentResidueAtomName)
+            )
+            new_connection.partner2 = gemmi.make_address(
+                connectedToChain,
+                residue_Bravo,
+                residue_Bravo.sole_atom(connectedToResidueAtomName),
+            )
+            outputGemmiStructure.connections.append(new_connection)
+
+    return outputGemmiStructure
+
+
+def get_offline_database():
+    # pvt.OfflineDatabase() loads the whole glycomics database, so it is built once per process.
+    global offlineDatabase
+    if offlineDatabase is None:
+        from privateer import privateer_core as pvt
+
+        offlineDatabase = pvt.OfflineDatabase()
+    return offlineDatabase
+
+
+def set_glycomics_cache_path(cachePath):
+    global glycomicsCachePath
+    glycomicsCachePath = cachePath
+
+
+def get_mmcif_block_names(inputFilePath):
+    root, fileName = os.path.split(inputFilePath)
+    trash, glycanName = os.path.split(root)
+    outputName = clusterTorsionNames.get(fileName, os.path.splitext(fileName)[0])
+    return glycanName, outputName
+
+
+def make_annotated_mmcif_document(
+    gemmiStructure, privateerMetaData, glycanName, outputName
+):
+    import gemmi
+
+    gemmiStructureWithSugarLinks = addGemmiConnectionsBetweenSugars(
+        gemmiStructure, privateerMetaData
+    )
+
+    gemmiDocument = gemmiStructureWithSugarLinks.make_mmcif_document()
+    gemmiBlock = gemmiDocument.sole_block()
+    gemmiBlock.set_pair("_WURCS", gemmi.cif.quote(privateerMetaData["glycanWURCS"]))
+    gemmiBlock.set_pair("_GlyTouCan", gemmi.cif.quote(privateerMetaData["glytoucanID"]))
+    gemmiBlock.name = glycanName + "/" + outputName
+    gemmiBlock.set_pair("_entry.id", glycanName)
+    gemmiBlock.set_pair("_cell.entry_id", glycanName)
+    gemmiBlock.set_pair("_symmetry.entry_id", glycanName)
+    return gemmiDocument
+
+
+def convertRecordsToCIF(convertedPDB, convertedPDBPath, outputFilePath):
+    # Builds the mmCIF straight from the converted records held in memory by glycam2pdb, rather than parsing the PDB again.
+    # convertedPDBPath only names the block. Privateer's Python API only reads from disk, so it is given a temporary copy
+    # of the same records, which keeps the metadata and the structure in step whether or not the PDB was written.
+    import gemmi
+
+    convertedRecords = "".join(convertedPDB)
+    with profile_stage("privateer metadata"):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".pdb", prefix="mmcif_export_", delete=False
+        ) as recordsFile:
+            recordsFile.write(convertedRecords)
+        try:
+            privateerMetaData = getMetadataFromPrivateer(recordsFile.name)
+        finally:
+            os.remove(recordsFile.name)
+    with profile_stage("gemmi mmCIF build"):
+        gemmiStructure = gemmi.read_pdb_string(convertedRecords)
+        glycanName, outputName = get_mmcif_block_names(convertedPDBPath)
+        gemmiDocument = make_annotated_mmcif_document(
+            gemmiStructure, privateerMetaData, glycanName, outputName
+        )
+    with profile_stage("mmCIF write"):
+        gemmiDocument.write_file(outputFilePath)
+    return outputFilePath
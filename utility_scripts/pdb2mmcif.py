@@ -1,13 +1,84 @@
 import os
+import sys
+import json
 import shutil
-import gemmi
-from privateer import (
-    privateer_core as pvt,
-)  # https://github.com/glycojones/privateer/tree/privateerpython
+import argparse
+
+try:
+    from .mmcif_export import (
+        getMetadataFromPrivateer,
+        get_mmcif_block_names,
+        make_annotated_mmcif_document,
+        set_glycomics_cache_path,
+    )
+    from .glycomics_cache import defaultGlycomicsCachePath
+    from .mmcif_compilation import (
+        CompilationReader,
+        get_block_identifiers,
+        make_block_names_unique,
+        rename_block,
+        write_compilation,
+    )
+    from .validation_cache import get_privateer_version, hash_file_contents
+    from .batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+        run_tasks_in_process,
+    )
+    from .profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+except ImportError:
+    from mmcif_export import (
+        getMetadataFromPrivateer,
+        get_mmcif_block_names,
+        make_annotated_mmcif_document,
+        set_glycomics_cache_path,
+    )
+    from glycomics_cache import defaultGlycomicsCachePath
+    from mmcif_compilation import (
+        CompilationReader,
+        get_block_identifiers,
+        make_block_names_unique,
+        rename_block,
+        write_compilation,
+    )
+    from validation_cache import get_privateer_version, hash_file_contents
+    from batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+        run_tasks_in_process,
+    )
+    from profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+
+# gemmi and Privateer are only imported once a conversion is run, see mmcif_export.py.
 
-# Utility functions
-def search_list_of_dicts(key, value, list):
-    return [element for element in list if element[key] == value][0]
+# Bump when the blocks written for an unchanged input change, so that -incremental rebuilds every block.
+COMPILATION_MANIFEST_VERSION = 1
 
 
 def CreateFolder(path):
@@ -18,215 +89,353 @@ def CreateFolder(path):
         os.makedirs(path)
 
 
-# Privateer/gemmi functions
-def getResidueSummaryInChain(chain):
-    summary = []
+def buildAnnotatedCIFDocument(inputFilePath, privateerJSON):
+    # Privateer analysis, the offline database query and gemmi parsing happen once per structure, the resulting
+    # document is then written to the per-file output and copied into the compilation.
+    import gemmi
 
-    chainLength = len(chain)
+    glycanName, outputName = get_mmcif_block_names(inputFilePath)
 
-    for i in range(chainLength):
-        residue = chain[i]
-        currentSeqID = residue.seqid.num
-        residueName = residue.name
+    with profile_stage("privateer metadata"):
+        privateerMetaData = getMetadataFromPrivateer(inputFilePath, privateerJSON)
+    with profile_stage("mmCIF build"):
+        gemmiStructure = gemmi.read_structure(inputFilePath)
+        return make_annotated_mmcif_document(
+            gemmiStructure, privateerMetaData, glycanName, outputName
+        )
 
-        gemmiResidueInfo = {
-            "index": i,
-            "seqID": currentSeqID,
-            "residueName": residueName,
-        }
 
-        summary.append(gemmiResidueInfo)
+def initialize_compilation_worker(profilingSettings, glycomicsCachePath):
+    initialize_worker_profiling(*profilingSettings)
+    set_glycomics_cache_path(glycomicsCachePath)
 
-    return summary
 
+def buildCompilationBlock(compilationTask):
+    # Writes the per-file mmCIF and returns its block as mmCIF text, which is also what workers send back since gemmi
+    # documents cannot be pickled.
+    inputFilePath, outputFilePath = compilationTask
+    # The offline database is only loaded by processes that look up a glycan missing from the glycomics cache.
+    gemmiDocument = buildAnnotatedCIFDocument(inputFilePath, None)
+    with profile_stage("write"):
+        gemmiDocument.write_file(outputFilePath)
+    gemmiBlock = gemmiDocument.sole_block()
+    WURCS, glytoucanID = get_block_identifiers(gemmiBlock)
+    return {
+        "name": gemmiBlock.name,
+        "block": gemmiBlock.as_string(),
+        "WURCS": WURCS,
+        "GlyTouCan": glytoucanID,
+        "profile": drain_stage_events(),
+    }
 
-def getMetadataFromPrivateer(inputFilePath, privateerJSON):
-    glycosylation = pvt.GlycosylationComposition(inputFilePath)
-    inputGlycan = glycosylation.get_glycan(0)
-    # glycanWURCS = inputGlycan.get_wurcs_notation()
-    glycomics = inputGlycan.query_offline_database(privateerJSON, False, False)
-    glycanWURCS = glycomics["wurcs"]
-    glytoucanID = glycomics["glytoucan_id"]
 
-    totalNumberOfSugars = inputGlycan.get_total_number_of_sugars()
+def getCompilationTasks(inputPath, outputPath):
+    # (inputFilePath, outputFilePath) for every file under inputPath, sorted by path relative to inputPath so that the
+    # compilation lists its blocks in the same order however the folder is walked and however many workers are used.
+    compilationTasks = []
+    for root, dirs, files in os.walk(inputPath):
+        for name in files:
+            head, tail = os.path.split(root)
+            outputroot = os.path.join(outputPath, tail)
+            if not os.path.exists(outputroot):
+                os.makedirs(outputroot)
+
+            name_of_file = name.replace(".pdb", ".mmCIF")
+            compilationTasks.append(
+                (os.path.join(root, name), os.path.join(outputroot, name_of_file))
+            )
+    return sorted(
+        compilationTasks,
+        key=lambda compilationTask: os.path.relpath(compilationTask[0], inputPath),
+    )
 
-    linkages = []
-    for i in range(totalNumberOfSugars):
-        currentSugar = inputGlycan.get_monosaccharide(i)
-        # currentSugarPDBID = currentSugar.get_sugar_pdb_id()
-        currentSugarIndexInVector = i
-        currentSugarPDBID = int(currentSugar.get_sugar_pdb_id())
-        currentSugarLinkageInfo = currentSugar.get_sugar_linkage_info()
-        outputLinkageInfo = {
-            "index": currentSugarIndexInVector,
-            "pdb_id": currentSugarPDBID,
-            "linkage_info": currentSugarLinkageInfo,
-        }
 
-        linkages.append(outputLinkageInfo)
+def get_manifest_path(outputPath):
+    return os.path.normpath(outputPath) + ".manifest.json"
 
-    output = {
-        "glycanWURCS": glycanWURCS,
-        "glytoucanID": glytoucanID,
-        "sugar_connections": linkages,
-    }
 
-    return output
+def get_compilation_version():
+    # None when the installed Privateer cannot be identified, a manifest is then never trusted.
+    if get_privateer_version() is None:
+        return None
+    return f"{COMPILATION_MANIFEST_VERSION}:{get_privateer_version()}"
 
 
-def addGemmiConnectionsBetweenSugars(gemmiStructure, privateerMetaData):
-    outputGemmiStructure = gemmiStructure
-    sugarConnectionMetaData = privateerMetaData["sugar_connections"]
+def load_compilation_manifest(manifestPath, compilationPath):
+    # Returns None when there is no usable manifest or compilation, which means the output directory has to be rebuilt.
+    if not os.path.exists(manifestPath) or not os.path.exists(compilationPath):
+        return None
+    try:
+        with open(manifestPath) as manifestFile:
+            manifest = json.load(manifestFile)
+    except (OSError, ValueError):
+        return None
+    compilationVersion = get_compilation_version()
+    if (
+        compilationVersion is None
+        or manifest.get("compilation_version") != compilationVersion
+    ):
+        return None
+    return manifest
 
-    model = outputGemmiStructure[0]
-    chain = model[0]
-    gemmiResidueInfo = getResidueSummaryInChain(chain)
-    chainLength = len(chain)
-    for i in range(chainLength):
-        residue = chain[i]
-        currentPDBID = residue.seqid.num
-        currentResidueName = residue.name
 
-        privateerConnectionsSummary = search_list_of_dicts(
-            "pdb_id", currentPDBID, sugarConnectionMetaData
+def save_compilation_manifest(manifestPath, manifest):
+    temporaryManifestPath = manifestPath + ".tmp"
+    with open(temporaryManifestPath, "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(temporaryManifestPath, manifestPath)
+
+
+def getUnchangedBlocks(
+    manifest, compilationPath, outputPath, compilationTasks, inputHashes
+):
+    # Blocks of inputs whose hash matches the manifest, copied byte for byte out of the existing compilation.
+    # Returns None if the compilation no longer matches its index, in which case everything is rebuilt.
+    unchangedBlocks = {}
+    try:
+        with CompilationReader(compilationPath) as compilation:
+            for inputFilePath, outputFilePath in compilationTasks:
+                manifestEntry = manifest["files"].get(inputHashes[inputFilePath][0])
+                if (
+                    manifestEntry is None
+                    or manifestEntry["hash"] != inputHashes[inputFilePath][1]
+                    or manifestEntry["block"] not in compilation
+                    or not os.path.exists(outputFilePath)
+                ):
+                    continue
+                entry = compilation.get_entry(manifestEntry["block"])
+                # Back under the name buildCompilationBlock gives it, repeated names are numbered again once all blocks
+                # are known.
+                blockName = "/".join(get_mmcif_block_names(inputFilePath))
+                unchangedBlocks[inputFilePath] = {
+                    "name": blockName,
+                    "block": rename_block(
+                        compilation.get_block_text(entry["name"]), blockName
+                    ),
+                    "WURCS": entry["WURCS"],
+                    "GlyTouCan": entry["GlyTouCan"],
+                }
+    except ValueError as exception:
+        print(f"Rebuilding {compilationPath}: {exception}")
+        return None
+    return unchangedBlocks
+
+
+def prune_stale_outputs(manifest, outputPath, currentInputs):
+    for relativeInputPath in sorted(set(manifest["files"]) - currentInputs):
+        staleOutputPath = os.path.join(
+            outputPath, manifest["files"][relativeInputPath]["output"]
         )
+        if os.path.exists(staleOutputPath):
+            os.remove(staleOutputPath)
+        print(
+            f"Removed output of {relativeInputPath}, which is no longer compiled: {staleOutputPath}"
+        )
+        del manifest["files"][relativeInputPath]
 
-        currentResidueLinkageInfo = privateerConnectionsSummary["linkage_info"]
-        for connection in currentResidueLinkageInfo:
-            connectedToSugarIndex = connection["connectedToSugarID"]
-            connectedToSugarIndexPrivateerList = search_list_of_dicts(
-                "index", connectedToSugarIndex, sugarConnectionMetaData
-            )
-            connectedToPDBID = connectedToSugarIndexPrivateerList["pdb_id"]
-            connectedToInfoSummary = search_list_of_dicts(
-                "seqID", connectedToPDBID, gemmiResidueInfo
-            )
-            connectedToResidueName = connectedToInfoSummary["residueName"]
-
-            currentResidueAtomName = "O" + connection["donorPosition"]
-            connectedToResidueAtomName = "C" + connection["acceptorPosition"]
-
-            new_connection = gemmi.Connection()
-            new_connection.name = (
-                str(currentPDBID)
-                + currentResidueName
-                + "_"
-                + currentResidueAtomName
-                + "-"
-                + connectedToResidueAtomName
-                + "_"
-                + connectedToResidueName
-                + str(connectedToPDBID)
-            )
-            new_connection.type = gemmi.ConnectionType.Covale
-            new_connection.asu = gemmi.Asu.Same
-            residue_Alpha = chain[str(currentPDBID)][currentResidueName]
-            residue_Bravo = chain[str(connectedToPDBID)][connectedToResidueName]
 
-            new_connection.partner1 = gemmi.make_address(
-                chain, residue_Alpha, residue_Alpha.sole_atom(currentResidueAtomName)
-            )
-            new_connection.partner2 = gemmi.make_address(
-                chain,
-                residue_Bravo,
-                residue_Bravo.sole_atom(connectedToResidueAtomName),
+def compileCIFDirectory(
+    inputPath,
+    outputPath,
+    jobs=1,
+    supervisionSettings=None,
+    incremental=False,
+    glycomicsCachePath=None,
+):
+    # Writes <outputPath>/<folder>/<name>.mmCIF for every PDB under inputPath and all of them as blocks of
+    # <outputPath>/compilation.mmCIF, preceded by an index block with their byte offsets(see mmcif_compilation.py). With
+    # jobs > 1 the structures are annotated in supervised worker processes(see batch_runner.py) and merged in task order
+    # as they come back, so the compilation is identical to a serial run. Returns the files that could not be converted,
+    # which are left out of the compilation.
+    # With incremental, input hashes are tracked in <outputPath>.manifest.json. Only new and changed inputs are annotated
+    # again, the blocks of the other inputs are copied unchanged from the existing compilation and the index is rewritten.
+    single_mmCIF_output_path = os.path.join(outputPath, "compilation.mmCIF")
+    manifestPath = get_manifest_path(outputPath)
+    compilationBlocks = []
+    failedInputs = []
+    manifest = None
+    if incremental is True:
+        manifest = load_compilation_manifest(manifestPath, single_mmCIF_output_path)
+    if manifest is None:
+        CreateFolder(outputPath)
+    compilationTasks = getCompilationTasks(inputPath, outputPath)
+
+    unchangedBlocks = {}
+    inputHashes = {}
+    if incremental is True:
+        with profile_stage("input hashing"):
+            for inputFilePath, outputFilePath in compilationTasks:
+                inputHashes[inputFilePath] = (
+                    os.path.relpath(inputFilePath, inputPath),
+                    hash_file_contents(inputFilePath),
+                )
+        if manifest is not None:
+            with profile_stage("compilation read"):
+                unchangedBlocks = getUnchangedBlocks(
+                    manifest,
+                    single_mmCIF_output_path,
+                    outputPath,
+                    compilationTasks,
+                    inputHashes,
+                )
+            if unchangedBlocks is None:
+                # Every block is rebuilt, the old entries are still used to remove outputs of deleted inputs.
+                unchangedBlocks = {}
+        if manifest is None:
+            manifest = {"compilation_version": get_compilation_version(), "files": {}}
+    changedTasks = [
+        compilationTask
+        for compilationTask in compilationTasks
+        if compilationTask[0] not in unchangedBlocks
+    ]
+
+    if jobs > 1 or is_supervision_requested(supervisionSettings):
+        compilationResults = run_supervised_batch(
+            buildCompilationBlock,
+            changedTasks,
+            jobs,
+            supervisionSettings,
+            lambda compilationTask: compilationTask[0],
+            initialize_compilation_worker,
+            (get_worker_profiling_settings(), glycomicsCachePath),
+        )
+    else:
+        set_glycomics_cache_path(glycomicsCachePath)
+        compilationResults = run_tasks_in_process(buildCompilationBlock, changedTasks)
+    changedBlocks = {}
+    for compilationTask, compilationResult, failure in compilationResults:
+        print(compilationTask[0])
+        if failure is not None:
+            print(
+                f"Failed to convert {compilationTask[0]}: {describe_failure(failure)}"
             )
-            outputGemmiStructure.connections.append(new_connection)
-
-    return outputGemmiStructure
+            failedInputs.append(compilationTask[0])
+            continue
+        add_stage_events(compilationResult["profile"])
+        changedBlocks[compilationTask[0]] = compilationResult
+
+    compiledTasks = []
+    for inputFilePath, outputFilePath in compilationTasks:
+        compilationBlock = unchangedBlocks.get(inputFilePath) or changedBlocks.get(
+            inputFilePath
+        )
+        if compilationBlock is None:
+            continue
+        compiledTasks.append((inputFilePath, outputFilePath))
+        compilationBlocks.append(compilationBlock)
+    compilationBlocks = make_block_names_unique(compilationBlocks)
+    for (inputFilePath, outputFilePath), compilationBlock in zip(
+        compiledTasks, compilationBlocks
+    ):
+        if incremental is True:
+            relativeInputPath, inputHash = inputHashes[inputFilePath]
+            manifest["files"][relativeInputPath] = {
+                "hash": inputHash,
+                "block": compilationBlock["name"],
+                "output": os.path.relpath(outputFilePath, outputPath),
+            }
+
+    with profile_stage("compilation write"):
+        # Written next to the old compilation and moved over it, so an interrupted run leaves the previous one intact.
+        temporaryCompilationPath = single_mmCIF_output_path + ".tmp"
+        write_compilation(temporaryCompilationPath, compilationBlocks)
+        os.replace(temporaryCompilationPath, single_mmCIF_output_path)
+    if incremental is True:
+        # Inputs that failed lose their entry as well, so they are tried again on the next run.
+        prune_stale_outputs(
+            manifest,
+            outputPath,
+            {inputHashes[inputFilePath][0] for inputFilePath in inputHashes}
+            - {inputHashes[inputFilePath][0] for inputFilePath in failedInputs},
+        )
+        save_compilation_manifest(manifestPath, manifest)
+        print(
+            f"Compiled {len(changedTasks)} changed files, reused {len(unchangedBlocks)} unchanged blocks."
+        )
+    return failedInputs
 
 
-def convertSinglePDBtoSingleCIF(inputFilePath, outputFilePath, privateerJSON):
-    root, fileName = os.path.split(inputFilePath)
-    trash, glycanName = os.path.split(root)
+def get_default_output_path(inputPath):
+    # VolumeConvertedPDB -> VolumeConvertedmmCIF next to it, the layout the glycampdbfiles folders follow.
+    inputPath = os.path.normpath(inputPath)
+    inputDirectory = os.path.basename(inputPath)
+    if inputDirectory.endswith("ConvertedPDB"):
+        outputDirectory = inputDirectory[: -len("PDB")] + "mmCIF"
+    else:
+        outputDirectory = inputDirectory + "mmCIF"
+    return os.path.join(os.path.dirname(inputPath), outputDirectory)
 
-    outputName = ""
-    if fileName == "Cluster1.pdb":
-        outputName = "Phi=66_Psi=-179_Omega=-177"
-    elif fileName == "Cluster2.pdb":
-        outputName = "Phi=66_Psi=-179_Omega=55.1"
 
-    privateerMetaData = getMetadataFromPrivateer(inputFilePath, privateerJSON)
-    gemmiStructure = gemmi.read_structure(inputFilePath)
-    gemmiStructureWithSugarLinks = addGemmiConnectionsBetweenSugars(
-        gemmiStructure, privateerMetaData
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="pdb2mmcif.py",
+        usage="%(prog)s [options] PATH.",
+        description="Convert a folder of converted PDB files to annotated mmCIF files and a single compilation.mmCIF.",
     )
-
-    gemmiDocument = gemmiStructureWithSugarLinks.make_mmcif_document()
-    gemmiBlock = gemmiDocument.sole_block()
-    gemmiBlock.set_pair("_WURCS", gemmi.cif.quote(privateerMetaData["glycanWURCS"]))
-    gemmiBlock.set_pair("_GlyTouCan", gemmi.cif.quote(privateerMetaData["glytoucanID"]))
-    gemmiBlock.name = glycanName + "/" + outputName
-    gemmiBlock.set_pair("_entry.id", glycanName)
-    gemmiBlock.set_pair("_cell.entry_id", glycanName)
-    gemmiBlock.set_pair("_symmetry.entry_id", glycanName)
-    gemmiDocument.write_file(outputFilePath)
-
-
-def convertAllPDBtoSingleCIF(
-    inputFilePath, singular_mmCIF_output, privateerJSON, blockNameList
-):
-    root, fileName = os.path.split(inputFilePath)
-    trash, glycanName = os.path.split(root)
-
-    outputName = ""
-    if fileName == "Cluster1.pdb":
-        outputName = "Phi=66_Psi=-179_Omega=-177"
-    elif fileName == "Cluster2.pdb":
-        outputName = "Phi=66_Psi=-179_Omega=55.1"
-
-    privateerMetaData = getMetadataFromPrivateer(inputFilePath, privateerJSON)
-    gemmiStructure = gemmi.read_structure(inputFilePath)
-    gemmiStructureWithSugarLinks = addGemmiConnectionsBetweenSugars(
-        gemmiStructure, privateerMetaData
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Root directory of converted PDB files, e.g. glycampdbfiles/VolumeConvertedPDB. Blocks are named after the folder each file is in.",
+        required=True,
     )
-
-    gemmiDocument = gemmiStructureWithSugarLinks.make_mmcif_document()
-    gemmiBlock = gemmiDocument.sole_block()
-    gemmiBlock.set_pair("_WURCS", gemmi.cif.quote(privateerMetaData["glycanWURCS"]))
-    gemmiBlock.set_pair("_GlyTouCan", gemmi.cif.quote(privateerMetaData["glytoucanID"]))
-
-    gemmiBlock.name = glycanName + "/" + outputName
-    blockNameList.append(gemmiBlock.name)
-
-    gemmiBlock.set_pair("_entry.id", glycanName)
-    gemmiBlock.set_pair("_cell.entry_id", glycanName)
-    gemmiBlock.set_pair("_symmetry.entry_id", glycanName)
-    singular_mmCIF_output.add_copied_block(gemmiBlock, pos=-1)
-
-
-inputPath = "/home/harold/Dev/privateer_python/project_alliance/glycampdbfiles/VolumeConvertedPDB/"
-# inputPath = "/Users/haroldas/Dev/privateer_python/project_alliance/glycampdbfiles/VolumeConvertedPDB/"
-outputPath = "/home/harold/Dev/privateer_python/project_alliance/glycampdbfiles/VolumeConvertedmmCIF/"
-# outputPath = "/Users/haroldas/Dev/privateer_python/project_alliance/glycampdbfiles/VolumeConvertedmmCIF/"
-privateerJSON = pvt.OfflineDatabase()
-
-single_mmCIF_output_path = os.path.join(outputPath, "compilation.mmCIF")
-singular_mmCIF_output = gemmi.cif.Document()
-blockNameList = []
-CreateFolder(outputPath)
-for root, dirs, files in os.walk(inputPath, topdown=False):
-    for name in files:
-        head, tail = os.path.split(root)
-        outputroot = os.path.join(outputPath, tail)
-        if not os.path.exists(outputroot):
-            os.makedirs(outputroot)
-
-        inputFilePath = os.path.join(root, name)
-        print(inputFilePath)
-
-        clusterName = name.replace(".pdb", "")
-        name_of_file = name.replace(".pdb", ".mmCIF")
-        outputFilePath = os.path.join(outputroot, name_of_file)
-
-        convertSinglePDBtoSingleCIF(inputFilePath, outputFilePath, privateerJSON)
-        convertAllPDBtoSingleCIF(
-            inputFilePath, singular_mmCIF_output, privateerJSON, blockNameList
+    parser.add_argument(
+        "-output",
+        action="store",
+        default=None,
+        dest="user_outputPath",
+        help="Output directory, which is emptied first unless -incremental is given. Defaults to the input directory with ConvertedPDB replaced by ConvertedmmCIF.",
+    )
+    parser.add_argument(
+        "-jobs",
+        action="store",
+        type=positive_int,
+        default=1,
+        dest="user_jobs",
+        help="Number of worker processes used to annotate the structures. Blocks are merged into compilation.mmCIF in the same order as with a single process.",
+    )
+    parser.add_argument(
+        "-incremental",
+        action="store_true",
+        default=False,
+        dest="user_incremental",
+        help="Keep the existing output and only annotate files whose contents changed since the previous run(tracked in <output folder>.manifest.json). Their blocks are replaced in compilation.mmCIF, the blocks of unchanged files are kept as they are.",
+    )
+    parser.add_argument(
+        "-glycomics_cache",
+        action="store",
+        nargs="?",
+        default=None,
+        const=defaultGlycomicsCachePath,
+        dest="user_glycomicsCachePath",
+        help=f"Keep the WURCS and GlyTouCan IDs looked up in the offline glycomics database in an on-disk cache, '{defaultGlycomicsCachePath}' unless another path is given. Lookups are keyed by glycan topology and Privateer version, so every glycan is looked up once across runs instead of once per conformer. Within a run, every process looks a glycan up once either way.",
+    )
+    add_supervision_arguments(parser)
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+    inputPath = os.path.abspath(args.user_inputPath)
+    outputPath = args.user_outputPath
+    if outputPath is None:
+        outputPath = get_default_output_path(inputPath)
+    failedInputs = compileCIFDirectory(
+        inputPath,
+        os.path.abspath(outputPath),
+        args.user_jobs,
+        get_supervision_settings(args),
+        args.user_incremental,
+        args.user_glycomicsCachePath,
+    )
+    if len(failedInputs):
+        print(
+            f"{len(failedInputs)} files failed to convert and were left out of compilation.mmCIF."
         )
+    stop_profiling_session(profilingSession)
+    if len(failedInputs):
+        sys.exit(1)
 
-indexBlock = singular_mmCIF_output.add_new_block(name="index", pos=0)
-indexLoop = indexBlock.init_loop("_index.", ["id", "block_name"])
-for count, item in enumerate(blockNameList):
-    indexLoop.add_row([str(count), item])
 
-singular_mmCIF_output.write_file(single_mmCIF_output_path)
+if __name__ == "__main__":
+    main()
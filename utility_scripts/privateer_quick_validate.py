@@ -1,149 +1,451 @@
 import os
+import sys
 import argparse
-from privateer import privateer_core as pvtcore
-from prettytable import PrettyTable
-
-
-def privateerValidation(path):
-    outputList = []
-    glycosylation = pvtcore.GlycosylationComposition_memsafe(path)
-    numGlycans = glycosylation.get_number_of_glycan_chains_detected()
-    for glycanIndex in range(numGlycans):
-        glycanList = []
-        glycan = glycosylation.get_glycan(glycanIndex)
-        glycanWURCS = glycan.get_wurcs_notation()
-        numSugars = glycan.get_total_number_of_sugars()
-        for sugarIndex in range(numSugars):
-            sugar = glycan.get_monosaccharide(sugarIndex)
-            sugarPDBCode = sugar.get_name_short()
-            sugarPDBChain = sugar.get_sugar_chain_id()
-            sugarPDBID = int(sugar.get_sugar_pdb_id())
-            sugarCremerPople = sugar.get_cremer_pople_params()
-            puckeringAmplitude = sugarCremerPople[0]
-            Phi = sugarCremerPople[1]
-            Theta = sugarCremerPople[2]
-            sugarType = sugar.get_denomination()
-            sugarConformation = sugar.get_conformation_name()
-            sugarBFac = sugar.get_bfactor()
-            sugarCtx = sugar.get_glycosylation_type()
-            sugarPrivateerDiagnostic = sugar.get_privateer_diagnostic()
-            if sugarConformation != "4c1" or sugarPrivateerDiagnostic != "yes":
-                glycanList.append(
-                    {
-                        "Code": sugarPDBCode,
-                        "Chain": sugarPDBChain,
-                        "ID": sugarPDBID,
-                        "Q": puckeringAmplitude,
-                        "Phi": Phi,
-                        "Theta": Theta,
-                        "detectedType": sugarType,
-                        "cnf": sugarConformation,
-                        "bfac": sugarBFac,
-                        "ctx": sugarCtx,
-                        "diagnostic": sugarPrivateerDiagnostic,
-                    }
-                )
-        if len(glycanList):
-            sortedList = sorted(glycanList, key=lambda k: k["ID"])
-            outputDict = {
-                "WURCS": glycanWURCS,
-                "totalSugars": numSugars,
-                "problematicSugars": sortedList,
-            }
-            outputList.append(outputDict)
-
-    if len(outputList):
-        return {"path": path, "Glycans": outputList}
-    else:
-        return None
-
-
-def print_privateer_validation_results(fileResults):
-    totalSugars = 0
-    totalProblematicSugars = 0
-    table = PrettyTable()
-    table.field_names = [
-        "Sugar",
-        "Q",
-        "Phi",
-        "Theta",
-        "Detected type",
-        "Cnf",
-        "<Bfac>",
-        "Ctx",
-        "Ok?",
+import tempfile
+import importlib
+
+try:
+    from .privateer_validation import runPrivateerValidation, print_validation_outcome
+    from .validation_cache import (
+        defaultValidationCachePath,
+        defaultValidationCacheMaxMegabytes,
+    )
+    from .archive_io import (
+        is_archive_path,
+        relabel_validation_results,
+        stage_archive_members,
+    )
+    from .conformer_dedup import (
+        CollectedValidationResults,
+        add_deduplication_arguments,
+        get_representatives,
+        groupConformerFiles,
+        print_deduplication_summary,
+    )
+    from .validation_server import add_server_client_arguments, request_validation
+    from .batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
+    from .validation_output import (
+        add_validation_output_arguments,
+        make_validation_results_writer,
+    )
+    from .profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+except ImportError:
+    from privateer_validation import runPrivateerValidation, print_validation_outcome
+    from validation_cache import (
+        defaultValidationCachePath,
+        defaultValidationCacheMaxMegabytes,
+    )
+    from archive_io import (
+        is_archive_path,
+        relabel_validation_results,
+        stage_archive_members,
+    )
+    from conformer_dedup import (
+        CollectedValidationResults,
+        add_deduplication_arguments,
+        get_representatives,
+        groupConformerFiles,
+        print_deduplication_summary,
+    )
+    from validation_server import add_server_client_arguments, request_validation
+    from batch_runner import (
+        add_supervision_arguments,
+        describe_failure,
+        get_supervision_settings,
+        is_supervision_requested,
+        positive_int,
+        run_supervised_batch,
+    )
+    from validation_output import (
+        add_validation_output_arguments,
+        make_validation_results_writer,
+    )
+    from profiling import (
+        add_profiling_arguments,
+        add_stage_events,
+        drain_stage_events,
+        get_worker_profiling_settings,
+        initialize_worker_profiling,
+        profile_stage,
+        start_profiling_session,
+        stop_profiling_session,
+    )
+
+
+workerValidationCacheSettings = None
+
+
+def initialize_validation_worker(
+    validationCacheSettings, profilingSettings=(False, False)
+):
+    # Runs once per worker process, so settings and the Privateer import are set up once rather than on the first file.
+    # A missing or broken Privateer then fails the worker's tasks as an initialization error instead of a per-file one.
+    global workerValidationCacheSettings
+    workerValidationCacheSettings = validationCacheSettings
+    initialize_worker_profiling(*profilingSettings)
+    importlib.import_module("privateer.privateer_core")
+
+
+def validate_in_worker(path):
+    # Stages profiled in the worker travel back with the result.
+    fileResults = runPrivateerValidation(path, workerValidationCacheSettings)
+    return fileResults, drain_stage_events()
+
+
+def validateFilesInParallel(
+    paths,
+    jobs,
+    validationCacheSettings,
+    resultsWriter=None,
+    reportedPaths=None,
+    supervisionSettings=None,
+):
+    # reportedPaths optionally names the files in the output instead of paths, e.g. archive members staged to a temporary folder.
+    # Every worker validates one file at a time under supervision(see batch_runner.py): a file that makes Privateer abort
+    # is retried once on a fresh worker and reported as failed if it crashes again, then the batch carries on.
+    if reportedPaths is None:
+        reportedPaths = paths
+    reportedPathsByPath = dict(zip(paths, reportedPaths))
+    failedPaths = []
+    for path, outcome, failure in run_supervised_batch(
+        validate_in_worker,
+        paths,
+        jobs,
+        supervisionSettings,
+        lambda path: reportedPathsByPath[path],
+        initialize_validation_worker,
+        (validationCacheSettings, get_worker_profiling_settings()),
+    ):
+        reportedPath = reportedPathsByPath[path]
+        if failure is not None:
+            print(
+                f"Privateer failed to validate {reportedPath}: {describe_failure(failure)}"
+            )
+            failedPaths.append(reportedPath)
+            continue
+        fileResults, stageEvents = outcome
+        add_stage_events(stageEvents)
+        print_validation_outcome(
+            reportedPath,
+            relabel_validation_results(fileResults, reportedPath),
+            resultsWriter,
+        )
+    return failedPaths
+
+
+def validate_files_with_server(
+    serverURL, paths, resultsWriter=None, reportedPaths=None
+):
+    # Client side of validation_server.py, outcomes are printed in order as every batch of results comes back.
+    if reportedPaths is None:
+        reportedPaths = paths
+    failedPaths = []
+    for reportedPath, outcome in zip(
+        reportedPaths, request_validation(serverURL, paths)
+    ):
+        if outcome["error"] is not None:
+            print(f'Privateer failed to validate {reportedPath}: {outcome["error"]}')
+            failedPaths.append(reportedPath)
+        else:
+            print_validation_outcome(
+                reportedPath,
+                relabel_validation_results(outcome["result"], reportedPath),
+                resultsWriter,
+            )
+    return failedPaths
+
+
+def validate_deduplicated_files(
+    paths,
+    jobs,
+    validationCacheSettings,
+    dedupTolerance,
+    resultsWriter=None,
+    reportedPaths=None,
+    serverURL=None,
+    supervisionSettings=None,
+):
+    # Only one representative per group of near-identical conformers goes through Privateer, every member is then
+    # reported(in input order) with the results of its representative.
+    if reportedPaths is None:
+        reportedPaths = paths
+    with profile_stage("deduplication"):
+        groups = groupConformerFiles(paths, dedupTolerance)
+    print_deduplication_summary(groups, dedupTolerance)
+    pathIndices = {path: idx for idx, path in enumerate(paths)}
+    representatives = get_representatives(groups)
+    representativePaths = [group["representative"] for group in groups]
+    representativeReportedPaths = [
+        reportedPaths[pathIndices[path]] for path in representativePaths
     ]
-    path = fileResults["path"]
-    glycans = fileResults["Glycans"]
-    print(f"File path: {path}")
-    for idx, glycan in enumerate(glycans):
-        print(f'Glycans - {idx+1}/{len(glycans)}: Conversion WURCS: {glycan["WURCS"]}')
-        problematicSugars = glycan["problematicSugars"]
-        totalSugars += glycan["totalSugars"]
-        totalProblematicSugars += len(problematicSugars)
-        for sugar in problematicSugars:
-            sugarString = f'{sugar["Code"]}-{sugar["Chain"]}-{sugar["ID"]}'
-            table.add_row(
-                [
-                    sugarString,
-                    sugar["Q"],
-                    sugar["Phi"],
-                    sugar["Theta"],
-                    sugar["detectedType"],
-                    sugar["cnf"],
-                    sugar["bfac"],
-                    sugar["ctx"],
-                    sugar["diagnostic"],
-                ]
+    collectedResults = CollectedValidationResults()
+    failedRepresentatives = []
+    if serverURL is not None:
+        failedRepresentatives = validate_files_with_server(
+            serverURL,
+            representativePaths,
+            collectedResults,
+            representativeReportedPaths,
+        )
+    elif jobs > 1 or is_supervision_requested(supervisionSettings):
+        failedRepresentatives = validateFilesInParallel(
+            representativePaths,
+            jobs,
+            validationCacheSettings,
+            collectedResults,
+            representativeReportedPaths,
+            supervisionSettings,
+        )
+    else:
+        for path, reportedPath in zip(representativePaths, representativeReportedPaths):
+            fileResults = runPrivateerValidation(path, validationCacheSettings)
+            collectedResults.write(
+                reportedPath, relabel_validation_results(fileResults, reportedPath)
             )
-    print(table)
-    print(
-        f"{totalProblematicSugars}/{totalSugars} sugars in the input file have been detected as having problems.\n\n"
-    )
-
-
-parser = argparse.ArgumentParser(
-    prog="privateer_quick_validate.py",
-    usage="%(prog)s PATH.",
-    description=f"Quickly validate converted files through Privateer.",
-)
-required = parser.add_argument_group("required arguments")
-required.add_argument(
-    "-input",
-    action="store",
-    dest="user_inputPath",
-    help="Input path either directly to a single file or a root directory that contains multiple PDB files(no trailing slash should be left)",
-    required=True,
-)
-
-args = parser.parse_args()
-inputpath = args.user_inputPath
-
-currentDirectory = os.getcwd()
-completeInputPath = os.path.join(currentDirectory, inputpath)
-
-if completeInputPath[-1] == "/":
-    basePath = os.path.dirname(os.path.dirname(completeInputPath))
-else:
-    basePath = os.path.dirname(completeInputPath)
-
-if os.path.isdir(completeInputPath):
-    inputDirectory = os.path.basename(os.path.normpath(completeInputPath))
-    for root, dirs, files in os.walk(completeInputPath, topdown=False):
-        for name in files:
-            head, tail = os.path.split(root)
-            fileResults = privateerValidation(os.path.join(root, name))
-            if fileResults is not None:
-                print_privateer_validation_results(fileResults)
+    failedPaths = []
+    for path, reportedPath in zip(paths, reportedPaths):
+        representativeReportedPath = reportedPaths[pathIndices[representatives[path]]]
+        if representativeReportedPath in failedRepresentatives:
+            failedPaths.append(reportedPath)
+            if reportedPath != representativeReportedPath:
+                print(
+                    f"Privateer failed to validate {reportedPath}, same conformer as {representativeReportedPath}"
+                )
+            continue
+        print_validation_outcome(
+            reportedPath,
+            relabel_validation_results(
+                collectedResults.results[representativeReportedPath], reportedPath
+            ),
+            resultsWriter,
+        )
+    return failedPaths
+
+
+def validate_archive(
+    archivePath,
+    jobs,
+    validationCacheSettings,
+    resultsWriter=None,
+    dedupTolerance=None,
+    serverURL=None,
+    supervisionSettings=None,
+):
+    # Privateer reads from disk, so members are staged into a temporary folder but reported as <archive>/<member path>.
+    with tempfile.TemporaryDirectory(
+        prefix="privateer_quick_validate_"
+    ) as stagingDirectory:
+        stagedMembers = stage_archive_members(archivePath, stagingDirectory)
+        paths = [stagedPath for stagedPath, reportedPath in stagedMembers]
+        reportedPaths = [reportedPath for stagedPath, reportedPath in stagedMembers]
+        if dedupTolerance is not None:
+            return validate_deduplicated_files(
+                paths,
+                jobs,
+                validationCacheSettings,
+                dedupTolerance,
+                resultsWriter,
+                reportedPaths,
+                serverURL,
+                supervisionSettings,
+            ), len(paths)
+        if serverURL is not None:
+            return validate_files_with_server(
+                serverURL, paths, resultsWriter, reportedPaths
+            ), len(paths)
+        if jobs > 1 or is_supervision_requested(supervisionSettings):
+            return validateFilesInParallel(
+                paths,
+                jobs,
+                validationCacheSettings,
+                resultsWriter,
+                reportedPaths,
+                supervisionSettings,
+            ), len(paths)
+        for path, reportedPath in stagedMembers:
+            fileResults = runPrivateerValidation(path, validationCacheSettings)
+            print_validation_outcome(
+                reportedPath,
+                relabel_validation_results(fileResults, reportedPath),
+                resultsWriter,
+            )
+        return [], len(paths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="privateer_quick_validate.py",
+        usage="%(prog)s PATH.",
+        description=f"Quickly validate converted files through Privateer.",
+    )
+    required = parser.add_argument_group("required arguments")
+    required.add_argument(
+        "-input",
+        action="store",
+        dest="user_inputPath",
+        help="Input path either directly to a single file, a root directory that contains multiple PDB files(no trailing slash should be left) or a .zip/.tar(.gz/.bz2/.xz) archive of PDB files",
+        required=True,
+    )
+    parser.add_argument(
+        "-jobs",
+        action="store",
+        type=positive_int,
+        default=1,
+        dest="user_jobs",
+        help="Number of worker processes used to validate files when a directory or an archive is provided as input. Results are still printed in the order the files are found, and a file that crashes Privateer is retried once and reported instead of aborting the batch.",
+    )
+    parser.add_argument(
+        "-validation_cache",
+        action="store",
+        nargs="?",
+        default=None,
+        const=defaultValidationCachePath,
+        dest="user_validationCachePath",
+        help=f"Reuse Privateer validation results of files whose contents and Privateer version have not changed. Results are stored in an on-disk cache, '{defaultValidationCachePath}' unless another path is given.",
+    )
+    parser.add_argument(
+        "-validation_cache_size",
+        action="store",
+        type=int,
+        default=defaultValidationCacheMaxMegabytes,
+        dest="user_validationCacheSize",
+        help=f"Maximum size of the validation cache in megabytes, least recently used results are evicted first. Defaults to {defaultValidationCacheMaxMegabytes}.",
+    )
+
+    add_deduplication_arguments(parser)
+    add_server_client_arguments(parser)
+    add_supervision_arguments(parser)
+    add_validation_output_arguments(parser)
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args(argv)
+    profilingSession = start_profiling_session(args)
+    inputpath = args.user_inputPath
+    resultsWriter = make_validation_results_writer(args)
+
+    supervisionSettings = get_supervision_settings(args)
+    validationCacheSettings = None
+    if args.user_validationCachePath is not None:
+        validationCacheSettings = {
+            "path": args.user_validationCachePath,
+            "maxMegabytes": args.user_validationCacheSize,
+        }
+
+    currentDirectory = os.getcwd()
+    completeInputPath = os.path.join(currentDirectory, inputpath)
+
+    if completeInputPath[-1] == "/":
+        basePath = os.path.dirname(os.path.dirname(completeInputPath))
+    else:
+        basePath = os.path.dirname(completeInputPath)
+
+    failedPaths = []
+    if os.path.isfile(completeInputPath) and is_archive_path(completeInputPath):
+        failedPaths, numberOfPaths = validate_archive(
+            completeInputPath,
+            args.user_jobs,
+            validationCacheSettings,
+            resultsWriter,
+            args.user_dedupTolerance,
+            args.user_serverURL,
+            supervisionSettings,
+        )
+        if len(failedPaths):
+            print(f"{len(failedPaths)}/{numberOfPaths} files could not be validated:")
+            for path in failedPaths:
+                print(f"\t{path}")
+    elif os.path.isdir(completeInputPath):
+        inputDirectory = os.path.basename(os.path.normpath(completeInputPath))
+        if (
+            args.user_jobs > 1
+            or args.user_dedupTolerance is not None
+            or args.user_serverURL is not None
+            or is_supervision_requested(supervisionSettings)
+        ):
+            paths = []
+            for root, dirs, files in os.walk(completeInputPath, topdown=False):
+                for name in files:
+                    paths.append(os.path.join(root, name))
+            if args.user_dedupTolerance is not None:
+                failedPaths = validate_deduplicated_files(
+                    paths,
+                    args.user_jobs,
+                    validationCacheSettings,
+                    args.user_dedupTolerance,
+                    resultsWriter,
+                    serverURL=args.user_serverURL,
+                    supervisionSettings=supervisionSettings,
+                )
+            elif args.user_serverURL is not None:
+                failedPaths = validate_files_with_server(
+                    args.user_serverURL, paths, resultsWriter
+                )
             else:
-                print(f"Privateer detected no issues in: {os.path.join(root, name)}")
-elif os.path.isdir(completeInputPath) is False:
-    fileResults = privateerValidation(completeInputPath)
-    if fileResults is not None:
-        print_privateer_validation_results(fileResults)
+                failedPaths = validateFilesInParallel(
+                    paths,
+                    args.user_jobs,
+                    validationCacheSettings,
+                    resultsWriter,
+                    supervisionSettings=supervisionSettings,
+                )
+            if len(failedPaths):
+                print(f"{len(failedPaths)}/{len(paths)} files could not be validated:")
+                for path in failedPaths:
+                    print(f"\t{path}")
+        else:
+            for root, dirs, files in os.walk(completeInputPath, topdown=False):
+                for name in files:
+                    head, tail = os.path.split(root)
+                    fileResults = runPrivateerValidation(
+                        os.path.join(root, name), validationCacheSettings
+                    )
+                    print_validation_outcome(
+                        os.path.join(root, name), fileResults, resultsWriter
+                    )
+    elif args.user_serverURL is not None and os.path.isdir(completeInputPath) is False:
+        failedPaths = validate_files_with_server(
+            args.user_serverURL, [completeInputPath], resultsWriter
+        )
+    elif is_supervision_requested(supervisionSettings) and (
+        os.path.isdir(completeInputPath) is False
+    ):
+        failedPaths = validateFilesInParallel(
+            [completeInputPath],
+            1,
+            validationCacheSettings,
+            resultsWriter,
+            supervisionSettings=supervisionSettings,
+        )
+    elif os.path.isdir(completeInputPath) is False:
+        fileResults = runPrivateerValidation(completeInputPath, validationCacheSettings)
+        print_validation_outcome(completeInputPath, fileResults, resultsWriter)
     else:
-        print(f"Privateer detected no issues in: {completeInputPath}")
-else:
-    raise ValueError(
-        f"Unable to determine whether {completeInputPath} is a file or a directory!"
-    )
+        raise ValueError(
+            f"Unable to determine whether {completeInputPath} is a file or a directory!"
+        )
+
+    if resultsWriter is not None:
+        resultsWriter.close()
+    stop_profiling_session(profilingSession)
+    if len(failedPaths):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
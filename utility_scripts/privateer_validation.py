@@ -0,0 +1,139 @@
+try:
+    from .validation_cache import cachedPrivateerValidation
+    from .profiling import profile_stage
+except ImportError:
+    from validation_cache import cachedPrivateerValidation
+    from profiling import profile_stage
+
+# Privateer validation of a single structure, shared by glycam2pdb.py, privateer_quick_validate.py and validation_server.py.
+# privateerValidation returns None when every sugar is fine, otherwise the problematic sugars of every glycan.
+
+
+def privateerValidation(path):
+    from privateer import privateer_core as pvtcore
+
+    with profile_stage("privateer parsing"):
+        glycosylation = pvtcore.GlycosylationComposition_memsafe(path)
+        numGlycans = glycosylation.get_number_of_glycan_chains_detected()
+    with profile_stage("privateer sugar queries"):
+        outputList = query_problematic_sugars(glycosylation, numGlycans)
+
+    if len(outputList):
+        return {"path": path, "Glycans": outputList}
+    else:
+        return None
+
+
+def query_problematic_sugars(glycosylation, numGlycans):
+    outputList = []
+    for glycanIndex in range(numGlycans):
+        glycanList = []
+        glycan = glycosylation.get_glycan(glycanIndex)
+        glycanWURCS = glycan.get_wurcs_notation()
+        numSugars = glycan.get_total_number_of_sugars()
+        for sugarIndex in range(numSugars):
+            sugar = glycan.get_monosaccharide(sugarIndex)
+            sugarPDBCode = sugar.get_name_short()
+            sugarPDBChain = sugar.get_sugar_chain_id()
+            sugarPDBID = int(sugar.get_sugar_pdb_id())
+            sugarCremerPople = sugar.get_cremer_pople_params()
+            puckeringAmplitude = sugarCremerPople[0]
+            Phi = sugarCremerPople[1]
+            Theta = sugarCremerPople[2]
+            sugarType = sugar.get_denomination()
+            sugarConformation = sugar.get_conformation_name()
+            sugarBFac = sugar.get_bfactor()
+            sugarCtx = sugar.get_glycosylation_type()
+            sugarPrivateerDiagnostic = sugar.get_privateer_diagnostic()
+            if sugarConformation != "4c1" or sugarPrivateerDiagnostic != "yes":
+                glycanList.append(
+                    {
+                        "Code": sugarPDBCode,
+                        "Chain": sugarPDBChain,
+                        "ID": sugarPDBID,
+                        "Q": puckeringAmplitude,
+                        "Phi": Phi,
+                        "Theta": Theta,
+                        "detectedType": sugarType,
+                        "cnf": sugarConformation,
+                        "bfac": sugarBFac,
+                        "ctx": sugarCtx,
+                        "diagnostic": sugarPrivateerDiagnostic,
+                    }
+                )
+        if len(glycanList):
+            sortedList = sorted(glycanList, key=lambda k: k["ID"])
+            outputDict = {
+                "WURCS": glycanWURCS,
+                "totalSugars": numSugars,
+                "problematicSugars": sortedList,
+            }
+            outputList.append(outputDict)
+    return outputList
+
+
+def runPrivateerValidation(path, validationCacheSettings=None):
+    with profile_stage("validation"):
+        if validationCacheSettings is None:
+            return privateerValidation(path)
+        return cachedPrivateerValidation(
+            path,
+            privateerValidation,
+            validationCacheSettings["path"],
+            validationCacheSettings["maxMegabytes"],
+        )
+
+
+def print_validation_outcome(path, fileResults, resultsWriter=None):
+    if resultsWriter is not None:
+        resultsWriter.write(path, fileResults)
+    elif fileResults is not None:
+        print_privateer_validation_results(fileResults)
+    else:
+        print(f"Privateer detected no issues in: {path}")
+
+
+def print_privateer_validation_results(fileResults):
+    totalSugars = 0
+    totalProblematicSugars = 0
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = [
+        "Sugar",
+        "Q",
+        "Phi",
+        "Theta",
+        "Detected type",
+        "Cnf",
+        "<Bfac>",
+        "Ctx",
+        "Ok?",
+    ]
+    path = fileResults["path"]
+    glycans = fileResults["Glycans"]
+    print(f"File path: {path}")
+    for idx, glycan in enumerate(glycans):
+        print(f'Glycans - {idx+1}/{len(glycans)}: Conversion WURCS: {glycan["WURCS"]}')
+        problematicSugars = glycan["problematicSugars"]
+        totalSugars += glycan["totalSugars"]
+        totalProblematicSugars += len(problematicSugars)
+        for sugar in problematicSugars:
+            sugarString = f'{sugar["Code"]}-{sugar["Chain"]}-{sugar["ID"]}'
+            table.add_row(
+                [
+                    sugarString,
+                    sugar["Q"],
+                    sugar["Phi"],
+                    sugar["Theta"],
+                    sugar["detectedType"],
+                    sugar["cnf"],
+                    sugar["bfac"],
+                    sugar["ctx"],
+                    sugar["diagnostic"],
+                ]
+            )
+    print(table)
+    print(
+        f"{totalProblematicSugars}/{totalSugars} sugars in the input file have been detected as having problems.\n\n"
+    )
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# Per-stage wall-clock, CPU time and tracemalloc peak instrumentation shared by the command line scripts.
+# Code marks its stages with `with profile_stage("convert"):`, which does nothing unless -profile was given.
+# Stages recorded in worker processes are sent back with the worker results and merged into the main process,
+# so the summary printed at the end covers the whole run. A cProfile dump and a Chrome trace(chrome://tracing,
+# https://ui.perfetto.dev) can optionally be written as well.
+
+profiler = None
+
+
+class StageProfiler:
+    def __init__(self, traceMemory=True):
+        self.traceMemory = traceMemory
+        self.events = []
+        self.stack = []
+        if traceMemory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.traceMemory:
+            import tracemalloc
+
+            # Peaks are tracked per stage, so the peak reached so far by the enclosing stage is saved before resetting it.
+            currentMemory, peakMemory = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peakMemory)
+            tracemalloc.reset_peak()
+        else:
+            currentMemory = 0
+        frame = {
+            "name": name,
+            "start": time.perf_counter_ns(),
+            "cpuStart": time.process_time_ns(),
+            "memoryStart": currentMemory,
+            "peak": 0,
+        }
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            if self.traceMemory:
+                peakMemory = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                if self.stack:
+                    self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peakMemory)
+            else:
+                peakMemory = 0
+            self.events.append(
+                {
+                    "name": name,
+                    "start": frame["start"],
+                    "wall": time.perf_counter_ns() - frame["start"],
+                    "cpu": time.process_time_ns() - frame["cpuStart"],
+                    "peakMemory": max(peakMemory - frame["memoryStart"], 0),
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+    def drain_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def add_events(self, events):
+        self.events.extend(events)
+
+
+def enable_profiling(traceMemory=True):
+    global profiler
+    profiler = StageProfiler(traceMemory)
+    return profiler
+
+
+def profile_stage(name):
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+def is_profiling():
+    return profiler is not None
+
+
+def get_worker_profiling_settings():
+    # Arguments for initialize_worker_profiling that reproduce the profiling mode of this process in its workers.
+    if profiler is None:
+        return (False, False)
+    return (True, profiler.traceMemory)
+
+
+def initialize_worker_profiling(enabled, traceMemory=True):
+    # Pool initializer. Forked workers inherit the main process profiler, which has to be replaced by a fresh one.
+    global profiler
+    profiler = StageProfiler(traceMemory) if enabled else None
+
+
+def drain_stage_events():
+    # Returns the stages recorded since the last call, to be sent back to the main process with a worker result.
+    if profiler is None:
+        return []
+    return profiler.drain_events()
+
+
+def add_stage_events(events):
+    if profiler is not None and events:
+        profiler.add_events(events)
+
+
+def summarize_stage_events(events):
+    summary = {}
+    for event in events:
+        stageSummary = summary.setdefault(
+            event["name"], {"calls": 0, "wall": 0, "cpu": 0, "peakMemory": 0}
+        )
+        stageSummary["calls"] += 1
+        stageSummary["wall"] += event["wall"]
+        stageSummary["cpu"] += event["cpu"]
+        stageSummary["peakMemory"] = max(
+            stageSummary["peakMemory"], event["peakMemory"]
+        )
+    return summary
+
+
+def print_stage_summary(events, traceMemory=True, file=None):
+    file = file if file is not None else sys.stderr
+    summary = summarize_stage_events(events)
+    if not summary:
+        print("No profiled stages were run.", file=file)
+        return
+    header = f'{"Stage":<28} {"Calls":>7} {"Wall s":>10} {"CPU s":>10} {"Mean ms":>10}'
+    if traceMemory:
+        header += f' {"Peak MB":>9}'
+    print(
+        "\nPer-stage profile(stages can be nested, worker stages are summed):",
+        file=file,
+    )
+    print(header, file=file)
+    for name, stageSummary in sorted(
+        summary.items(), key=lambda item: item[1]["wall"], reverse=True
+    ):
+        line = f'{name:<28} {stageSummary["calls"]:>7} {stageSummary["wall"] / 1e9:>10.3f} {stageSummary["cpu"] / 1e9:>10.3f} {stageSummary["wall"] / stageSummary["calls"] / 1e6:>10.2f}'
+        if traceMemory:
+            line += f' {stageSummary["peakMemory"] / (1024 * 1024):>9.2f}'
+        print(line, file=file)
+
+
+def write_chrome_trace(events, tracePath):
+    traceEvents = [
+        {
+            "name": event["name"],
+            "ph": "X",
+            "ts": event["start"] / 1000,
+            "dur": event["wall"] / 1000,
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": {
+                "cpuMilliseconds": event["cpu"] / 1e6,
+                "peakMemoryBytes": event["peakMemory"],
+            },
+        }
+        for event in events
+    ]
+    with open(tracePath, "w") as traceFile:
+        json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, traceFile)
+
+
+def add_profiling_arguments(parser):
+    parser.add_argument(
+        "-profile",
+        "--profile",
+        action="store_true",
+        default=False,
+        dest="user_profile",
+        help="Time every stage(wall clock and CPU) and track its tracemalloc peak, then print a per-stage breakdown to stderr at the end.",
+    )
+    parser.add_argument(
+        "-profile_no_memory",
+        action="store_true",
+        default=False,
+        dest="user_profileNoMemory",
+        help="With -profile, skip tracemalloc, which slows Python code down noticeably.",
+    )
+    parser.add_argument(
+        "-profile_cprofile",
+        action="store",
+        default=None,
+        dest="user_cProfilePath",
+        help="With -profile, also write a cProfile dump of the main process to this path(inspect with 'python -m pstats' or snakeviz). Work done in worker processes only shows up in the per-stage summary.",
+    )
+    parser.add_argument(
+        "-profile_trace",
+        action="store",
+        default=None,
+        dest="user_tracePath",
+        help="With -profile, also write every recorded stage as Chrome trace JSON to this path, viewable in chrome://tracing or Perfetto.",
+    )
+
+
+def start_profiling_session(args):
+    # Returns None unless -profile was given, in which case stages are recorded until stop_profiling_session.
+    if not args.user_profile:
+        return None
+    session = {
+        "profiler": enable_profiling(not args.user_profileNoMemory),
+        "cProfile": None,
+        "cProfilePath": args.user_cProfilePath,
+        "tracePath": args.user_tracePath,
+    }
+    if args.user_cProfilePath is not None:
+        import cProfile
+
+        session["cProfile"] = cProfile.Profile()
+        session["cProfile"].enable()
+    return session
+
+
+def stop_profiling_session(session):
+    global profiler
+    if session is None:
+        return
+    if session["cProfile"] is not None:
+        session["cProfile"].disable()
+        session["cProfile"].dump_stats(session["cProfilePath"])
+    events = session["profiler"].events
+    print_stage_summary(events, session["profiler"].traceMemory)
+    if session["cProfilePath"] is not None:
+        print(f'cProfile dump written to {session["cProfilePath"]}', file=sys.stderr)
+    if session["tracePath"] is not None:
+        write_chrome_trace(events, session["tracePath"])
+        print(f'Chrome trace written to {session["tracePath"]}', file=sys.stderr)
+    if session["profiler"].traceMemory:
+        import tracemalloc
+
+        tracemalloc.stop()
+    profiler = None
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import functools
+import importlib.util
+from importlib import metadata
+
+# On-disk cache of privateerValidation results, shared by glycam2pdb.py and privateer_quick_validate.py.
+# Results are keyed by the SHA-256 of the validated file and the installed Privateer version,
+# so a cached entry is reused only when neither the structure nor Privateer itself has changed.
+
+defaultValidationCachePath = os.path.join(
+    os.path.expanduser("~"), ".cache", "project_alliance", "privateer_validation.sqlite"
+)
+defaultValidationCacheMaxMegabytes = 256
+
+# Bump whenever the records extracted by privateerValidation change shape.
+VALIDATION_RECORD_VERSION = "1"
+
+
+def hash_file_contents(path):
+    fileHash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_privateer_version():
+    # Returns None when the installed Privateer cannot be identified, cached results are then neither read nor written.
+    try:
+        return metadata.version("privateer")
+    except metadata.PackageNotFoundError:
+        pass
+    try:
+        import privateer
+    except ImportError:
+        return None
+    if getattr(privateer, "__version__", None):
+        return privateer.__version__
+    # Builds from source often carry no version at all, so fall back to the contents of the compiled extension.
+    try:
+        privateerCoreSpec = importlib.util.find_spec("privateer.privateer_core")
+    except (ImportError, ValueError):
+        return None
+    if privateerCoreSpec is None or not privateerCoreSpec.has_location:
+        return None
+    try:
+        return "privateer_core-" + hash_file_contents(privateerCoreSpec.origin)
+    except OSError:
+        return None
+
+
+def open_validation_cache(cachePath):
+    cacheDirectory = os.path.dirname(cachePath)
+    if cacheDirectory and not os.path.exists(cacheDirectory):
+        os.makedirs(cacheDirectory, exist_ok=True)
+    connection = sqlite3.connect(cachePath, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS validation_results ("
+        "content_hash TEXT NOT NULL, "
+        "privateer_version TEXT NOT NULL, "
+        "result TEXT NOT NULL, "
+        "size INTEGER NOT NULL, "
+        "last_access REAL NOT NULL, "
+        "PRIMARY KEY (content_hash, privateer_version))"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS validation_results_last_access "
+        "ON validation_results (last_access)"
+    )
+    return connection
+
+
+def lookup_validation_result(connection, contentHash, privateerVersion):
+    # Returns (True, result) on a cache hit and (False, None) on a miss. A cached result can itself be None,
+    # which means Privateer detected no issues in the file.
+    row = connection.execute(
+        "SELECT result FROM validation_results WHERE content_hash = ? AND privateer_version = ?",
+        (contentHash, privateerVersion),
+    ).fetchone()
+    if row is None:
+        return False, None
+    with connection:
+        connection.execute(
+            "UPDATE validation_results SET last_access = ? WHERE content_hash = ? AND privateer_version = ?",
+            (time.time(), contentHash, privateerVersion),
+        )
+    return True, json.loads(row[0])
+
+
+def store_validation_result(
+    connection, contentHash, privateerVersion, fileResults, maxBytes
+):
+    if fileResults is not None:
+        fileResults = {
+            key: value for key, value in fileResults.items() if key != "path"
+        }
+    serializedResult = json.dumps(fileResults)
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO validation_results VALUES (?, ?, ?, ?, ?)",
+            (
+                contentHash,
+                privateerVersion,
+                serializedResult,
+                len(serializedResult),
+                time.time(),
+            ),
+        )
+        evict_least_recently_used(connection, maxBytes)
+
+
+def evict_least_recently_used(connection, maxBytes):
+    totalBytes = connection.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM validation_results"
+    ).fetchone()[0]
+    if totalBytes <= maxBytes:
+        return
+    evictedRows = []
+    for contentHash, privateerVersion, size in connection.execute(
+        "SELECT content_hash, privateer_version, size FROM validation_results ORDER BY last_access"
+    ):
+        if totalBytes <= maxBytes:
+            break
+        evictedRows.append((contentHash, privateerVersion))
+        totalBytes -= size
+    connection.executemany(
+        "DELETE FROM validation_results WHERE content_hash = ? AND privateer_version = ?",
+        evictedRows,
+    )
+
+
+def cachedPrivateerValidation(
+    path,
+    privateerValidation,
+    cachePath,
+    maxMegabytes=defaultValidationCacheMaxMegabytes,
+):
+    # Drop-in replacement for privateerValidation(path). Only files whose contents are not in the cache are validated.
+    if get_privateer_version() is None:
+        return privateerValidation(path)
+    privateerVersion = VALIDATION_RECORD_VERSION + ":" + get_privateer_version()
+    contentHash = hash_file_contents(path)
+    connection = open_validation_cache(cachePath)
+    try:
+        cacheHit, fileResults = lookup_validation_result(
+            connection, contentHash, privateerVersion
+        )
+        if not cacheHit:
+            fileResults = privateerValidation(path)
+            store_validation_result(
+                connection,
+                contentHash,
+                privateerVersion,
+                fileResults,
+                maxMegabytes * 1024 * 1024,
+            )
+    finally:
+        connection.close()
+    if fileResults is not None:
+        fileResults = {"path": path, **fileResults}
+    return fileResults
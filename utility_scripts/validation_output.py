@@ -0,0 +1,189 @@
+import io
+import os
+import sys
+import json
+
+# Machine readable output of privateerValidation results, shared by glycam2pdb.py and privateer_quick_validate.py.
+# Records are appended to a JSONL file as soon as each file has been validated, optionally alongside a columnar
+# NumPy .npz dump with one array per sugar field. NumPy is only imported when an .npz output is requested.
+# Every validated file is listed: a file without problematic sugars gets a single {"path", "problematic": []} record, so
+# files that validated clean can be told apart from files that were never validated.
+
+sugarFields = [
+    "Code",
+    "Chain",
+    "ID",
+    "Q",
+    "Phi",
+    "Theta",
+    "detectedType",
+    "cnf",
+    "bfac",
+    "ctx",
+    "diagnostic",
+]
+recordGranularities = ["sugar", "glycan", "file"]
+
+
+def make_file_record(path, fileResults):
+    problematic = []
+    totalSugars = None
+    if fileResults is not None:
+        totalSugars = 0
+        for glycanIndex, glycan in enumerate(fileResults["Glycans"]):
+            totalSugars += glycan["totalSugars"]
+            for sugar in glycan["problematicSugars"]:
+                problematic.append(
+                    {"glycanIndex": glycanIndex, "WURCS": glycan["WURCS"], **sugar}
+                )
+    return {"path": path, "totalSugars": totalSugars, "problematic": problematic}
+
+
+def iterate_validation_records(path, fileResults, granularity):
+    if granularity == "file":
+        yield make_file_record(path, fileResults)
+        return
+    if fileResults is None:
+        return
+    for glycanIndex, glycan in enumerate(fileResults["Glycans"]):
+        glycanRecord = {
+            "path": path,
+            "glycanIndex": glycanIndex,
+            "WURCS": glycan["WURCS"],
+            "totalSugars": glycan["totalSugars"],
+        }
+        if granularity == "glycan":
+            glycanRecord["problematicSugars"] = glycan["problematicSugars"]
+            yield glycanRecord
+        else:
+            for sugar in glycan["problematicSugars"]:
+                yield {**glycanRecord, **sugar}
+
+
+class ValidationResultsWriter:
+    def __init__(self, jsonlPath=None, granularity="sugar", columnarPath=None):
+        if granularity not in recordGranularities:
+            raise ValueError(
+                f"Unknown record granularity '{granularity}', expected one of {recordGranularities}"
+            )
+        self.granularity = granularity
+        self.columnarPath = columnarPath
+        self.numberOfRecords = 0
+        self.numberOfFiles = 0
+        self.columns = {
+            field: []
+            for field in ["path", "glycanIndex", "WURCS", "totalSugars"] + sugarFields
+        }
+        self.savedStdout = None
+        self.savedStdoutDescriptor = None
+        if jsonlPath is None:
+            self.jsonlFile = None
+        elif jsonlPath == "-":
+            self.jsonlFile = self.take_over_stdout()
+        else:
+            self.jsonlFile = open(jsonlPath, "w")
+        if columnarPath is not None:
+            # Fail early rather than after the whole batch has been validated.
+            try:
+                import numpy
+            except ImportError:
+                raise ImportError(".npz output requires numpy to be installed")
+
+    def take_over_stdout(self):
+        # With '-jsonl -', stdout carries nothing but the records. Everything else the scripts print(conversion logs,
+        # summaries) and whatever Privateer prints from C++ goes to stderr: file descriptor 1 is pointed at stderr, which
+        # worker processes inherit, and the records are written to a duplicate of the original stdout.
+        sys.stdout.flush()
+        try:
+            stdoutDescriptor = sys.stdout.fileno()
+            stderrDescriptor = sys.stderr.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            # stdout is not a real file(e.g. captured), only Python level output can be moved.
+            self.savedStdout = sys.stdout
+            sys.stdout = sys.stderr
+            return self.savedStdout
+        self.savedStdoutDescriptor = os.dup(stdoutDescriptor)
+        os.dup2(stderrDescriptor, stdoutDescriptor)
+        return os.fdopen(os.dup(self.savedStdoutDescriptor), "w")
+
+    def restore_stdout(self):
+        sys.stdout.flush()
+        if self.savedStdoutDescriptor is not None:
+            os.dup2(self.savedStdoutDescriptor, sys.stdout.fileno())
+            os.close(self.savedStdoutDescriptor)
+            self.savedStdoutDescriptor = None
+        if self.savedStdout is not None:
+            sys.stdout = self.savedStdout
+            self.savedStdout = None
+
+    def write(self, path, fileResults):
+        self.numberOfFiles += 1
+        records = list(iterate_validation_records(path, fileResults, self.granularity))
+        if not len(records):
+            records = [make_file_record(path, fileResults)]
+        for record in records:
+            self.numberOfRecords += 1
+            if self.jsonlFile is not None:
+                self.jsonlFile.write(json.dumps(record) + "\n")
+        if self.jsonlFile is not None:
+            self.jsonlFile.flush()
+        if self.columnarPath is not None:
+            for sugarRecord in iterate_validation_records(path, fileResults, "sugar"):
+                for field, column in self.columns.items():
+                    column.append(sugarRecord[field])
+
+    def close(self):
+        if self.jsonlFile is not None and self.savedStdout is None:
+            self.jsonlFile.close()
+        self.jsonlFile = None
+        self.restore_stdout()
+        if self.columnarPath is not None:
+            import numpy
+
+            numpy.savez_compressed(
+                self.columnarPath,
+                **{
+                    field: numpy.asarray(column)
+                    for field, column in self.columns.items()
+                },
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+
+def add_validation_output_arguments(parser):
+    parser.add_argument(
+        "-jsonl",
+        action="store",
+        default=None,
+        dest="user_jsonlPath",
+        help="Write validation results as JSON lines to this path('-' for stdout, in which case everything else is printed to stderr) as soon as each file is validated, instead of printing tables.",
+    )
+    parser.add_argument(
+        "-jsonl_records",
+        action="store",
+        default="sugar",
+        choices=recordGranularities,
+        dest="user_jsonlGranularity",
+        help="Write one JSONL record per problematic sugar(default), one per glycan or one per file(with a 'problematic' list of its sugars). Files without problematic sugars always get a record with an empty 'problematic' list.",
+    )
+    parser.add_argument(
+        "-npz",
+        action="store",
+        default=None,
+        dest="user_npzPath",
+        help="Additionally dump all problematic sugar records into a columnar NumPy .npz file(one array per field) at the end of the run. Requires numpy.",
+    )
+
+
+def make_validation_results_writer(args):
+    # Returns None when no structured output was requested, in which case the scripts print PrettyTable summaries.
+    if args.user_jsonlPath is None and args.user_npzPath is None:
+        return None
+    return ValidationResultsWriter(
+        args.user_jsonlPath, args.user_jsonlGranularity, args.user_npzPath
+    )
@@ -0,0 +1,379 @@
+import os
+import sys
+import json
+import signal
+import argparse
+import importlib
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Long running local Privateer validation service, so that many small validation requests(e.g. from a workflow engine)
+# do not each pay for starting Python and importing privateer_core. The server keeps a pool of worker processes with
+# Privateer loaded and answers JSON requests on localhost:
+#   GET  /health    -> {"status": "ok", "privateerVersion": ..., "workers": ...}
+#   POST /validate  <- {"paths": [path, ...], "structures": [{"name": ..., "contents": PDB or mmCIF text}, ...]}
+#                   -> {"results": [{"path": ..., "result": privateerValidation record or null, "error": ...}, ...]}
+# Results come back in request order, paths first. Files of concurrent requests are spread over the same worker pool.
+# privateer_quick_validate.py -server URL is the client, request_validation below can be used from any script.
+# Privateer is only imported in the worker processes of the server.
+
+defaultServerHost = "127.0.0.1"
+defaultServerPort = 8765
+SERVER_REQUEST_BATCH_SIZE = 64
+mmCIFSuffixes = (".cif", ".mmcif")
+
+workerValidationCacheSettings = None
+
+
+def initialize_server_worker(validationCacheSettings):
+    global workerValidationCacheSettings
+    workerValidationCacheSettings = validationCacheSettings
+    # Ctrl+C reaches the whole process group, shutting the workers down is left to the server.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    importlib.import_module("privateer.privateer_core")
+
+
+def warm_up_worker(index):
+    return os.getpid()
+
+
+def validate_server_item(item):
+    # item is ("path", path) or ("structure", name, contents). Privateer only reads from disk, so structures sent as text
+    # are written to a temporary file first and reported under their own name.
+    try:
+        from .privateer_validation import runPrivateerValidation
+        from .archive_io import relabel_validation_results
+    except ImportError:
+        from privateer_validation import runPrivateerValidation
+        from archive_io import relabel_validation_results
+
+    if item[0] == "path":
+        return runPrivateerValidation(item[1], workerValidationCacheSettings)
+    name, contents = item[1], item[2]
+    suffix = ".mmcif" if name.lower().endswith(mmCIFSuffixes) else ".pdb"
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=suffix, prefix="validation_server_", delete=False
+    ) as structureFile:
+        structureFile.write(contents)
+    try:
+        fileResults = runPrivateerValidation(
+            structureFile.name, workerValidationCacheSettings
+        )
+    finally:
+        os.remove(structureFile.name)
+    return relabel_validation_results(fileResults, name)
+
+
+class ValidationService:
+    def __init__(self, jobs=1, validationCacheSettings=None):
+        self.jobs = jobs
+        self.validationCacheSettings = validationCacheSettings
+        self.lock = threading.Lock()
+        self.executor = None
+        self.start_workers()
+
+    def start_workers(self):
+        # Workers are started(and Privateer imported) before any request comes in.
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=initialize_server_worker,
+            initargs=(self.validationCacheSettings,),
+        )
+        list(self.executor.map(warm_up_worker, range(self.jobs)))
+
+    def get_executor(self):
+        with self.lock:
+            return self.executor
+
+    def restart_broken_workers(self, brokenExecutor):
+        # Requests that were in flight when a worker crashed see the same broken executor, only the first one replaces it.
+        with self.lock:
+            if self.executor is brokenExecutor:
+                brokenExecutor.shutdown(wait=False, cancel_futures=True)
+                self.start_workers()
+
+    def get_outcome(self, item, future):
+        try:
+            return {"path": item[1], "result": future.result(), "error": None}
+        except BrokenProcessPool:
+            raise
+        except Exception as exception:
+            return {
+                "path": item[1],
+                "result": None,
+                "error": f"{type(exception).__name__}: {exception}",
+            }
+
+    def validate(self, items):
+        # Every request keeps at most `jobs` files in flight on the shared pool, and when a
+        # native crash breaks the pool those files are retried one at a time on the restarted workers.
+        outcomes = [None] * len(items)
+        suspectIndices = []
+        inFlight = {}
+        nextIndexToSubmit = 0
+        executor = self.get_executor()
+        while nextIndexToSubmit < len(items) or inFlight:
+            while nextIndexToSubmit < len(items) and len(inFlight) < self.jobs:
+                try:
+                    future = executor.submit(
+                        validate_server_item, items[nextIndexToSubmit]
+                    )
+                    inFlight[future] = nextIndexToSubmit
+                except BrokenProcessPool:
+                    # Broken by a crash in another request, picked up by the retries below.
+                    suspectIndices.append(nextIndexToSubmit)
+                nextIndexToSubmit += 1
+            done, notDone = concurrent.futures.wait(
+                inFlight, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            poolBroken = False
+            for future in done:
+                index = inFlight.pop(future)
+                try:
+                    outcomes[index] = self.get_outcome(items[index], future)
+                except BrokenProcessPool:
+                    suspectIndices.append(index)
+                    poolBroken = True
+            if poolBroken:
+                self.restart_broken_workers(executor)
+                executor = self.get_executor()
+        for index in sorted(suspectIndices):
+            executor = self.get_executor()
+            try:
+                outcomes[index] = self.get_outcome(
+                    items[index], executor.submit(validate_server_item, items[index])
+                )
+            except BrokenProcessPool:
+                outcomes[index] = {
+                    "path": items[index][1],
+                    "result": None,
+                    "error": "worker crashed twice (BrokenProcessPool)",
+                }
+                self.restart_broken_workers(executor)
+        return outcomes
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_validation_request(request):
+    items = []
+    for path in request.get("paths", []):
+        if not isinstance(path, str):
+            raise ValueError("'paths' has to be a list of file paths")
+        items.append(("path", path))
+    for structure in request.get("structures", []):
+        if not isinstance(structure, dict) or not isinstance(
+            structure.get("contents"), str
+        ):
+            raise ValueError(
+                "'structures' has to be a list of {'name': ..., 'contents': ...} objects"
+            )
+        items.append(
+            ("structure", structure.get("name", "structure.pdb"), structure["contents"])
+        )
+    return items
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+        try:
+            from .validation_cache import get_privateer_version
+        except ImportError:
+            from validation_cache import get_privateer_version
+
+        self.send_json(
+            200,
+            {
+                "status": "ok",
+                "privateerVersion": get_privateer_version(),
+                "workers": self.server.validationService.jobs,
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/validate":
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+        try:
+            contentLength = int(self.headers.get("Content-Length", 0))
+            items = parse_validation_request(
+                json.loads(self.rfile.read(contentLength) or b"{}")
+            )
+        except (ValueError, AttributeError) as exception:
+            self.send_json(400, {"error": f"Malformed request: {exception}"})
+            return
+        self.send_json(200, {"results": self.server.validationService.validate(items)})
+
+    def log_message(self, format, *args):
+        if self.server.verbose is True:
+            super().log_message(format, *args)
+
+
+def serve_validation_requests(
+    host=defaultServerHost,
+    port=defaultServerPort,
+    jobs=1,
+    validationCacheSettings=None,
+    verbose=False,
+):
+    validationService = ValidationService(jobs, validationCacheSettings)
+    server = ThreadingHTTPServer((host, port), ValidationRequestHandler)
+    server.daemon_threads = True
+    server.validationService = validationService
+    server.verbose = verbose
+    print(
+        f"Privateer validation server with {jobs} workers listening on http://{host}:{server.server_port}",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        validationService.close()
+
+
+# Client
+def post_validation_request(serverURL, request):
+    httpRequest = urllib.request.Request(
+        serverURL.rstrip("/") + "/validate",
+        data=json.dumps(request).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(httpRequest) as response:
+            return json.loads(response.read())["results"]
+    except urllib.error.HTTPError as exception:
+        raise RuntimeError(
+            f"Validation server at {serverURL} rejected the request: {exception.read().decode('utf-8', 'replace')}"
+        )
+    except urllib.error.URLError as exception:
+        raise ConnectionError(
+            f"Unable to reach the validation server at {serverURL}: {exception.reason}"
+        )
+
+
+def request_validation(serverURL, paths, batchSize=SERVER_REQUEST_BATCH_SIZE):
+    # Yields the server results of paths in order. Paths are sent batchSize at a time, so results of a large folder
+    # are reported as they come in. Relative paths are resolved here, the server runs in its own working directory.
+    for batchStart in range(0, len(paths), batchSize):
+        batch = [
+            os.path.abspath(path) for path in paths[batchStart : batchStart + batchSize]
+        ]
+        yield from post_validation_request(serverURL, {"paths": batch})
+
+
+def add_server_client_arguments(parser):
+    parser.add_argument(
+        "-server",
+        action="store",
+        default=None,
+        dest="user_serverURL",
+        help=f"Send files to a running validation server(python validation_server.py) at this URL, e.g. http://{defaultServerHost}:{defaultServerPort}, instead of importing Privateer in this process. The server's own -validation_cache and -jobs settings apply.",
+    )
+
+
+def main(argv=None):
+    try:
+        from .validation_cache import (
+            defaultValidationCachePath,
+            defaultValidationCacheMaxMegabytes,
+        )
+        from .batch_runner import positive_int
+    except ImportError:
+        from validation_cache import (
+            defaultValidationCachePath,
+            defaultValidationCacheMaxMegabytes,
+        )
+        from batch_runner import positive_int
+
+    parser = argparse.ArgumentParser(
+        prog="validation_server.py",
+        usage="%(prog)s [options].",
+        description="Keep Privateer loaded in a pool of worker processes and validate files sent over HTTP on localhost.",
+    )
+    parser.add_argument(
+        "-host",
+        action="store",
+        default=defaultServerHost,
+        dest="user_host",
+        help=f"Address to listen on. Defaults to {defaultServerHost}, the server has no authentication and should not be exposed beyond the local machine.",
+    )
+    parser.add_argument(
+        "-port",
+        action="store",
+        type=int,
+        default=defaultServerPort,
+        dest="user_port",
+        help=f"Port to listen on. Defaults to {defaultServerPort}.",
+    )
+    parser.add_argument(
+        "-jobs",
+        action="store",
+        type=positive_int,
+        default=1,
+        dest="user_jobs",
+        help="Number of warm Privateer worker processes shared by all requests.",
+    )
+    parser.add_argument(
+        "-validation_cache",
+        action="store",
+        nargs="?",
+        default=None,
+        const=defaultValidationCachePath,
+        dest="user_validationCachePath",
+        help=f"Reuse Privateer validation results of files whose contents and Privateer version have not changed, stored in '{defaultValidationCachePath}' unless another path is given.",
+    )
+    parser.add_argument(
+        "-validation_cache_size",
+        action="store",
+        type=int,
+        default=defaultValidationCacheMaxMegabytes,
+        dest="user_validationCacheSize",
+        help=f"Maximum size of the validation cache in megabytes. Defaults to {defaultValidationCacheMaxMegabytes}.",
+    )
+    parser.add_argument(
+        "-verbose",
+        action="store_true",
+        default=False,
+        dest="user_verbose",
+        help="Log every request to stderr.",
+    )
+    args = parser.parse_args(argv)
+
+    validationCacheSettings = None
+    if args.user_validationCachePath is not None:
+        validationCacheSettings = {
+            "path": args.user_validationCachePath,
+            "maxMegabytes": args.user_validationCacheSize,
+        }
+    serve_validation_requests(
+        args.user_host,
+        args.user_port,
+        args.user_jobs,
+        validationCacheSettings,
+        args.user_verbose,
+    )
+
+
+if __name__ == "__main__":
+    main()